@@ -4,6 +4,8 @@ from datetime import datetime, date
 from LoRaRF import SX127x
 import ax25
 
+import aprs_codec
+
 
 (RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
 
@@ -63,50 +65,14 @@ if computer_type in ["A", "C"]:
 
 # ---------- COMMUNICATIONS ---------- 
 SOURCE_ADDRESS = 'KW5AUS'
-SOURCE_SSID = '11'
-DEST_ADDRESS = 'APRS  '
-DEST_SSID = '0'
+SOURCE_SSID = 11
+DEST_ADDRESS = 'APRS'
+DEST_SSID = 0
 PATH_ADDRESS = 'WIDE2'
-PATH_SSID = '2' 
-FLAG = 0x7e   
-CONTROL_FIELD = 0x03           
-PROTOCOL_ID = 0xF0      # A PID value of 0xF0 is used to specify text content
-
-
-def encode_address(address, ssid):
-    """
-    Encodes the source or destination address into the proper 7-byte format for AX.25 frames.
-    Args:
-        address (str): The callsign (e.g., 'KW5AUS').
-        ssid (int or str): The SSID (e.g., '11') as a number or string.
-    Returns:
-        bytes: The encoded address in 7-byte format.
-    """
-    # Ensure SSID is a single byte (1 byte) by converting it to an integer
-    if isinstance(ssid, str):
-        ssid = int(ssid)  # Convert SSID string to an integer if it is a string
-    # Concatenate callsign and SSID to form the full address
-    full_address = address + chr(ssid)  # SSID as a single byte (chr() gives us the byte representation)
-    # Ensure the address is exactly 7 bytes by padding with spaces if necessary
-    padded_address = full_address.ljust(7)
-    # Return the encoded result as bytes
-    return padded_address.encode('utf-8')
-    
-
-def convert_coordinates(coordinate, is_latitude=True):
-    degrees = int(coordinate)       # Extract the degrees part
-    minutes = abs(coordinate - degrees) * 60
-    if is_latitude:
-        # Latitude: 2 digits for degrees, 2 for minutes (to two decimal places), followed by N or S
-        ddmm = f"{abs(degrees):02d}{minutes:05.2f}"  # 2 digits for degrees, 4 for minutes
-        direction = 'N' if coordinate >= 0 else 'S'
-        return f"{ddmm}{direction}"  # Total length = 8 characters
-    else:
-        # Longitude: 3 digits for degrees, 2 for minutes (to two decimal places), followed by E or W
-        ddmm = f"{abs(degrees):03d}{minutes:05.2f}"  # 3 digits for degrees, 4 for minutes
-        direction = 'E' if coordinate >= 0 else 'W'
-        return f"{ddmm}{direction}"  # Total length = 9 characters
+PATH_SSID = 2 
 
+# Address field, control and PID are encoded once here (standard shifted-bit AX.25 addresses)
+ax25_encoder = aprs_codec.AX25Encoder(SOURCE_ADDRESS, SOURCE_SSID, DEST_ADDRESS, DEST_SSID, [(PATH_ADDRESS, PATH_SSID)])
 
 
 def create_obj_report():
@@ -114,89 +80,24 @@ def create_obj_report():
     This section creates & formats the 'Object Report' for placement in the Information Field of the AX.25 message.
     """  
     global object_report
-    
-    info_field_data_id = ";"                # The ; is the APRS Data Type Identifier for an Object Report
-    object_name = "BALON_" + balloon_id     # Fixed 9-character Object name, which may consist of any printable ASCII characters
-    alive_killed = '*'                      # a * or _ separates the Object name from the rest of the report '*' = live Object. '_' = killed Object
-    aprs_timestamp = f"{gps_day}{gps_time[:2]}{gps_time[3:5]}z"  # 7 bytes (DDHHMMz)
-    aprs_lat = convert_coordinates(gps_lat, True)
-    sym_table_id = "/"
-    aprs_lon = convert_coordinates(gps_lon, False)
-    symbol_code = "O"                       # Primary Symbol Table, Balloon = "O" (SSID -11)
-    crs_spd = f"{int(gps_trk):03d}/{int(gps_spd):03d}"
-    aprs_comment = f"++Alt:{gps_alt}m_{round(flight_time / 60, 1)}min^{'Intact' if intact else 'Killed'}>{trigger}<"   # Max 43 Characters
-            
-    object_report = (
-        f"{info_field_data_id}{object_name}{alive_killed}{aprs_timestamp}"
-        f"{aprs_lat}{sym_table_id}{aprs_lon}{symbol_code}{crs_spd}{aprs_comment}"
-    )
+    # Fixed 9-character Object name; '*' = live Object; Primary Symbol Table, Balloon = "O" (SSID -11)
+    object_report = aprs_codec.object_report("BALON_" + balloon_id, aprs_codec.aprs_timestamp(gps_day, gps_time),
+                                             gps_lat, gps_lon, gps_trk, gps_spd,
+                                             aprs_codec.flight_comment(gps_alt, flight_time, intact, trigger))
     print(f"{RED}Object report constructed{RESET}")
     print(f"{RED}{'Output:':<15}{object_report}{RESET}")  # Debug output
-    print(f"{RED}{'Data Type:':<15}{type(object_report)}\n")   # Confirm it's a bytearray
     
     return object_report        
 
 
-
-def create_ax25_frame():    #<<<<< Check this is formatted properly with GPT <<<<<<<<
+async def create_aprs_message():
     """
-    - This section creates the APRS message by combining the components into the format specified by the APRS protocol.
-    - The APRS protocol can be found at: 
+    - Flags + pre-encoded header + information field + FCS + flag
+    - Only the information field and its share of the FCS are computed per message
     """
-    information_field = create_obj_report()  
-
-    frame = bytearray()
-    frame.extend(encode_address(DEST_ADDRESS,DEST_SSID))    # Destination
-    frame.extend(encode_address(SOURCE_ADDRESS,SOURCE_SSID))    # Source
-    frame.extend(encode_address(PATH_ADDRESS,PATH_SSID))    # Destination
-    frame.append(CONTROL_FIELD)
-    frame.append(PROTOCOL_ID)
-    frame.extend(information_field.encode('utf-8'))
-    
-    print(f"{ORANGE}AX25 frame constructed{RESET}")
-    print(f"{ORANGE}{'Output:':<15}{frame}{RESET}")  # Debug output
-    print(f"{ORANGE}{'Data Type:':<15}{type(frame)}\n")   # Confirm it's a bytearray
-    
-    return frame
-
-"""Calculate the Frame Check Sequence (FCS) for AX.25."""
-def calculate_fcs(data):
-    fcs = 0xFFFF
-    for byte in data:
-        fcs ^= byte  # XOR the byte into the FCS
-        for _ in range(8):  # Process each bit
-            if fcs & 0x0001:  # If the least significant bit is set
-                fcs = (fcs >> 1) ^ 0x8408  # Shift and apply polynomial
-            else:
-                fcs >>= 1  # Just shift if the LSB is not set
-                
-    print(f"{YELLOW}FCS calculated{RESET}")
-    print(f"{YELLOW}{'Output:':<15}{fcs}{RESET}")  # Debug output
-    print(f"{YELLOW}{'Data Type:':<15}{type(fcs)}\n")   # Confirm it's a bytearray
-    
-    return ~fcs & 0xFFFF  # Invert and mask to 16 bits
-    # The output is a 16-bit unsigned integer (int) but must be in a byte format, which will be converted later
-    
-
-async def create_aprs_message():
-    frame = create_ax25_frame()       # Create the AX.25 frame
-    fcs = calculate_fcs(frame)      # Calculate the FCS
-    fcs_bytes = fcs.to_bytes(2, byteorder="little")  # Convert FCS to bytes. 2 bytes, little-endian format
-
-    print(f"{GREEN}Starting APRS message{RESET}")
-    print(f"{GREEN}{'Output:':<15}{fcs_bytes}{RESET}")  # Debug output
-    print(f"{GREEN}{'Data Type:':<15}{type(fcs_bytes)}{RESET}\n")   # Confirm it's a bytearray
-    
-    message = bytearray()    
-    message.append(FLAG)
-    message.append(FLAG)
-    message.append(FLAG)
-    message.extend(frame)
-    message.extend(fcs_bytes)
-    message.append(FLAG)
+    message = ax25_encoder.frame(create_obj_report().encode('utf-8'))
     
-    print(f"APRS Message (bytearray): {message}")  # Debug output
-    print(f"APRS Message Type: {type(message)}")   # Confirm it's a bytearray
+    print(f"APRS Message (bytes): {message}")  # Debug output
     
     return message
 
@@ -4,6 +4,8 @@ from datetime import datetime, date
 from LoRaRF import SX127x
 import ax25
 
+import aprs_codec
+
 
 (RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
 
@@ -68,24 +70,9 @@ DEST_ADDRESS = 'APRS'
 DEST_SSID = 0
 PATH_ADDRESS = 'WIDE2'
 PATH_SSID = 2
-FLAG = 0x7e   
-CONTROL_FIELD = 0x03           
-PROTOCOL_ID = 0xF0      # A PID value of 0xF0 is used to specify text content
-  
 
-def convert_coordinates(coordinate, is_latitude=True):
-    degrees = int(coordinate)       # Extract the degrees part
-    minutes = abs(coordinate - degrees) * 60
-    if is_latitude:
-        # Latitude: 2 digits for degrees, 2 for minutes (to two decimal places), followed by N or S
-        ddmm = f"{abs(degrees):02d}{minutes:05.2f}"  # 2 digits for degrees, 4 for minutes
-        direction = 'N' if coordinate >= 0 else 'S'
-        return f"{ddmm}{direction}"  # Total length = 8 characters
-    else:
-        # Longitude: 3 digits for degrees, 2 for minutes (to two decimal places), followed by E or W
-        ddmm = f"{abs(degrees):03d}{minutes:05.2f}"  # 3 digits for degrees, 4 for minutes
-        direction = 'E' if coordinate >= 0 else 'W'
-        return f"{ddmm}{direction}"  # Total length = 9 characters
+# 0x3C 0xFF 0x01 + 'KW5AUS-11>APRS,WIDE2-2:' encoded once here
+tnc2_encoder = aprs_codec.TNC2Encoder(SOURCE_ADDRESS, SOURCE_SSID, DEST_ADDRESS, DEST_SSID, [(PATH_ADDRESS, PATH_SSID)])
 
 
 def create_obj_report():
@@ -93,52 +80,24 @@ def create_obj_report():
     This section creates & formats the 'Object Report' for placement in the Information Field of the AX.25 message.
     """  
     global object_report
-    
-    info_field_data_id = ";"                # The ; is the APRS Data Type Identifier for an Object Report
-    object_name = "BALON_" + balloon_id     # Fixed 9-character Object name, which may consist of any printable ASCII characters
-    alive_killed = '*'                      # a * or _ separates the Object name from the rest of the report '*' = live Object. '_' = killed Object
-    aprs_timestamp = f"{gps_day}{gps_time[:2]}{gps_time[3:5]}z"  # 7 bytes (DDHHMMz)
-    aprs_lat = convert_coordinates(gps_lat, True)
-    sym_table_id = "/"
-    aprs_lon = convert_coordinates(gps_lon, False)
-    symbol_code = "O"                       # Primary Symbol Table, Balloon = "O" (SSID -11)
-    crs_spd = f"{int(gps_trk):03d}/{int(gps_spd):03d}"
-    aprs_comment = f"++Alt:{gps_alt}m_{round(flight_time / 60, 1)}min^{'Intact' if intact else 'Killed'}>{trigger}<"   # Max 43 Characters
-            
-    object_report = (
-        f"{info_field_data_id}{object_name}{alive_killed}{aprs_timestamp}"
-        f"{aprs_lat}{sym_table_id}{aprs_lon}{symbol_code}{crs_spd}{aprs_comment}"
-    )
+    # Fixed 9-character Object name; '*' = live Object; Primary Symbol Table, Balloon = "O" (SSID -11)
+    object_report = aprs_codec.object_report("BALON_" + balloon_id, aprs_codec.aprs_timestamp(gps_day, gps_time),
+                                             gps_lat, gps_lon, gps_trk, gps_spd,
+                                             aprs_codec.flight_comment(gps_alt, flight_time, intact, trigger))
     print(f"{RED}Object report constructed{RESET}")
     print(f"{RED}{'Output:':<15}{object_report}{RESET}")  # Debug output
-    print(f"{RED}{'Data Type:':<15}{type(object_report)}\n")   # Confirm it's a bytearray
     
     return object_report        
 
 
-def create_LoRa_frame():    #<<<<< Check this is formatted properly with GPT <<<<<<<<
+def create_LoRa_frame():
     """
     The LoRa frame for LoRa-APRS is simply:
 
     The bytes 0x3C, 0xFF, 0x01
     The "TNC2" text representation of the APRS message (the same format that APRS-IS would use), e.g. the text KC2G>APRS,WIDE2-2:!4101.43NI07408.26W#
     """
-    information_field = create_obj_report()  
-
-    lora_frame = (
-        f"{SOURCE_ADDRESS}-{SOURCE_SSID}>{DEST_ADDRESS},{PATH_ADDRESS}-{PATH_SSID}!{'Hello World'}"
-    )
-
-    print(f"{ORANGE}LoRa frame constructed{RESET}")
-    print(f"{ORANGE}{'Output:':<15}{lora_frame}{RESET}")  # Debug output
-    
-    byteframe = bytearray()
-    # Header
-    #byteframe.append(0x3C)  
-    #byteframe.append(0xFF)      # Appends the hexadecimal value 0xFF as a byte
-    #byteframe.append(0x01)      # Appends the hexadecimal value 0x01 as a byte
-    # APRS Data
-    byteframe.extend(lora_frame.encode('utf-8'))    # Encodes the string into bytes and extends the bytearray
+    byteframe = tnc2_encoder.frame(create_obj_report().encode('utf-8'))
     
     print(f"{ORANGE}{'Byte Output:':<15}{byteframe}{RESET}\n")
     
@@ -157,9 +116,6 @@ async def transmit_report():
         message_list = list(byteframe)      # Converts the byte array to a list of integers because LoRa.write() expects a list of integers
         
         LoRa.beginPacket()
-        LoRa.write(0x3C)
-        LoRa.write(0xFF)
-        LoRa.write(0x01)
         LoRa.write(message_list, len(message_list))     # This sends the message, which is now a list of integers
         LoRa.write([tx_counter], 1)     # This sends the counter value, which is likely an additional byte appended to the message, perhaps to indicate a message sequence number or packet identifier.
         LoRa.endPacket()
@@ -0,0 +1,187 @@
+"""
+Shared APRS / AX.25 encoding for the balloon transmitters and the ground station.
+
+Notes:
+1) Everything that is fixed for a flight is encoded once, when the encoder is created:
+    - AX25Encoder: the shifted-bit address field (dest, source, path), control and PID, and the FCS state after them
+    - TNC2Encoder: the LoRa-APRS header (0x3C 0xFF 0x01) plus the 'SRC-SSID>DEST,PATH:' prefix
+   Per frame, the only work left is the info field and (AX.25) its share of the FCS
+2) The object report builders are the one copy of convert_coordinates()/create_obj_report() the scripts share
+3) FCS is CRC-16/X.25 (poly 0x8408 reflected, init 0xFFFF, inverted), sent little-endian
+
+Usage:
+    ax25 = AX25Encoder('KW5AUS', 11, 'APRS', 0, [('WIDE2', 2)])
+    packet = ax25.frame(object_report(...).encode('utf-8'))
+"""
+
+
+LORA_APRS_HEADER = b'\x3c\xff\x01'
+FLAG = 0x7e
+CONTROL_FIELD = 0x03    # UI frame
+PROTOCOL_ID = 0xF0      # A PID value of 0xF0 is used to specify text content
+COMMENT_MAX = 43        # Object report comment limit
+LANDING_SCALE = 1000    # Landing offset units per degree (~110 m of latitude)
+LANDING_SPAN = 91 * 91 // 2     # Two base-91 characters hold offsets of +/-4140 units
+TRIGGER_CODES = {'Timing': 'T', 'Geofencing': 'G', 'Manual': 'M', 'Other': 'O'}     # Compact flight comment
+
+
+#-------------------- FCS --------------------
+def _fcs_table():
+    table = []
+    for byte in range(256):
+        fcs = byte
+        for _ in range(8):
+            fcs = (fcs >> 1) ^ 0x8408 if fcs & 0x0001 else fcs >> 1
+        table.append(fcs)
+    return tuple(table)
+
+FCS_TABLE = _fcs_table()
+
+
+def fcs_update(fcs, data):
+    """Runs the CRC register over data; start from 0xFFFF and invert at the end"""
+    table = FCS_TABLE
+    for byte in data:
+        fcs = (fcs >> 8) ^ table[(fcs ^ byte) & 0xFF]
+    return fcs
+
+
+def calculate_fcs(data):
+    """AX.25 Frame Check Sequence (CRC-16/X.25), table-driven"""
+    return ~fcs_update(0xFFFF, data) & 0xFFFF
+
+
+#-------------------- ADDRESSES --------------------
+def encode_address(callsign, ssid=0, last=False, command=False):
+    """
+    - Encodes one AX.25 address field: 6 callsign characters shifted left one bit, then the SSID byte
+    - SSID byte: C/H bit, two reserved bits (set), SSID << 1, and the extension bit on the last address
+    """
+    callsign = callsign.upper().ljust(6)[:6]
+    ssid = int(ssid)
+    if not 0 <= ssid <= 15:
+        raise ValueError(f"SSID must be 0-15, not {ssid}")
+    return (bytes(ord(char) << 1 for char in callsign) +
+            bytes(((0x80 if command else 0) | 0x60 | ssid << 1 | (1 if last else 0),)))
+
+
+def tnc2_address(callsign, ssid=0):
+    """'KW5AUS', 11 -> 'KW5AUS-11'; SSID 0 is left off, as APRS-IS writes it"""
+    ssid = int(ssid)
+    return f"{callsign.strip()}-{ssid}" if ssid else callsign.strip()
+
+
+class AX25Encoder:
+    """
+    - AX.25 UI frames for one source/destination/path, header and FCS prefix computed once
+    - frame(info) returns the flagged frame: opening flags + header + info + FCS + closing flag
+    """
+    def __init__(self, source, source_ssid, dest='APRS', dest_ssid=0, path=(('WIDE2', 2),), opening_flags=3):
+        addresses = [(dest, dest_ssid), (source, source_ssid)] + list(path)
+        self.header = b''.join(encode_address(call, ssid, last=index == len(addresses) - 1, command=index == 0)
+                               for index, (call, ssid) in enumerate(addresses)) + bytes((CONTROL_FIELD, PROTOCOL_ID))
+        self.opening = bytes((FLAG,)) * opening_flags
+        self._fcs_state = fcs_update(0xFFFF, self.header)
+
+    def frame(self, info):
+        fcs = ~fcs_update(self._fcs_state, info) & 0xFFFF
+        return b''.join((self.opening, self.header, info, fcs.to_bytes(2, byteorder='little'), bytes((FLAG,))))
+
+
+class TNC2Encoder:
+    """
+    - LoRa-APRS frames: 0x3C 0xFF 0x01 + 'SRC-SSID>DEST,PATH:' + info, prefix built once
+    """
+    def __init__(self, source, source_ssid, dest='APRS', dest_ssid=0, path=(('WIDE2', 2),), lora_header=True):
+        line = f"{tnc2_address(source, source_ssid)}>{','.join(tnc2_address(call, ssid) for call, ssid in [(dest, dest_ssid)] + list(path))}:"
+        self.prefix = (LORA_APRS_HEADER if lora_header else b'') + line.encode('ascii')
+
+    def frame(self, info):
+        return self.prefix + info
+
+
+#-------------------- OBJECT REPORT --------------------
+def convert_coordinates(coordinate, is_latitude=True):
+    """38.3936 -> '3823.62N'; -104.5952 -> '10435.71W' (APRS DDMM.mm / DDDMM.mm)"""
+    degrees = int(coordinate)       # Extract the degrees part
+    minutes = abs(coordinate - degrees) * 60
+    if is_latitude:
+        # Latitude: 2 digits for degrees, 2 for minutes (to two decimal places), followed by N or S
+        return f"{abs(degrees):02d}{minutes:05.2f}{'N' if coordinate >= 0 else 'S'}"    # 8 characters
+    # Longitude: 3 digits for degrees, 2 for minutes (to two decimal places), followed by E or W
+    return f"{abs(degrees):03d}{minutes:05.2f}{'E' if coordinate >= 0 else 'W'}"        # 9 characters
+
+
+def aprs_timestamp(day, hhmmss):
+    """'18', '20:05:59' -> '182005z' (DDHHMMz, 7 bytes)"""
+    return f"{int(day):02d}{hhmmss[:2]}{hhmmss[3:5]}z"
+
+
+def flight_comment(alt, flight_time, intact, trigger, compact=False):
+    """
+    - '++Alt:31234.5m_120.0min^Intact>None<': 36 characters at 5-digit meters and 3-digit minutes, 42 for
+      'Killed>Geofencing<'
+    - compact: whole meters and minutes and a one-letter trigger ('++Alt:31234m_120min^Killed>G<', 29 characters),
+      which leaves room for the landing suffix after a termination
+    """
+    if compact:
+        return f"++Alt:{round(alt)}m_{round(flight_time / 60)}min^{'Intact' if intact else 'Killed'}>{TRIGGER_CODES.get(trigger, trigger)}<"
+    return f"++Alt:{alt}m_{round(flight_time / 60, 1)}min^{'Intact' if intact else 'Killed'}>{trigger}<"
+
+
+def trigger_name(text):
+    """Trigger text from either flight comment form ('G' -> 'Geofencing')"""
+    for name, code in TRIGGER_CODES.items():
+        if text == code:
+            return name
+    return text
+
+
+def base91(value, width):
+    """Non-negative integer -> `width` APRS base-91 characters ('!' to '{'), most significant first"""
+    chars = []
+    for _ in range(width):
+        value, digit = divmod(value, 91)
+        chars.append(chr(digit + 33))
+    return ''.join(reversed(chars))
+
+
+def from_base91(text):
+    value = 0
+    for char in text:
+        value = value * 91 + ord(char) - 33
+    return value
+
+
+def landing_comment(lat, lon, utc, report_lat, report_lon):
+    """
+    - 'L' + the predicted landing point as a north and east offset from the report's own position (0.001 degree,
+      two base-91 characters each) + the landing UTC minute of the day (two characters): 7 characters
+    - '' if the landing point is more than ~4.1 degrees from the balloon
+    """
+    north = round((lat - report_lat) * LANDING_SCALE)
+    east = round((lon - report_lon) * LANDING_SCALE)
+    if abs(north) >= LANDING_SPAN or abs(east) >= LANDING_SPAN:
+        return ''
+    return (f"L{base91(north + LANDING_SPAN, 2)}{base91(east + LANDING_SPAN, 2)}"
+            f"{base91(utc.hour * 60 + utc.minute, 2)}")
+
+
+def parse_landing(code, report_lat, report_lon):
+    """Inverse of landing_comment() for the 6 characters after 'L': (lat, lon, 'HH:MM')"""
+    north = from_base91(code[0:2]) - LANDING_SPAN
+    east = from_base91(code[2:4]) - LANDING_SPAN
+    hours, minutes = divmod(from_base91(code[4:6]) % 1440, 60)
+    return (round(report_lat + north / LANDING_SCALE, 3), round(report_lon + east / LANDING_SCALE, 3),
+            f"{hours:02d}:{minutes:02d}")
+
+
+def object_report(name, timestamp, lat, lon, track, speed, comment='', live=True, symbol='/O'):
+    """
+    - APRS Object Report for the AX.25 information field:
+        ';' + 9-character name + '*' (live) or '_' (killed) + DDHHMMz + lat + table + lon + symbol + ccc/sss + comment
+    - symbol '/O' = primary table, balloon
+    """
+    return (f";{name:<9.9}{'*' if live else '_'}{timestamp}"
+            f"{convert_coordinates(lat, True)}{symbol[0]}{convert_coordinates(lon, False)}{symbol[1]}"
+            f"{int(track):03d}/{int(speed):03d}{comment}")
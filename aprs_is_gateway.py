@@ -0,0 +1,420 @@
+"""
+APRS-IS uplink gateway for the ground station.
+
+Notes:
+1) One persistent, logged-in TCP connection to APRS-IS instead of one connection per packet
+2) Lines are queued without blocking reception and written to the socket in batches
+3) Reconnects with exponential backoff (plus jitter), cycling through the server list
+4) Token-bucket send-rate limit so a burst of decoded packets never floods the server
+5) During an outage, lines are spooled to disk and flushed first after the next login
+    - Lines written in the last few seconds before a drop are spooled again, since TCP may have lost them.
+      APRS-IS drops duplicates itself, so a resend is harmless
+6) LocalAPRSISServer is a stand-in server for bench testing (no internet or passcode needed)
+
+Usage:
+    python3 aprs_is_gateway.py --call N0CALL-10 capture.txt       Upload decoded captures
+    python3 aprs_is_gateway.py --call N0CALL-10 --live            Receive on the SX1278 and upload
+    python3 aprs_is_gateway.py --local-test                       Run against the local stand-in server
+"""
+
+
+import argparse
+import asyncio
+import collections
+import os
+import random
+import time
+
+import ground_station
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+APRS_IS_SERVERS = [('rotate.aprs2.net', 14580), ('noam.aprs2.net', 14580)]
+SOFTWARE_NAME = 'SABER'
+SOFTWARE_VERSION = '1.0'
+TOCALL = 'APZSBR'       # APZxxx = experimental software
+
+
+#-------------------- APRS-IS FORMATTING --------------------
+def aprs_passcode(callsign):
+    """Standard APRS-IS passcode for a callsign (the SSID is ignored)"""
+    call = callsign.split('-')[0].upper()
+    code = 0x73e2
+    for i in range(0, len(call), 2):
+        code ^= ord(call[i]) << 8
+        if i + 1 < len(call):
+            code ^= ord(call[i + 1])
+    return code & 0x7fff
+
+
+def login_line(callsign, passcode, server_filter=''):
+    line = f"user {callsign} pass {passcode} vers {SOFTWARE_NAME} {SOFTWARE_VERSION}"
+    if server_filter:
+        line += f" filter {server_filter}"
+    return line
+
+
+def packet_to_tnc2(decoded, igate_call):
+    """
+    - Converts a ground_station decoded packet to the TNC2 line APRS-IS expects
+    - Heard RF packets get the qAR construct; raw object reports (no AX.25/TNC2 header) are originated by the igate
+    """
+    info = decoded['info']
+    if decoded['source']:
+        path = [hop for hop in decoded['path'] if hop]
+        header = ','.join([decoded['dest'] or TOCALL] + path + ['qAR', igate_call])
+        return f"{decoded['source']}>{header}:{info}"
+    return f"{igate_call}>{TOCALL},TCPIP*:{info}"
+
+
+#-------------------- DISK SPOOL --------------------
+class Spool:
+    """Append-only text file of lines that could not be sent; flushed in order after reconnecting"""
+    def __init__(self, filename, max_bytes=10_000_000):
+        self.filename = filename
+        self.max_bytes = max_bytes
+
+    def append(self, lines):
+        if not lines:
+            return
+        if os.path.exists(self.filename) and os.path.getsize(self.filename) > self.max_bytes:
+            print(f"{RED}{'Spool full:':<25}{RESET}dropping {len(lines)} lines")
+            return
+        with open(self.filename, mode='a') as file:
+            file.writelines(line + '\n' for line in lines)
+
+    def take(self):
+        """Returns every spooled line and empties the spool"""
+        if not os.path.exists(self.filename):
+            return []
+        with open(self.filename) as file:
+            lines = [line.rstrip('\n') for line in file if line.strip()]
+        os.remove(self.filename)
+        return lines
+
+    def __len__(self):
+        if not os.path.exists(self.filename):
+            return 0
+        with open(self.filename) as file:
+            return sum(1 for _ in file)
+
+
+#-------------------- GATEWAY --------------------
+class APRSISGateway:
+    """
+    - submit() never blocks: lines go on an in-memory queue, or to the spool if the queue is full
+    - run() owns the connection: login, batched writes, keepalives, backoff and spool flushing
+    """
+    def __init__(self, callsign, passcode=None, servers=None, rate_limit=5.0, burst=10, batch_size=20,
+                 batch_interval=1.0, spool_file='aprs_is_spool.txt', queue_size=1000, keepalive=120,
+                 resend_window=10.0):
+        self.callsign = callsign
+        self.passcode = aprs_passcode(callsign) if passcode is None else passcode
+        self.servers = servers or APRS_IS_SERVERS
+        self.rate_limit = rate_limit        # Lines per second
+        self.burst = burst                  # Token bucket depth
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.keepalive = keepalive          # Seconds between '#' keepalive lines on an idle link
+        self.resend_window = resend_window  # Seconds of sent lines to resend after a dropped connection
+        self.spool = Spool(spool_file)
+        self.queue = asyncio.Queue(queue_size)
+        self.connected = False
+        self.verified = False
+        self.stats = {'submitted': 0, 'sent': 0, 'spooled': 0, 'connects': 0, 'failures': 0}
+        self._tokens = float(burst)
+        self._token_time = time.monotonic()
+        self._recent = collections.deque()  # (send time, line) inside resend_window
+        self._pending = []                  # Lines taken off the queue (or spool) and not yet sent
+
+    def submit(self, line):
+        self.stats['submitted'] += 1
+        try:
+            self.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.spool.append([line])
+            self.stats['spooled'] += 1
+
+    def submit_packets(self, accepted):
+        """on_packets callback for ground_station.receive()"""
+        for decoded in accepted:
+            if decoded['info']:
+                self.submit(packet_to_tnc2(decoded, self.callsign))
+
+    async def _take_tokens(self, count):
+        """Token bucket: waits until `count` lines may be sent (a batch bigger than the bucket runs it into debt)"""
+        needed = min(count, self.burst)
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._token_time) * self.rate_limit)
+            self._token_time = now
+            if self._tokens >= needed:
+                self._tokens -= count
+                return
+            await asyncio.sleep((needed - self._tokens) / self.rate_limit)
+
+    async def _connect(self, host, port):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=15)
+        banner = await asyncio.wait_for(reader.readline(), timeout=15)     # '# aprsc 2.1.x'
+        writer.write((login_line(self.callsign, self.passcode) + '\r\n').encode('ascii'))
+        await writer.drain()
+        while True:
+            response = (await asyncio.wait_for(reader.readline(), timeout=15)).decode('ascii', 'replace')
+            if not response:
+                raise ConnectionError("connection closed during login")
+            if response.startswith('# logresp'):
+                self.verified = ' verified' in response and 'unverified' not in response
+                break
+        if not self.verified:
+            print(f"{YELLOW}{'APRS-IS login:':<25}{RESET}unverified (check the passcode); the server will not gate our lines")
+        print(f"{GREEN}{'APRS-IS connected:':<25}{RESET}{host}:{port}  {banner.decode('ascii', 'replace').strip()}")
+        return reader, writer
+
+    async def _send(self, writer, lines):
+        await self._take_tokens(len(lines))
+        writer.write(''.join(line + '\r\n' for line in lines).encode('utf-8', 'replace'))
+        await writer.drain()
+        self.stats['sent'] += len(lines)
+        now = time.monotonic()
+        self._recent.extend((now, line) for line in lines)
+        while self._recent and now - self._recent[0][0] > self.resend_window:
+            self._recent.popleft()
+
+    async def _next_batch(self):
+        """
+        Waits for the first line, then collects more for up to batch_interval seconds into _pending, so a batch
+        cut short by a dropped link is spooled rather than lost
+        """
+        self._pending.append(await asyncio.wait_for(self.queue.get(), timeout=self.keepalive))
+        deadline = time.monotonic() + self.batch_interval
+        while len(self._pending) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return list(self._pending)
+
+    async def _drain_reader(self, reader):
+        """Server comments and filter traffic are read and discarded; EOF means the link is gone"""
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+
+    async def _session(self, reader, writer):
+        self._pending = self.spool.take()
+        spooled = len(self._pending)
+        while self._pending:
+            await self._send(writer, self._pending[:self.batch_size])
+            del self._pending[:self.batch_size]
+        if spooled:
+            print(f"{CYAN}{'Spool flushed:':<25}{RESET}{spooled} lines")
+        reader_task = asyncio.create_task(self._drain_reader(reader))
+        try:
+            while not reader_task.done():
+                batch_task = asyncio.create_task(self._next_batch())
+                await asyncio.wait({batch_task, reader_task}, return_when=asyncio.FIRST_COMPLETED)
+                if not batch_task.done():
+                    batch_task.cancel()
+                    break
+                try:
+                    batch = batch_task.result()
+                except asyncio.TimeoutError:
+                    writer.write(f"#{SOFTWARE_NAME} keepalive\r\n".encode('ascii'))
+                    await writer.drain()
+                    continue
+                await self._send(writer, batch)         # On failure the batch stays in _pending for the spool
+                self._pending.clear()
+        finally:
+            reader_task.cancel()
+        raise ConnectionError("server closed the connection")
+
+    def _spool_queue(self):
+        lines = [line for _, line in self._recent] + self._pending
+        self._recent.clear()
+        self._pending = []
+        while not self.queue.empty():
+            lines.append(self.queue.get_nowait())
+        self.spool.append(lines)
+        self.stats['spooled'] += len(lines)
+
+    async def run(self, min_backoff=1.0, max_backoff=300.0):  #~~~~~ GROUND TASK 2 ~~~~~
+        backoff = min_backoff
+        attempt = 0
+        while True:
+            host, port = self.servers[attempt % len(self.servers)]
+            attempt += 1
+            writer = None
+            try:
+                reader, writer = await self._connect(host, port)
+                self.connected = True
+                self.stats['connects'] += 1
+                backoff = min_backoff
+                await self._session(reader, writer)
+            except asyncio.CancelledError:
+                self._spool_queue()
+                raise
+            except Exception as e:
+                self.stats['failures'] += 1
+                print(f"{RED}{'APRS-IS error:':<25}{RESET}{host}:{port} {e}")
+            finally:
+                self.connected = False
+                if writer is not None:
+                    writer.close()
+            # While disconnected, move queued lines to disk so a long outage cannot fill memory
+            self._spool_queue()
+            delay = backoff * random.uniform(0.5, 1.5)
+            print(f"{YELLOW}{'APRS-IS reconnect in:':<25}{RESET}{delay:.1f} s")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, max_backoff)
+
+
+#-------------------- LOCAL TEST SERVER --------------------
+class LocalAPRSISServer:
+    """
+    - Minimal stand-in for an aprsc server: banner, login/logresp, then records every line it receives
+    - drop_clients() closes all connections, to exercise reconnect and spooling
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.lines = []
+        self.logins = []
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.drop_clients()
+        if self._handlers:
+            await asyncio.wait(self._handlers, timeout=2)
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_clients(self):
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    async def _client(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        self._writers.add(writer)
+        try:
+            writer.write(b"# aprsc 2.1.14 (local stand-in)\r\n")
+            login = (await reader.readline()).decode('ascii', 'replace').strip()
+            self.logins.append(login)
+            fields = login.split()
+            callsign = fields[1] if len(fields) > 1 else ''
+            verified = len(fields) > 3 and fields[3] == str(aprs_passcode(callsign))
+            writer.write(f"# logresp {callsign} {'verified' if verified else 'unverified'}, server LOCAL\r\n".encode('ascii'))
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8', 'replace').strip()
+                if line and not line.startswith('#'):
+                    self.lines.append(line)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+
+async def local_test(count=200):
+    """Pushes simulated packets through the gateway with an outage in the middle; every line must arrive"""
+    server = await LocalAPRSISServer().start()
+    spool_file = 'aprs_is_local_test_spool.txt'
+    gateway = APRSISGateway('N0CALL-10', servers=[(server.host, server.port)], rate_limit=500, burst=100,
+                            batch_interval=0.05, spool_file=spool_file)
+    pipeline = ground_station.ReceiverPipeline()
+    gateway_task = asyncio.create_task(gateway.run(min_backoff=0.2, max_backoff=1.0))
+    expected = 0
+    for i, batch in enumerate(ground_station.batched(ground_station.simulated_packets(count), 20)):
+        accepted = pipeline.process(batch)
+        expected += len(accepted)
+        gateway.submit_packets(accepted)
+        await asyncio.sleep(0.05)
+        if i == 3:
+            print(f"{ORANGE}{'Local test:':<25}{RESET}dropping the connection")
+            server.drop_clients()
+    for _ in range(100):
+        if len(set(server.lines)) >= expected:
+            break
+        await asyncio.sleep(0.1)
+    gateway_task.cancel()
+    await asyncio.gather(gateway_task, return_exceptions=True)
+    await server.stop()
+    unique = len(set(server.lines))
+    ok = unique == expected
+    print(f"\n{MAGENTA}{'Lines submitted:':<25}{RESET}{expected}")
+    print(f"{MAGENTA}{'Lines received:':<25}{RESET}{len(server.lines)} ({unique} unique)")
+    print(f"{MAGENTA}{'Connections:':<25}{RESET}{gateway.stats['connects']}")
+    print(f"{GREEN if ok else RED}{'Local test:':<25}{'PASS' if ok else 'FAIL'}{RESET}")
+    if os.path.exists(spool_file):
+        os.remove(spool_file)
+    return ok
+
+
+#-------------------- MAIN FUNCTION --------------------
+async def gateway_main(args):
+    gateway = APRSISGateway(args.call, args.passcode, rate_limit=args.rate)
+    gateway_task = asyncio.create_task(gateway.run())
+    pipeline = ground_station.ReceiverPipeline()
+
+    def on_packets(accepted):
+        ground_station.print_packets(accepted)
+        gateway.submit_packets(accepted)
+
+    if args.live:
+        from LoRaRF import SX127x
+        LoRa = SX127x()
+        ground_station.configure_receiver(LoRa)
+        await ground_station.receive(LoRa, pipeline, on_packets)
+    else:
+        for filename in args.captures:
+            for batch in ground_station.batched(ground_station.read_capture(filename), 100):
+                on_packets(pipeline.process(batch))
+                await asyncio.sleep(0)
+        deadline = time.monotonic() + args.wait
+        while (not gateway.queue.empty() or not gateway.connected) and time.monotonic() < deadline:
+            await asyncio.sleep(1)
+        await asyncio.sleep(gateway.batch_interval * 2)
+        gateway_task.cancel()       # Anything not sent by now is spooled for the next run
+        await asyncio.gather(gateway_task, return_exceptions=True)
+        print(f"\n{MAGENTA}{'Lines sent:':<25}{RESET}{gateway.stats['sent']}")
+        if len(gateway.spool):
+            print(f"{YELLOW}{'Lines spooled:':<25}{RESET}{len(gateway.spool)} ({gateway.spool.filename}, sent on the next run)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SABER APRS-IS uplink gateway")
+    parser.add_argument('captures', nargs='*', help="capture files to decode and upload")
+    parser.add_argument('--call', default='N0CALL-10', help="igate callsign")
+    parser.add_argument('--passcode', type=int, help="APRS-IS passcode (computed from the callsign if omitted)")
+    parser.add_argument('--rate', type=float, default=5.0, help="send-rate limit in lines per second")
+    parser.add_argument('--live', action='store_true', help="receive with the SX1278")
+    parser.add_argument('--wait', type=float, default=60, help="captures: seconds to wait for APRS-IS before spooling")
+    parser.add_argument('--local-test', action='store_true', help="run against a local stand-in APRS-IS server")
+    args = parser.parse_args()
+    try:
+        if args.local_test:
+            raise SystemExit(0 if asyncio.run(local_test()) else 1)
+        asyncio.run(gateway_main(args))
+    except KeyboardInterrupt:
+        print('\n', "User terminated program.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Erasure coding across a transmit burst (Reed-Solomon style, Cauchy matrix over GF(256)).
+
+Notes:
+1) Instead of sending the same packet msg_iterations times, a burst splits the report into k data shards and adds
+   n - k parity shards; the ground station rebuilds the report from ANY k of the n packets
+2) The code is systematic: shards 0..k-1 are the report itself, so a clean burst needs no decoding maths
+3) Each shard is a packet of its own: FEC header + shard + the usual tx_counter byte
+    - The burst is identified by the tx_counter of its first shard (tx_counter - shard index), so no extra id byte
+4) simulate() runs bursts through a lossy channel (independent or Gilbert-Elliott bursty loss) and compares
+   delivered reports per second of airtime against plain repetition
+
+Shard layout:
+    0xA8 | id (3s) | shard index (B) | k << 4 | n (B) | report length (B) | shard bytes
+
+Usage:
+    python3 burst_fec.py                                    Compare repetition and FEC at 10-50% loss
+    python3 burst_fec.py --loss 0.2 --burst 0.6 --bytes 36  Bursty channel, binary keyframe-sized reports
+"""
+
+
+import argparse
+import random
+import struct
+import time
+
+from sim_hardware import time_on_air
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+FEC_MAGIC = 0xA8
+SHARD_HEADER = struct.Struct('<B3sBBB')
+MAX_SHARDS = 15         # n is packed in a nibble
+
+
+#-------------------- GF(256) --------------------
+def _gf_tables():
+    exp = [0] * 512
+    log = [0] * 256
+    x = 1
+    for power in range(255):
+        exp[power] = x
+        log[x] = power
+        x <<= 1
+        if x & 0x100:
+            x ^= 0x11d
+    for power in range(255, 512):
+        exp[power] = exp[power - 255]
+    return exp, log
+
+GF_EXP, GF_LOG = _gf_tables()
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+
+def gf_inv(a):
+    return GF_EXP[255 - GF_LOG[a]]
+
+# MUL_TABLES[c] is a bytes.translate() table for multiplying every byte of a shard by c
+MUL_TABLES = tuple(bytes(gf_mul(c, b) for b in range(256)) for c in range(256))
+
+
+def combine(coefficients, shards):
+    """sum(c * shard) over GF(256), byte by byte"""
+    length = len(shards[0])
+    result = 0
+    for c, shard in zip(coefficients, shards):
+        if c:
+            result ^= int.from_bytes(shard.translate(MUL_TABLES[c]), 'little')
+    return result.to_bytes(length, 'little')
+
+
+def cauchy_row(parity_index, k):
+    """Parity row j: 1 / (x_j + y_i) with x_j = k + j and y_i = i (disjoint, so every k x k minor is invertible)"""
+    return [gf_inv((k + parity_index) ^ i) for i in range(k)]
+
+
+def encoding_row(shard_index, k):
+    if shard_index < k:
+        return [1 if i == shard_index else 0 for i in range(k)]
+    return cauchy_row(shard_index - k, k)
+
+
+def gf_invert(matrix):
+    """Gauss-Jordan inverse of a square matrix over GF(256)"""
+    size = len(matrix)
+    rows = [list(row) + [1 if i == r else 0 for i in range(size)] for r, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next(r for r in range(col, size) if rows[r][col])
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = gf_inv(rows[col][col])
+        rows[col] = [gf_mul(scale, value) for value in rows[col]]
+        for r in range(size):
+            factor = rows[r][col]
+            if r != col and factor:
+                rows[r] = [value ^ gf_mul(factor, pivot_value) for value, pivot_value in zip(rows[r], rows[col])]
+    return [row[size:] for row in rows]
+
+
+#-------------------- ENCODE (balloon) --------------------
+def encode_burst(balloon_id, payload, k=2, n=3):
+    """Returns the n shard packets (without the tx_counter byte) for one report"""
+    if not 1 <= k <= n <= MAX_SHARDS:
+        raise ValueError(f"need 1 <= k <= n <= {MAX_SHARDS} (k={k}, n={n})")
+    if len(payload) > 255:
+        raise ValueError("report longer than 255 bytes")
+    payload = bytes(payload)
+    size = -(-len(payload) // k)
+    padded = payload.ljust(size * k, b'\x00')
+    data = [padded[i * size:(i + 1) * size] for i in range(k)]
+    shards = data + [combine(cauchy_row(j, k), data) for j in range(n - k)]
+    station = balloon_id.encode('ascii')[:3].ljust(3)
+    return [SHARD_HEADER.pack(FEC_MAGIC, station, index, k << 4 | n, len(payload)) + shard
+            for index, shard in enumerate(shards)]
+
+
+#-------------------- DECODE (ground station) --------------------
+def decode_shards(shards, k, length):
+    """shards: {index: bytes} with at least k entries -> the original report"""
+    indices = sorted(shards)[:k]
+    if indices == list(range(k)):
+        return b''.join(shards[i] for i in indices)[:length]
+    inverse = gf_invert([encoding_row(i, k) for i in indices])
+    received = [shards[i] for i in indices]
+    return b''.join(combine(row, received) for row in inverse)[:length]
+
+
+class BurstAssembler:
+    """
+    - add(body, tx_counter) collects shards per (balloon, burst); once k have arrived it returns
+      (tx_counter of the burst's first shard, rebuilt report bytes), else None
+    - Shards of a burst that is already rebuilt are ignored, so the report is handed on exactly once
+    - A burst is forgotten `window` seconds after its first shard, before the 8-bit tx_counter can come round again
+    """
+    def __init__(self, window=300, max_bursts=256):
+        self.window = window
+        self.max_bursts = max_bursts
+        self.bursts = {}        # (station, first tx_counter) -> {'k', 'length', 'time', 'shards', 'done'}
+        self.recovered = 0
+        self.repaired = 0       # Recovered with at least one parity shard (a data shard was lost)
+
+    def add(self, body, tx_counter, rx_time=None):
+        (_, station, index, kn, length) = SHARD_HEADER.unpack_from(body)
+        k = kn >> 4
+        now = time.time() if rx_time is None else rx_time
+        first_counter = (tx_counter - index) % 256
+        key = (station, first_counter)
+        burst = self.bursts.get(key)
+        if burst is None or now - burst['time'] > self.window or burst['k'] != k or burst['length'] != length:
+            self.bursts.pop(key, None)      # Re-inserted so the dict stays oldest first
+            if len(self.bursts) >= self.max_bursts:
+                self.bursts.pop(next(iter(self.bursts)))
+            burst = self.bursts[key] = {'k': k, 'length': length, 'time': now, 'shards': {}, 'done': False}
+        if burst['done']:
+            return None
+        burst['shards'][index] = body[SHARD_HEADER.size:]
+        if len(burst['shards']) < k:
+            return None
+        burst['done'] = True
+        self.recovered += 1
+        if any(i >= k for i in sorted(burst['shards'])[:k]):
+            self.repaired += 1
+        return first_counter, decode_shards(burst['shards'], k, length)
+
+
+#-------------------- CHANNEL SIMULATION --------------------
+def lossy_channel(loss, burstiness=0.0, rng=random):
+    """
+    - Yields True for each packet that gets through
+    - burstiness 0 = independent losses; towards 1 = Gilbert-Elliott: losses clump (fades, antenna nulls while spinning)
+      with the same long-run loss rate
+    """
+    if burstiness <= 0:
+        while True:
+            yield rng.random() >= loss
+    # Two-state chain: bad state loses everything; stay-bad probability sets the mean fade length
+    stay_bad = burstiness
+    enter_bad = loss * (1 - stay_bad) / max(1 - loss, 1e-9)
+    bad = rng.random() < loss
+    while True:
+        bad = rng.random() < (stay_bad if bad else enter_bad)
+        yield not bad
+
+
+def simulate(scheme, report_bytes=85, loss=0.2, burstiness=0.0, bursts=2000, seed=1, update_interval=120, **radio):
+    """
+    - scheme: ('repeat', copies) or ('fec', k, n); every burst is really encoded and decoded
+    - Bursts are update_interval seconds apart on a virtual clock, as periodic_update() sends them
+    - Returns (delivery ratio, airtime per burst in s, delivered reports per airtime second)
+    """
+    rng = random.Random(seed)
+    channel = lossy_channel(loss, burstiness, rng)
+    assembler = BurstAssembler()
+    delivered = 0
+    airtime = 0.0
+    counter = 0
+    for burst in range(bursts):
+        report = bytes(rng.randrange(256) for _ in range(report_bytes))
+        if scheme[0] == 'repeat':
+            packets = [report] * scheme[1]
+        else:
+            packets = encode_burst('11a', report, scheme[1], scheme[2])
+        got = False
+        for index, packet in enumerate(packets):
+            airtime += time_on_air(len(packet) + 1, **radio)       # + tx_counter byte
+            if next(channel) and not got:
+                if scheme[0] == 'repeat':
+                    got = True
+                else:
+                    rebuilt = assembler.add(packet, (counter + index) % 256, burst * update_interval)
+                    if rebuilt is not None:
+                        assert rebuilt == (counter, report), "FEC decode mismatch"
+                        got = True
+        counter = (counter + len(packets)) % 256
+        delivered += got
+    return delivered / bursts, airtime / bursts, delivered / airtime
+
+
+def compare(report_bytes=85, losses=(0.1, 0.2, 0.3, 0.5), burstiness=0.0, bursts=2000, schemes=None):
+    schemes = schemes or [('repeat', 1), ('repeat', 2), ('repeat', 3), ('fec', 2, 3), ('fec', 2, 4), ('fec', 3, 5), ('fec', 4, 6)]
+    print(f"\n{MAGENTA}{'-' * 100}{RESET}")
+    print(f"{CYAN}Report {report_bytes} bytes at SF12/125 kHz, burstiness {burstiness}, {bursts} bursts per cell{RESET}")
+    print(f"{'Scheme':<14}{'Airtime (s)':<13}" + ''.join(f"{f'loss {loss:.0%}':<22}" for loss in losses))
+    print(f"{'':<27}" + ''.join(f"{'delivered  rep/air-s':<22}" for loss in losses))
+    for scheme in schemes:
+        name = f"repeat x{scheme[1]}" if scheme[0] == 'repeat' else f"fec {scheme[1]}-of-{scheme[2]}"
+        cells = []
+        for loss in losses:
+            ratio, airtime, per_second = simulate(scheme, report_bytes, loss, burstiness, bursts)
+            cells.append(f"{ratio:>8.1%}  {per_second:>8.4f}    ")
+        print(f"{name:<14}{airtime:<13.2f}" + ''.join(cells))
+    print(f"{MAGENTA}{'-' * 100}{RESET}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare burst repetition and erasure coding over a lossy channel")
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.1, 0.2, 0.3, 0.5], help="packet loss rates")
+    parser.add_argument('--burst', type=float, default=0.0, help="loss burstiness, 0 (independent) to <1 (long fades)")
+    parser.add_argument('--bytes', type=int, default=85, help="report size (85 = ASCII object report, 36 = binary keyframe)")
+    parser.add_argument('--bursts', type=int, default=2000, help="bursts simulated per cell")
+    args = parser.parse_args()
+    compare(args.bytes, args.loss, args.burst, args.bursts)
+
+
+if __name__ == "__main__":
+    main()
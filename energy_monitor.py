@@ -0,0 +1,213 @@
+"""
+High-rate INA219 energy accounting and battery state-of-charge estimate.
+
+Notes:
+1) A background thread samples bus voltage and current at tens of Hz into an array-backed ring buffer
+    - The INA219 must be configured for short conversions (e.g. ADC_8SAMP, ~4 ms) or it cannot keep up;
+      at ADC_128SAMP each conversion takes 68 ms
+2) Coulombs and watt-hours are integrated (trapezoidal) from every sample, not from the 30 s display reading
+3) Energy is attributed to named events (tx, heat, strobe) while they are active, both total and above baseline
+4) State of charge = voltage-based estimate at start-up minus coulombs used, against the pack capacity
+5) Remaining flight time = remaining charge / average current over the last few minutes
+"""
+
+
+import array
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Pack voltage limits from the flight notes: full = 12.22v, empty = 9.5v, dead = 8.6v
+FULL_VOLTS = 12.22
+EMPTY_VOLTS = 9.5
+
+
+def voltage_soc(volts):
+    """Rough state of charge (%) from the resting pack voltage"""
+    return max(0.0, min(100.0, 100 * (volts - EMPTY_VOLTS) / (FULL_VOLTS - EMPTY_VOLTS)))
+
+
+#-------------------- RING BUFFER --------------------
+class RingBuffer:
+    """
+    - Fixed-size time/voltage/current/power history in typed arrays (~20 bytes per sample)
+    - 20 Hz for 10 minutes = 12,000 samples = ~240 kB, allocated once
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.t = array.array('d', bytes(8 * capacity))     # monotonic seconds
+        self.v = array.array('f', bytes(4 * capacity))     # volts
+        self.i = array.array('f', bytes(4 * capacity))     # mA
+        self.p = array.array('f', bytes(4 * capacity))     # mW
+        self.count = 0
+        self.head = 0
+
+    def append(self, t, v, i, p):
+        head = self.head
+        self.t[head] = t
+        self.v[head] = v
+        self.i[head] = i
+        self.p[head] = p
+        self.head = (head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def last(self, n=1):
+        """Indices of the newest n samples, oldest first"""
+        n = min(n, self.count)
+        return [(self.head - n + k) % self.capacity for k in range(n)]
+
+    def since(self, t0):
+        """Indices of the samples taken at or after monotonic time t0, oldest first"""
+        indices = []
+        index = self.head
+        for _ in range(self.count):
+            index = (index - 1) % self.capacity
+            if self.t[index] < t0:
+                break
+            indices.append(index)
+        indices.reverse()
+        return indices
+
+
+#-------------------- ENERGY MONITOR --------------------
+class EnergyMonitor:
+    """
+    - start() launches the sampling thread; everything else is safe to call from the event loop
+    - event(name) / mark(name, active) attribute energy to TX bursts, the nichrome cut, the strobe, ...
+    """
+    def __init__(self, ina, rate=20, battery_capacity_mah=2600, history_s=600, endurance_window_s=300):
+        self.ina = ina
+        self.rate = rate
+        self.capacity_mah = battery_capacity_mah
+        self.endurance_window = endurance_window_s
+        self.buffer = RingBuffer(int(rate * history_s))
+        self.coulombs = 0.0
+        self.watt_hours = 0.0
+        self.start_soc = None
+        self.baseline_mw = None         # Slow average of power while no event is active
+        self.events = {}                # name -> {'active', 'wh', 'excess_wh', 'seconds', 'count'}
+        self.samples = 0
+        self.errors = 0
+        self.last_error = ''
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._last = None               # (t, i, p) of the previous good sample
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='energy', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    # ---------- Sampling thread ----------
+    def _run(self):
+        period = 1.0 / self.rate
+        next_time = time.monotonic()
+        while self._running:
+            try:
+                self.sample()
+            except Exception as e:      # DeviceRangeError, I2C errors: count and carry on
+                self.errors += 1
+                self.last_error = str(e)
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()    # Fell behind (I2C stall); don't try to catch up in a burst
+
+    def sample(self):
+        volts = self.ina.voltage()
+        milliamps = self.ina.current()
+        milliwatts = volts * milliamps      # Skip the power register read: one less I2C transaction
+        now = time.monotonic()
+        with self._lock:
+            if self.start_soc is None:
+                self.start_soc = voltage_soc(volts)
+            if self._last is not None:
+                dt = now - self._last[0]
+                if dt < 5:      # A long gap (thread stalled) is not integrated blind
+                    amps = (milliamps + self._last[1]) / 2000
+                    watt_hours = (milliwatts + self._last[2]) / 2000 * dt / 3600
+                    self.coulombs += amps * dt
+                    self.watt_hours += watt_hours
+                    self._attribute(watt_hours, dt, milliwatts)
+            self._last = (now, milliamps, milliwatts)
+            self.buffer.append(now, volts, milliamps, milliwatts)
+            self.samples += 1
+
+    def _attribute(self, watt_hours, dt, milliwatts):
+        active = [event for event in self.events.values() if event['active']]
+        if not active:
+            self.baseline_mw = milliwatts if self.baseline_mw is None else 0.995 * self.baseline_mw + 0.005 * milliwatts
+            return
+        baseline_wh = (self.baseline_mw or 0.0) / 1000 * dt / 3600
+        for event in active:
+            event['wh'] += watt_hours
+            event['excess_wh'] += watt_hours - baseline_wh
+            event['seconds'] += dt
+
+    # ---------- Events ----------
+    def mark(self, name, active):
+        """Start/stop attributing energy to `name`; repeated marks in the same state are ignored"""
+        with self._lock:
+            event = self.events.setdefault(name, {'active': False, 'wh': 0.0, 'excess_wh': 0.0, 'seconds': 0.0, 'count': 0})
+            if active and not event['active']:
+                event['count'] += 1
+            event['active'] = bool(active)
+
+    @contextmanager
+    def event(self, name):
+        self.mark(name, True)
+        try:
+            yield
+        finally:
+            self.mark(name, False)
+
+    # ---------- Readouts ----------
+    def latest(self, window_s=1.0):
+        """(voltage, current, power) averaged over the last window_s seconds; raises if the sampler has stalled"""
+        with self._lock:
+            indices = self.buffer.since(time.monotonic() - window_s)
+            if not indices:
+                raise RuntimeError(f"no INA219 samples in the last {window_s} s ({self.last_error or 'sampler stalled'})")
+            n = len(indices)
+            buffer = self.buffer
+            return (round(sum(buffer.v[k] for k in indices) / n, 2),
+                    round(sum(buffer.i[k] for k in indices) / n, 1),
+                    round(sum(buffer.p[k] for k in indices) / n, 0))
+
+    @property
+    def used_mah(self):
+        return self.coulombs / 3.6
+
+    @property
+    def soc(self):
+        """State of charge (%): start-up voltage estimate minus the charge counted since"""
+        if self.start_soc is None:
+            return 0.0
+        return max(0.0, self.start_soc - 100 * self.used_mah / self.capacity_mah)
+
+    def average_current(self):
+        with self._lock:
+            indices = self.buffer.since(time.monotonic() - self.endurance_window)
+            if not indices:
+                return 0.0
+            return sum(self.buffer.i[k] for k in indices) / len(indices)
+
+    def remaining_minutes(self):
+        """Flight time left at the recent average current, or None before there is a current reading"""
+        milliamps = self.average_current()
+        if milliamps <= 0:
+            return None
+        remaining_mah = self.soc / 100 * self.capacity_mah
+        return round(remaining_mah / milliamps * 60, 0)
+
+    def summary(self):
+        """'tx 0.012Wh (x6), heat 0.420Wh (x1)' for display() and the console"""
+        with self._lock:
+            return ', '.join(f"{name} {event['wh']:.3f}Wh (x{event['count']})" for name, event in self.events.items())
@@ -28,59 +28,106 @@ Path to file: /home/11a/flight_3.4.py
 
 
 import asyncio
+import contextlib
 import csv
-from datetime import datetime, date
+import json
+from datetime import datetime, timedelta, timezone
 import gpiozero
-from gpiozero import Servo
-from gpiozero.pins.pigpio import PiGPIOFactory 
 import os
 import re
 
 from ina219 import INA219
-from ina219 import DeviceRangeError
 from LoRaRF import SX127x
 from pigpio_dht import DHT22
 
 import pynmea2
 import serial
-from shapely.geometry import Polygon, Point
 import subprocess
 import sys
 import time
 
+import aprs_codec
+from energy_monitor import EnergyMonitor
+from burst_fec import encode_burst
+from flight_log import FlightLogWriter
+from gps_clock import GpsClock
+from power_manager import PowerManager
+from telemetry_frame import TRIGGERS, FrameEncoder, pack_state
+import termination_core
+import ubx
+from uplink import CMD_ACK, CMD_CADENCE, CMD_ITERATIONS, CMD_PING, CMD_TERMINATE, UplinkReceiver, load_key
+from sensor_sampler import SensorSampler
+from telemetry_publisher import TelemetryPublisher
+from status_server import StatusServer
+from landing_predictor import LandingPredictor
+from latency_trace import LatencyTrace
+import solar
+
 
 #-------------------- INPUT REQUIRED --------------------
 # CONFIGURE NEO6M with the computer if the code wont do it
 
 flight_time_limit = 7200    # 3600 = 1h; 5400 = 90m; 7200 = 2h
 record_interval = 10        # seconds between recording flight data
+log_format = 'columnar'     # 'csv', 'columnar' (compressed .sbl) or 'both'
+log_block_rows = 120        # Rows per compressed log block (120 x 10 s = 20 min); an unclean power-off loses at most one block
+publish_interval = 1        # Seconds between live telemetry records for local subscribers (telemetry_publisher.py)
+trace_sample = 20           # Trace 1 in N GPS fixes from serial read to the termination core (latency_trace.py); 0 = off
+status_port = 8080          # HTTP /status, /metrics and /log/tail for a phone on the Pi's Wi-Fi (status_server.py); None = off
 display_interval = 10       # Seconds between data being displayed to the screen. !! MUST be LONGER thank sensor_interval
 sensor_interval = 20         # Seconds between sensor readings
+sensor_timeout = 5          # Seconds before a hung sensor read is abandoned (DHT22 retries, I2C hangs)
+energy_sample_rate = 20     # INA219 samples per second for energy accounting
+battery_capacity_mah = 2600 # Pack capacity used for state of charge and remaining flight time
 heat_time = 12              # Seconds Nichrome plate is heating 
 airborne_delta = 20         # Meters above launch site elevation to trigger airborne mode
+strobe_launch_window = 120  # Seconds the strobe runs after launch, day or night; otherwise dusk to dawn only
 
 update_interval = 2         # Minutes between updates
 msg_iterations = 2          # Total number of times the message will be sent per update burst
 msg_interval = 5            # Number of seconds between the burst messages (>=5 required)
+downlink_format = 'aprs'    # 'aprs' (ASCII object report) or 'binary' (compact telemetry frame; needs ground_station.py to decode)
+aprs_framing = 'object'     # 'aprs' downlink: 'object' (bare report), 'lora_aprs' (TNC2 for LoRa-APRS igates) or 'ax25' (UI frame)
+callsign = 'KW5AUS'         # Source address for the 'lora_aprs' and 'ax25' framings
+callsign_ssid = 11          # -11 = balloons, aircraft, spacecraft
+uplink_key_file = 'uplink.key'  # Shared secret for ground commands (uplink.py); no file = uplink disabled
+keyframe_interval = 10      # Binary downlink: a full keyframe every N frames, deltas against it in between
+burst_mode = 'repeat'       # 'repeat' (same packet msg_iterations times) or 'fec' (report erasure coded into fec_shards packets)
+fec_data_shards = 2         # FEC: the ground station rebuilds the report from any fec_data_shards of the fec_shards packets
+fec_shards = 3              # Run burst_fec.py to compare airtime and delivery against repetition
+tx_slot_offset = None       # Seconds into each UTC update_interval slot to start a burst (stagger balloons); None = free-running
+pps_pin = None              # GPIO wired to the NEO-6M PPS output for sub-10 ms timing; None = NMEA timing only
+gps_protocol = 'ubx'        # 'ubx' (binary NAV messages, NMEA off) or 'nmea' (RMC and GGA text only)
+gps_baud = 38400            # NEO-6M UART baud set at boot (it powers up at 9600)
+gps_rate_hz = 4             # Navigation solutions per second (NEO-6M maximum: 5)
 
 descent_threshold = 1500    # Meters above sea level to trigger descent
+parachute_descent_rate = 5.0    # Sea-level descent rate under the parachute (m/s); refit from the measured descent
+landing_elevation = None    # Meters MSL of the expected landing area; None = launch site (base_alt)
+landing_interval = 5        # Seconds between wind samples / landing predictions
+
+power_profile = 'auto'      # 'auto' (cruise once the float is steady), 'normal' or 'cruise'
+cruise_cadence_scale = 3    # Cruise: record/display/sensor intervals are multiplied by this
+cruise_listen_window = 30   # Cruise: seconds the uplink keeps listening after a burst before the radio sleeps
+cruise_steady_time = 600    # Seconds the altitude must hold inside cruise_steady_band before cruise
+cruise_steady_band = 300    # Meters
 
 
 
 # ***** This needs to be confirmed prior to Wednesday *****
 test_area = "Colorado Springs--Falcon Regional (elev: 2395 M)"
-bound_1 = Point(41.000187, -102.050539) #NE Corner
-bound_2 = Point(36.988411, -102.038130) #SE Corner
-bound_3 = Point(37.000241, -109.040373) #SW Corner
-bound_4 = Point(41.008131, -109.054018) #NW Corner
+bound_1 = (41.000187, -102.050539) #NE Corner
+bound_2 = (36.988411, -102.038130) #SE Corner
+bound_3 = (37.000241, -109.040373) #SW Corner
+bound_4 = (41.008131, -109.054018) #NW Corner
 
 
 """
 test_area = "California--Skylark Park (Elevation 32m)"
-bound_1 = Point(37.06231877848365, -120.34638618916614) #SE Corner
-bound_2 = Point(37.49052266840307, -120.69282482882616) #NE Corner
-bound_3 = Point(37.47952653379495, -121.10970599188374) #NW Corner
-bound_4 = Point(37.01622957747398, -120.91339076274305) #SW Corner
+bound_1 = (37.06231877848365, -120.34638618916614) #SE Corner
+bound_2 = (37.49052266840307, -120.69282482882616) #NE Corner
+bound_3 = (37.47952653379495, -121.10970599188374) #NW Corner
+bound_4 = (37.01622957747398, -120.91339076274305) #SW Corner
 """
 
 
@@ -112,9 +159,12 @@ if primary:
     I2C_BUS = 1
 
     ina = INA219(SHUNT_OHMS, MAX_EXPECTED_AMPS, address=0x40, busnum=I2C_BUS)
-    ina.configure(ina.RANGE_16V, ina.GAIN_1_40MV, ina.ADC_128SAMP, ina.ADC_128SAMP)
+    # 8-sample averaging (~4 ms per conversion) so the energy monitor can sample at energy_sample_rate; 128 samples takes 68 ms
+    ina.configure(ina.RANGE_16V, ina.GAIN_1_40MV, ina.ADC_8SAMP, ina.ADC_8SAMP)
+    energy = EnergyMonitor(ina, energy_sample_rate, battery_capacity_mah)
 else:
     ina = None
+    energy = None
 
 
 #-------------------- SERIAL PORT SETUP --------------------
@@ -138,7 +188,11 @@ except RuntimeError as e:
     
 ser = serial.Serial(port_used, baudrate=9600, timeout=0.5)
 dataout = pynmea2.NMEAStreamReader()
+gps_parser = ubx.UBXParser()
 newdata = ser.readline()
+gps_clock = GpsClock(nmea_baud=ser.baudrate)    # Monotonic clock -> GPS UTC, for slots, timestamps and the log
+if pps_pin is not None:
+    gps_clock.attach_pps(pps_pin)
 
 
 #-------------------- GPIO SETUP --------------------
@@ -161,13 +215,10 @@ strobe_led = gpiozero.PWMOutputDevice(5)
 strobe_led.value = relay_off 
 status_led = gpiozero.PWMOutputDevice(6)
 status_led.value = relay_off 
-heat_element = gpiozero.PWMOutputDevice(26)
-heat_element.value = relay_off 
+# The servo (GPIO 4, pin 7, primary only) and the nichrome (GPIO 26) are driven by termination_core.py, not here
+servo_open = 1
+servo_close = -1
 if primary:
-    servo = Servo(4, pin_factory=PiGPIOFactory()) # Pin 7
-    servo_open = 1
-    servo_close = -1
-    servo.value = servo_close
     sensor_dht22 = DHT22(16)
 else:
     sensor_dht22 = None 
@@ -202,8 +253,11 @@ terminate = False
 intact = True 
 trigger = ''
 
-polygon = Polygon([bound_1, bound_2, bound_3, bound_4])
+fence = [bound_1, bound_2, bound_3, bound_4]     # (lat, lon) for termination_core.py, which owns the geofence
 contained = False
+core_block = termination_core.SharedBlock.open(f"saber_core_{balloon_id}")   # Fixed name: a restart finds a running core
+core_process = None     # Popen of the core this run started; None while adopting one a previous run left running
+core_pid = None
 
 int_temp = 0.0
 int_humid = 0.0
@@ -211,24 +265,45 @@ voltage = 0.0
 current = 0.0
 power = 0.0
 charge = 0.0
+energy_used = 0.0
+endurance = None
 baro_alt = 0
 
-start_time = None
 flight_time = 0
 record_time = '' 
+log_writer = None
 
 msg_sent = ''
+update_now = None     # asyncio.Event: wakes periodic_update() early (uplink ping / cadence change)
 object_report = 'None'
 tx_counter = 0
 send_update = True
 tx_time = 0
 tx_rate = 0
+frame_encoder = FrameEncoder(balloon_id, keyframe_interval)
+aprs_encoders = {'lora_aprs': aprs_codec.TNC2Encoder(callsign, callsign_ssid), 'ax25': aprs_codec.AX25Encoder(callsign, callsign_ssid)}  # Headers encoded once
+last_fix = None     # (monotonic time, altitude) at the previous transmit, for the vertical rate
+publisher = None    # Local telemetry socket + shared-memory ring, created in main()
+status_server = StatusServer(port=status_port) if status_port else None
+tracer = LatencyTrace(f"{balloon_id}_latency_{datetime.now().strftime('%d%b_%H%M')}.csv", trace_sample)
+fix_id = 0          # Trace id of the latest position fix, carried to the termination core
+predictor = LandingPredictor(parachute_descent_rate)     # Winds learned on ascent; landing point once coming down
 
 #-------------------- NEO-6M Initialization --------------------
-def neo6m_configure(): 
-    print(f'{YELLOW}{"Configure NEO-6M before flight!!!"}{RESET}')
-    # Put actual code here to send the config message
-    
+def neo6m_configure():
+    global gps_protocol
+    (results, protocol) = ubx.configure(ser, gps_baud, gps_rate_hz, gps_protocol)  # Airborne <2g, gps_rate_hz, unused NMEA off
+    gps_clock.nmea_baud = ser.baudrate
+    failed = [step for step, acked in results.items() if not acked]
+    if failed:
+        print(f'{RED}{"NEO-6M config:":<25}{RESET}Not acknowledged: {", ".join(failed)}')
+    if protocol != gps_protocol or ser.baudrate != gps_baud:
+        print(f'{ORANGE}{"NEO-6M fallback:":<25}{RESET}{protocol.upper()} at {ser.baudrate} baud')
+        gps_protocol = protocol     # gps() follows whatever the receiver is actually sending
+    elif not failed:
+        print(f'{GREEN}{"NEO-6M config:":<25}{RESET}{gps_protocol.upper()} at {ser.baudrate} baud, {gps_rate_hz} Hz, airborne <2g')
+neo6m_configure()
+
     
 #-------------------- SX1278 Initialization --------------------
 LoRa = SX127x()
@@ -251,6 +326,8 @@ def configure_sx1278():
     # Set syncronize word for public network (0x3444)
     LoRa.setSyncWord(0x2005)    # Set syncronize word for public network (0x3444)
 configure_sx1278()
+uplink_key = load_key(uplink_key_file)
+uplink = UplinkReceiver(LoRa, balloon_id, uplink_key) if primary and uplink_key else None
 
     
 #-------------------- Preflight Information --------------------    
@@ -265,6 +342,7 @@ print(f"{MAGENTA}{'-' * 100}{RESET}\n"
     f"{CYAN}{'Radio Config':<50}{'Station Info':<20}{RESET}\n"
     f"{'Transmit frequency:':<20}{YELLOW}{LoRa._frequency / 1000000:.3f}{' MHz':<23}{RESET}"
       f"{'Station ID:':<20}{YELLOW}{'NONE'}{RESET}\n"
+    f"{'Uplink:':<20}{YELLOW}{'Listening between bursts' if uplink else 'Disabled (no key file)':<30}{RESET}\n"
     f"{'Bandwidth:':<20}{YELLOW}{LoRa._bw / 1000000:>7.3f}{' MHz':<23}{RESET}"
       f"{'Station config:':<20}{YELLOW}{'Balloon'}{RESET}\n"
     f"{'Spreading factor:':<20}{YELLOW}{LoRa._sf:<30}{RESET}\n"
@@ -281,12 +359,51 @@ def print_mark(mark):  # TROUBLESHOOTING
 
 
 #-------------------- TELEMETRY --------------------
+def read_gps_line():
+    """Blocking serial read (runs in a worker thread); the arrival time is taken as soon as the line is complete"""
+    line = ser.readline()
+    return line, time.monotonic()
+
+
+def read_gps_chunk():
+    """Blocking serial read (runs in a worker thread) of whatever UBX bytes have arrived, at least one"""
+    data = ser.read(ser.in_waiting or 1)
+    return data, time.monotonic()
+
+
 async def gps():  #~~~~~ TASK 1 ~~~~~
     global gps_valid, gps_lat, gps_lon, gps_spd, gps_trk, gps_time, gps_day, map_link, gps_alt, gps_sat, airborne
-    global max_alt, descent_alt
+    global max_alt, descent_alt, fix_id
+    loop = asyncio.get_running_loop()
     while True:
         try:
-            newdata = ser.readline()
+            if gps_protocol == 'ubx':
+                (newdata, received) = await loop.run_in_executor(None, read_gps_chunk)
+                for msg in gps_parser.feed(newdata):    # Fields are unpacked in place; no text parsing
+                    if msg['name'] == 'NAV-POSLLH':
+                        gps_lat = round(msg['lat'], 5)
+                        gps_lon = round(msg['lon'], 5)
+                        gps_alt = round(msg['alt'], 1)
+                        map_link = f'{gps_lat},{gps_lon}'
+                        fix_id += 1
+                        core_block.write_telemetry(fix_time=received, lat=gps_lat, lon=gps_lon, alt=gps_alt, fix_id=fix_id)
+                        tracer.fix(fix_id, received, time.monotonic())
+                    elif msg['name'] == 'NAV-VELNED':
+                        gps_spd = round(msg['speed_kts'], 1)
+                        gps_trk = round(msg['track'], 1)
+                    elif msg['name'] == 'NAV-SOL':
+                        gps_valid = msg['valid']
+                        gps_sat = str(msg['sats'])
+                        core_block.write_telemetry(gps_valid=gps_valid)
+                    elif msg['name'] == 'NAV-TIMEUTC' and msg['valid']:
+                        fix_utc = datetime(msg['year'], msg['month'], msg['day'], msg['hour'], msg['minute'], msg['second'])
+                        gps_time = fix_utc.strftime('%H:%M:%S')
+                        gps_day = fix_utc.strftime('%d')
+                        if gps_valid:
+                            gps_clock.on_rmc(fix_utc + timedelta(microseconds=msg['nano'] / 1000), received, ubx.TIMEUTC.size + 8)
+                await asyncio.sleep(.01)
+                continue
+            (newdata, received) = await loop.run_in_executor(None, read_gps_line)  # readline() no longer stalls the loop
             if newdata[0:6] == b"$GPRMC":
                 rmcmsg = pynmea2.parse(newdata.decode('utf-8'))
                 gps_valid = True if rmcmsg.status == "A" else False
@@ -295,39 +412,59 @@ async def gps():  #~~~~~ TASK 1 ~~~~~
                 gps_spd = float("{:.1f}".format(rmcmsg.spd_over_grnd)) if rmcmsg.spd_over_grnd is not None else 0.0
                 gps_trk = float("{:.1f}".format(rmcmsg.true_course)) if rmcmsg.true_course is not None else 0.0
                 gps_time = rmcmsg.timestamp.strftime('%H:%M:%S')
-                #gps_day = rmcmsg.timestamp.strftime('%d')  # added to get the date for use in the APRS message
-                gps_day = str(date.today().day)
+                if rmcmsg.datestamp is not None:
+                    gps_day = rmcmsg.datestamp.strftime('%d')   # UTC day from the fix, not the Pi's local date
+                    if gps_valid:
+                        gps_clock.on_rmc(datetime.combine(rmcmsg.datestamp, rmcmsg.timestamp), received, len(newdata))
                 map_link = f'{gps_lat},{gps_lon}'
+                fix_id += 1
+                core_block.write_telemetry(fix_time=received, lat=gps_lat, lon=gps_lon, gps_valid=gps_valid, fix_id=fix_id)
+                tracer.fix(fix_id, received, time.monotonic())
             if newdata[0:6] == b"$GPGGA":
                 ggamsg = pynmea2.parse(newdata.decode('utf-8'))
                 gps_alt = float("{:.1f}".format(ggamsg.altitude))
                 gps_sat = ggamsg.num_sats
+                core_block.write_telemetry(alt=gps_alt)
             await asyncio.sleep(.01)  # This must be the smallest sleep in all the code
         except Exception as e:
             print(f"\n{RED}{'GPS data error:':<25}{RESET}{e}\n")
         
  
 async def record():  #~~~~~ TASK 2 ~~~~~
-    global record_interval, record_time
+    global record_interval, record_time, log_writer
     filetime = datetime.now().strftime('%d%b_%H%M')  # Format (DDMon_HHMM)
     filename = f"{balloon_id}_flight_data_{filetime}.csv"
-    print(f'{MAGENTA}{"Data record created:":<25}{RESET}{filename}\n')
+    if log_format in ('columnar', 'both'):
+        log_writer = FlightLogWriter(filename[:-4] + '.sbl', block_rows=log_block_rows)
+        print(f'{MAGENTA}{"Data record created:":<25}{RESET}{log_writer.filename}\n')
+    if log_format in ('csv', 'both'):
+        print(f'{MAGENTA}{"Data record created:":<25}{RESET}{filename}\n')
     while True:
         try:        
-            with open(filename, mode='a', newline='') as file:  # Open the CSV file in append mode
-                csv_writer = csv.writer(file)  # Create a CSV writer object
-                if file.tell() == 0:  # Write the headers if the file is empty
-                    csv_writer.writerow(["CPU Time", "GPS Time", "Latitude", "Longitude", "Altitude (M)", 
-                                         "Track", "Speed (kts)", "Flt mode", "Elapsed (s)", "Contained", 
-                                         "Terminate", "Intact", "Trigger", "Int temp", "Int humid", 
-                                         "Voltage (V)", "Current (mA)", "Power (mW)"])
-                record_time = datetime.now().strftime("%H:%M:%S")
-                csv_writer.writerow([record_time, gps_time, gps_lat, gps_lon, gps_alt, 
-                                     gps_trk, gps_spd, airborne, flight_time, contained, 
-                                     terminate, intact, trigger, int_temp, int_humid, 
-                                     voltage, current, power]) 
+            record_time = datetime.now().strftime("%H:%M:%S")
+            row = [record_time, gps_time, gps_lat, gps_lon, gps_alt, 
+                   gps_trk, gps_spd, airborne, flight_time, contained, 
+                   terminate, intact, trigger, int_temp, int_humid, 
+                   voltage, current, power, charge, 
+                   energy_used, endurance, power_mgr.profile, power_mgr.wh_per_hour(), 
+                   *landing_fields(), round(gps_clock.utc_timestamp(), 3)]
+            if status_server is not None:
+                status_server.log(row)
+            if log_writer is not None:
+                log_writer.append(row[-1:] + row[1:-1])  # Columnar log stores GPS-disciplined Unix time in place of CPU Time
+            if log_format in ('csv', 'both'):
+                with open(filename, mode='a', newline='') as file:  # Open the CSV file in append mode
+                    csv_writer = csv.writer(file)  # Create a CSV writer object
+                    if file.tell() == 0:  # Write the headers if the file is empty
+                        csv_writer.writerow(["CPU Time", "GPS Time", "Latitude", "Longitude", "Altitude (M)", 
+                                             "Track", "Speed (kts)", "Flt mode", "Elapsed (s)", "Contained", 
+                                             "Terminate", "Intact", "Trigger", "Int temp", "Int humid", 
+                                             "Voltage (V)", "Current (mA)", "Power (mW)", "Charge (%)", 
+                                             "Energy (Wh)", "Endurance (min)", "Power profile", "Profile (Wh/h)", 
+                                             "Landing lat", "Landing lon", "Landing UTC (s)", "GPS UTC (s)"])
+                    csv_writer.writerow(row) 
                 # print(f'\n{MAGENTA}{"Data written to CSV:":<25}{RESET}Time {record_time} at {gps_alt}m MSL located: {gps_lat} / {gps_lon} traveling {gps_trk}deg at {gps_spd}kts\n')
-            await asyncio.sleep(record_interval)   # Wait for x seconds before writing to the CSV file again
+            await asyncio.sleep(power_mgr.interval(record_interval))   # Wait for x seconds before writing to the CSV file again
         except Exception as e:
             print(f"\n{RED}{'CSV write error:':<25}{RESET}{e}\n")
   
@@ -337,16 +474,32 @@ async def display():  #~~~~~ TASK 3 ~~~~~
     while True:
         try:
             timestamp = datetime.now().strftime("%H:%M:%S")
-            print(f"{'CPU time:':<18}{MAGENTA}{timestamp:<10}{RESET}{'Local':<10} {'Sunrise:':<18}{'None'}{' UTC':<10} {'Temperature (°C):':<20}{int_temp:<20.1f}")
-            print(f"{'GPS time:':<18}{BLUE}{gps_time:<10}{RESET}{'UTC':<10} {'Sunset:':<18}{'None'}{' UTC':<10} {'Humidity (%):':<20}{int_humid:<20.1f}")
+            (sunrise, sunset) = sun_times()
+            print(f"{'CPU time:':<18}{MAGENTA}{timestamp:<10}{RESET}{'Local':<10} {'Sunrise:':<18}{sunrise}{' UTC':<10} {'Temperature (°C):':<20}{int_temp:<20.1f}")
+            print(f"{'GPS time:':<18}{BLUE}{gps_time:<10}{RESET}{'UTC':<10} {'Sunset:':<18}{sunset}{' UTC':<10} {'Humidity (%):':<20}{int_humid:<20.1f}")
             print(f"{'Lat:':<18}{gps_lat:<20.6f} {'Track (°):':<18}{gps_trk:<14} {'Bus Voltage (V):':<20}{voltage:<5.1f}")
             print(f"{'Lng:':<17}{gps_lon:<21.6f} {'Speed (kts):':<18}{gps_spd:<14} {'Bus Current (mA):':<20}{current:<5.1f}") 
             print(f"{'GPS Alt (M):':<18}{gps_alt:<20.1f} {'Satellites:':<18}{gps_sat:<14} {'Bus Power (mW):':<20}{power:<5.0f}")
+            if primary:
+                print(f"{'Battery (%):':<18}{charge:<20.1f} {'Endurance (min):':<18}{str(endurance):<14} {'Energy (Wh):':<20}{energy_used:<5.3f}")
+                print(f"{'Sensors:':<18}{sampler.status()}")
+                print(f"{'Energy events:':<18}{energy.summary()}")
+            print(f"{'Power profile:':<18}{power_mgr.summary()}")
+            print(f"{'GPS clock:':<18}{gps_clock.status()}")
+            if publisher is not None:
+                print(f"{'Local telemetry:':<18}{publisher.summary()}")
+            if status_server is not None:
+                print(f"{'Status server:':<18}{status_server.summary()}")
+            print(f"{'Landing:':<18}{predictor.summary()}")
+            print(f"{'Latency trace:':<18}{tracer.summary()}")
             print(f"{'GPS Valid:':<18}{GREEN if gps_valid else RED}{'Valid' if gps_valid else 'NO GPS':<21}{RESET}{'Location:':<18}{RESET if gps_valid else RED}http://maps.google.com/?q={map_link}{RESET}")
             print(f"{'Flight status:':<18}{GREEN if airborne else ORANGE}{'Airborne' if airborne else 'Ground':<21}{RESET}{'Geofenced:':<18}{GREEN if contained else RED}{'Contained' if contained else 'OUTSIDE':<21}{RESET}") 
             
             print(f"{'Flight time:':<18}{CYAN}{flight_time:<21}{RESET}{'Time limit:':<18}{flight_time_limit:<20}")
             print(f"{'Trigger:':<18}{ORANGE}{trigger:<21}{RESET}{'Intact:':<18}{'True' if intact else 'False':<20}")
+            status = core_block.read_status()
+            if status is not None and status['pid']:
+                print(f"{'Term core:':<18}{termination_core.summary(status, status['pid'])}")
             #print(f"{'Max Alt:':<18}{max_alt:<21}{'Mode:':<18}{'Climbing' if climbing else 'Cruising' if cruising else 'Descending' if descending else 'Ground':<20}")
             print(f"{MAGENTA}{'CSV update:':<18}{GREEN}{record_time}{RESET}")
             print(f"{BLUE}{'Message:':<18}{YELLOW}{object_report}{RESET}")
@@ -356,7 +509,7 @@ async def display():  #~~~~~ TASK 3 ~~~~~
             print(f"{RESET}{'Base Alt:':<18}{RESET}{str(base_alt):<21}")
             print(f"{RESET}{'Descent Alt:':<18}{RESET}{descent_alt:<21}{RESET}{'Max Alt:':<18}{RESET}{max_alt:<21}")
             print(f"{RESET}{'-' * 100}{RESET}")
-            await asyncio.sleep(display_interval)   
+            await asyncio.sleep(power_mgr.interval(display_interval))   
         except Exception as e:
             print(f"\n{RED}{'Display Error:':<25}{RESET}{e}\n")
             break
@@ -429,8 +582,26 @@ def assess_descent():
             print(f"\n{RED}{'Flight assessment error:':<25}{RESET}{e}\n")  """
                  
 
+def sun_times():
+    """Ground-level sunrise/sunset at the balloon ('HHMM' UTC), from the cached ephemeris; 'None' before a fix"""
+    if not gps_valid:
+        return 'None', 'None'
+    times = solar.sun_times(solar.solar_day(gps_clock.utc_now(), gps_lon), gps_lat, gps_lon)
+    return tuple('None' if moment is None else moment.strftime('%H%M') for moment in times)
+
+
+def strobe_needed():
+    """Collision lights: dusk to dawn at ground level, and for strobe_launch_window seconds after launch"""
+    if flight_time < strobe_launch_window:
+        return True
+    if gps_lat == 0.0 and gps_lon == 0.0:
+        return True     # Never had a fix: no way to tell day from night, so keep the lights on
+    return not solar.is_daylight(gps_clock.utc_now(), gps_lat, gps_lon)
+
+
 async def assess_airborne():  #~~~~~ TASK 4 ~~~~~
-    global airborne, contained, status_led, strobe_led, descent_alt, descending
+    global airborne, status_led, strobe_led, descent_alt, descending
+    descent_tx = False
     while True:
         try:
             await asyncio.sleep(sensor_interval)    # If it lands at a lower elevation, the strobes will turn off
@@ -438,21 +609,21 @@ async def assess_airborne():  #~~~~~ TASK 4 ~~~~~
                 await set_base_alt() 
                 if gps_valid and contained:
                     status_led.value = relay_on
-                    strobe_led.value = relay_off    # not required as the strobes are already off
+                    set_strobe(relay_off)    # not required as the strobes are already off
                     descent_tx = False
                 elif gps_alt > (base_alt + airborne_delta):
                     airborne = True
                 else:   
                     airborne = False
             else:         
-                strobe_led.value = relay_on       # Consider turning on the strobes for 1 minute and then again only at night time
                 status_led.value = relay_off
                 descending = assess_descent()
                 if descending and descent_alt < 3048 and not descent_tx:   # ***** NEW ADDITION TO SEND AN UPDATE ON DESCENT *****
                     await transmit_report()     # 5486M = 18,000ft, 3048M = 10,000ft, 1524M = 5,000ft
                     descent_tx = True
-                if gps_alt < 3048 and descent_tx:
-                    strobe_led.value = relay_off  
+                landing = gps_alt < 3048 and descent_tx
+                set_strobe(relay_on if strobe_needed() and not landing else relay_off)    # Dusk to dawn + 2 min post launch
+            power_mgr.update(airborne and intact and contained and gps_valid and not descending, gps_alt)
             """else: 
                 strobe_led.value = relay_off
                 status_led.value = relay_off"""
@@ -462,44 +633,121 @@ async def assess_airborne():  #~~~~~ TASK 4 ~~~~~
             print(f"\n{RED}{'Assessment error:':<25}{RESET}{e}\n")
 
 
-async def environmental_monitor():  #~~~~~ TASK 5 ~~~~~
-    global int_temp, int_humid
-    while primary:
+async def publish_telemetry():  #~~~~~ TASK 11 ~~~~~
+    """Live state for other processes on the Pi; slow or vanished subscribers drop records, never block the loop"""
+    while True:
         try:
-            await asyncio.sleep(sensor_interval)
-            result = sensor_dht22.read()
-            if 'temp_c' in result and 'humidity' in result:     # Ensure the result contains the expected data
-                raw_temp = result['temp_c']
-                int_temp = round(-1 * (raw_temp + 3276.8), 1) if raw_temp < 0 else round(raw_temp, 1)  # known error with sub-zero temps
-                int_humid = round(float(result['humidity']), 1)     # Directly convert the formatted string to a float
-            else:
-                print(f"\n{RED}{'DHT-22 data missing':<25}{RESET}\n")   # Handle cases where 'temp_c' or 'humidity' is missing in the result
+            publisher.publish({
+                'monotonic': time.monotonic(), 'utc': gps_clock.utc_timestamp(),
+                'lat': gps_lat, 'lon': gps_lon, 'alt': gps_alt, 'track': gps_trk, 'speed': gps_spd,
+                'voltage': voltage, 'current': current, 'power': power, 'temp': int_temp, 'humid': int_humid,
+                'charge': charge, 'flight_time': flight_time,
+                'state': pack_state(airborne, contained, intact, terminate, gps_valid, trigger),
+                'sats': int(gps_sat or 0), 'tx_counter': tx_counter,
+            })
+            if status_server is not None:
+                (landing_lat, landing_lon, landing_utc) = landing_fields()
+                status_server.update({      # Serialized only when a phone asks and the state has changed
+                    'gps_time': gps_time, 'gps_valid': gps_valid, 'lat': gps_lat, 'lon': gps_lon, 'alt': gps_alt,
+                    'track': gps_trk, 'speed': gps_spd, 'sats': int(gps_sat or 0), 'map_link': map_link,
+                    'airborne': airborne, 'contained': contained, 'intact': intact, 'terminate': terminate,
+                    'trigger': trigger, 'flight_time': flight_time, 'flight_time_limit': flight_time_limit,
+                    'voltage': voltage, 'current': current, 'power': power, 'charge': charge,
+                    'energy_used': energy_used, 'endurance': endurance, 'temp': int_temp, 'humid': int_humid,
+                    'power_profile': power_mgr.profile, 'tx_counter': tx_counter, 'gps_clock': gps_clock.status(),
+                    'landing_lat': landing_lat, 'landing_lon': landing_lon, 'landing_utc': landing_utc,
+                })
         except Exception as e:
-            print(f"\n{RED}{'DHT-22 error:':<25}{RESET}{e}\n")
-        await asyncio.sleep(3)
-        #print_mark(5)
+            print(f"\n{RED}{'Publisher error:':<25}{RESET}{e}\n")
+        await asyncio.sleep(publish_interval)
 
 
-async def electrical_monitor():  #~~~~~ TASK 6 ~~~~~
-    global voltage, current, power, charge
-    while primary:
+async def landing_prediction():  #~~~~~ TASK 12 ~~~~~
+    """
+    - Feeds every airborne fix's ground velocity into the wind profile (ascent, float and descent alike)
+    - Once the balloon is coming down (descent detected, payload cut away or a measured fall), re-predicts the landing
+      point from the current fix; record() logs it and format_report() sends it
+    """
+    while True:
         try:
-            await asyncio.sleep(sensor_interval)
-            voltage = ina.voltage()
-            current = ina.current()
-            power = ina.power()
-            
-            """
-            #Check this in the preflight code prior to putting into use
-            voltage = float("{:.1f}".format(ina.voltage))
-            current = float("{:.1f}".format(ina.current))
-            power = float("{:.1f}".format(ina.power))
-            charge = 100 * ((voltage-9.5)/(12.22-9.5)) # full = 12.22v, empty = 9.5v, dead = 8.6v
-            """
-        except DeviceRangeError as e:
-            print(f'\n{RED}{"INA-219 error:":<25}{RESET}{e}\n')
-        await asyncio.sleep(10) # Wait 10 sec prior to next reading
-        # print_mark(6)
+            if gps_valid and airborne:
+                predictor.ground_alt = base_alt if landing_elevation is None else landing_elevation
+                predictor.observe(gps_alt, gps_trk, gps_spd, time.monotonic())
+                if descending or not intact or predictor.falling:
+                    predictor.predict(gps_lat, gps_lon, gps_alt, datetime.fromtimestamp(gps_clock.utc_timestamp(), timezone.utc))
+        except Exception as e:
+            print(f"\n{RED}{'Landing prediction error:':<25}{RESET}{e}\n")
+        await asyncio.sleep(landing_interval)
+
+
+def landing_fields():
+    """(lat, lon, unix time) of the latest landing prediction, or Nones before the descent"""
+    if predictor.last is None:
+        return None, None, None
+    return predictor.last['lat'], predictor.last['lon'], round(predictor.last['utc'].timestamp())
+
+
+#-------------------- SENSORS --------------------
+# The driver calls below block (DHT22 retries, I2C), so they run in the sampler's worker threads, never on the event loop
+sampler = SensorSampler()
+
+def read_dht22():
+    result = sensor_dht22.read()
+    if 'temp_c' not in result or 'humidity' not in result:     # Ensure the result contains the expected data
+        raise ValueError('DHT-22 data missing')
+    raw_temp = result['temp_c']
+    temp = round(-1 * (raw_temp + 3276.8), 1) if raw_temp < 0 else round(raw_temp, 1)  # known error with sub-zero temps
+    humid = round(float(result['humidity']), 1)     # Directly convert the formatted string to a float
+    return temp, humid
+
+
+def read_ina219():
+    return energy.latest()      # Averaged from the energy monitor's high-rate samples; no extra I2C traffic
+
+
+def update_environment(value):
+    global int_temp, int_humid
+    (int_temp, int_humid) = value
+
+
+def update_electrical(value):
+    global voltage, current, power, charge, energy_used, endurance
+    (voltage, current, power) = value
+    charge = round(energy.soc, 1)
+    energy_used = round(energy.watt_hours, 3)
+    endurance = energy.remaining_minutes()
+
+
+def energy_event(name):
+    """Attributes the energy used inside the with-block to `name` (TX, heat element)"""
+    return energy.event(name) if energy is not None else contextlib.nullcontext()
+
+
+def uplink_tx():
+    """Takes the radio out of uplink RX for one packet and re-arms it as soon as TX is done"""
+    return uplink.transmitting() if uplink is not None else contextlib.nullcontext()
+
+
+def set_strobe(value):
+    strobe_led.value = value
+    if energy is not None:
+        energy.mark('strobe', value == relay_on)
+
+
+if primary:
+    sampler.register('dht22', read_dht22, sensor_interval + 3, sensor_timeout, on_update=update_environment)
+    sampler.register('ina219', read_ina219, sensor_interval + 10, sensor_timeout, on_update=update_electrical)
+
+power_mgr = PowerManager(LoRa, ser, energy, uplink, sampler, power_profile, cruise_cadence_scale,
+                         cruise_listen_window, cruise_steady_time, cruise_steady_band)
+
+
+async def sensor_monitor():  #~~~~~ TASKS 5 & 6 ~~~~~
+    """
+    - Environmental (DHT22) and electrical (INA219) monitoring, each on its own cadence and hard timeout
+    - Last good values stay published with their age; sampler.status() shows stale devices and error counts
+    """
+    await asyncio.gather(*sampler.start())
 
 
 async def baro_monitor():  #~~~~~ TASK 7 ~~~~~   *** THIS IS NOT FUNCTIONAL ***
@@ -515,154 +763,244 @@ async def baro_monitor():  #~~~~~ TASK 7 ~~~~~   *** THIS IS NOT FUNCTIONAL ***
         
         
 # ---------- OBJECT REPORT for the AX.25 INFORMATION FIELD ---------- 
-def convert_coordinates(coordinate, is_latitude=True):
-    degrees = int(coordinate)       # Extract the degrees part
-    minutes = abs(coordinate - degrees) * 60
-    
-    if is_latitude:
-        # Latitude: 2 digits for degrees, 2 for minutes (to two decimal places), followed by N or S
-        ddmm = f"{abs(degrees):02d}{minutes:05.2f}"  # 2 digits for degrees, 4 for minutes
-        direction = 'N' if coordinate >= 0 else 'S'
-        return f"{ddmm}{direction}"  # Total length = 8 characters
+async def format_report():
+    global object_report
+    comment = aprs_codec.flight_comment(gps_alt, flight_time, intact, trigger)    # Max 43 Characters
+    if predictor.last is not None:      # Coming down: the landing point takes the battery suffix's place
+        suffix = aprs_codec.landing_comment(predictor.last['lat'], predictor.last['lon'], predictor.last['utc'], gps_lat, gps_lon)
+        if suffix:      # Compact form (whole m and min, one-letter trigger) so it fits after a termination as well
+            comment = aprs_codec.flight_comment(gps_alt, flight_time, intact, trigger, compact=True)
+    elif energy is not None:
+        suffix = f"B{charge:.0f}%{'' if endurance is None else round(endurance / 60, 1)}h"   # Battery % and hours left
     else:
-        # Longitude: 3 digits for degrees, 2 for minutes (to two decimal places), followed by E or W
-        ddmm = f"{abs(degrees):03d}{minutes:05.2f}"  # 3 digits for degrees, 4 for minutes
-        direction = 'E' if coordinate >= 0 else 'W'
-        return f"{ddmm}{direction}"  # Total length = 9 characters
+        suffix = ''
+    if len(comment) + len(suffix) <= aprs_codec.COMMENT_MAX:
+        comment += suffix
+    # Object name is a fixed 9 characters; '*' = live Object; Primary Symbol Table, Balloon = "O"
+    object_report = aprs_codec.object_report("SABER_" + balloon_id, gps_clock.aprs_timestamp() if gps_clock.synced else aprs_codec.aprs_timestamp(gps_day, gps_time),
+                                             gps_lat, gps_lon, gps_trk, gps_spd, comment)
+    return object_report        
 
 
-async def format_report():
+def format_frame():
+    """Binary telemetry frame (telemetry_frame.py) carrying the same state as the object report, plus vertical rate"""
+    global last_fix
+    now = time.monotonic()
+    vertical_rate = 0.0 if last_fix is None or now == last_fix[0] else (gps_alt - last_fix[1]) / (now - last_fix[0])
+    last_fix = (now, gps_alt)
+    if gps_clock.synced:
+        utc = gps_clock.utc_now()
+        (day, hours, minutes, seconds) = (utc.day, utc.hour, utc.minute, utc.second)
+    else:
+        (hours, minutes, seconds) = (int(part) for part in gps_time.split(':')) if gps_time else (0, 0, 0)
+        day = int(gps_day)
+    values = {
+        'time': day * 86400 + hours * 3600 + minutes * 60 + seconds,
+        'lat': gps_lat, 'lon': gps_lon, 'alt': gps_alt, 'vrate': vertical_rate,
+        'track': gps_trk, 'speed': gps_spd, 'flight': flight_time,
+        'volts': voltage, 'temp': int_temp, 'battery': charge,
+        'endurance': None if endurance is None else endurance / 60,
+        'state': pack_state(airborne, contained, intact, terminate, gps_valid, trigger),
+    }
+    return frame_encoder.encode(values, tx_counter)
+
+
+async def build_payload():
     global object_report
-    
-    info_field_data_id = ";"                # The ; is the APRS Data Type Identifier for an Object Report
-    object_name = "SABER_" + balloon_id     # Fixed 9-character Object name, which may consist of any printable ASCII characters
-    alive_killed = '*'                      # a * or _ separates the Object name from the rest of the report '*' = live Object. '_' = killed Object
-    aprs_timestamp = f"{gps_day}{gps_time[:2]}{gps_time[3:5]}z"  # 7 bytes (DDHHMMz)
-    aprs_lat = convert_coordinates(gps_lat, True)
-    sym_table_id = "/"
-    aprs_lon = convert_coordinates(gps_lon, False)
-    symbol_code = "O"                       # Primary Symbol Table, Balloon = "O" (SSID -11)
-    crs_spd = f"{int(gps_trk):03d}/{int(gps_spd):03d}"
-    aprs_comment = f"++Alt:{gps_alt}m_{round(flight_time / 60, 1)}min^{'Intact' if intact else 'Killed'}>{trigger}<"   # Max 43 Characters
-            
-    object_report = (
-        f"{info_field_data_id}{object_name}{alive_killed}{aprs_timestamp}"
-        f"{aprs_lat}{sym_table_id}{aprs_lon}{symbol_code}{crs_spd}{aprs_comment}"
-    )
-    return object_report        
+    object_report = await format_report()    
+    if downlink_format == 'binary':
+        return format_frame()
+    info = object_report.encode('utf-8')
+    return aprs_encoders[aprs_framing].frame(info) if aprs_framing in aprs_encoders else info
 
 
 async def transmit_report():  
-    global tx_counter, msg_sent, object_report, tx_time, tx_rate
     try:
-        object_report = await format_report()    
-        byte_message = list(object_report.encode('utf-8'))  # Converts the string to a byte array and then into a list of numbers for each byte
-        
+        await transmit_packet(await build_payload())
+    except Exception as e:
+        print(f"\n{RED}{'Transmit Error:':<25}{RESET}{e}\n")
+
+
+async def transmit_burst():
+    """One update burst: the same packet msg_iterations times, or the report erasure coded across fec_shards packets"""
+    if burst_mode != 'fec':
+        for _ in range(msg_iterations):  # Loop for a fixed number of iterations
+            await transmit_report()  # Call the async function
+            await asyncio.sleep(msg_interval)  
+        return msg_iterations
+    try:
+        shards = encode_burst(balloon_id, await build_payload(), fec_data_shards, fec_shards)
+        for shard in shards:
+            await transmit_packet(shard)
+            await asyncio.sleep(msg_interval)
+        return len(shards)
+    except Exception as e:
+        print(f"\n{RED}{'Transmit Error:':<25}{RESET}{e}\n")
+        return 0
+
+
+async def transmit_packet(payload):  
+    global tx_counter, msg_sent, tx_time, tx_rate
+    byte_message = list(payload)  # Converts the bytes into a list of numbers for each byte
+    with energy_event('tx'), uplink_tx():
+        power_mgr.radio_wake()
         LoRa.beginPacket()
         LoRa.write(byte_message, len(byte_message))   # This sends the message, which is now a byte array
         LoRa.write([tx_counter], 1)    # This sends the counter value, which is likely an additional byte appended to the message, perhaps to indicate a message sequence number or packet identifier.
         LoRa.endPacket()
         LoRa.wait()
-        
-        tx_counter = (tx_counter + 1) % 256
-        msg_sent = datetime.now().strftime("%H:%M:%S")
-        tx_time = f"{LoRa.transmitTime() / 1000:.2f}"
-        tx_rate = f"{LoRa.dataRate():.2f}"
-    except Exception as e:
-        print(f"\n{RED}{'Transmit Error:':<25}{RESET}{e}\n")
+    
+    tx_counter = (tx_counter + 1) % 256
+    msg_sent = datetime.now().strftime("%H:%M:%S")
+    tx_time = f"{LoRa.transmitTime() / 1000:.2f}"
+    tx_rate = f"{LoRa.dataRate():.2f}"
         
         
 async def periodic_update():  #~~~~~ TASK 8 ~~~~~
     while True:
-        for _ in range(msg_iterations):  # Loop for a fixed number of iterations
-            await transmit_report()  # Call the async function
-            await asyncio.sleep(msg_interval)  
-        print(f"{MAGENTA}{'Messages sent:':<25}{CYAN}{msg_iterations}{RESET} at {msg_sent} on {LoRa._frequency / 1000000:.3f} MHz")
+        sent = await transmit_burst()
+        print(f"{MAGENTA}{'Messages sent:':<25}{CYAN}{sent}{RESET} at {msg_sent} on {LoRa._frequency / 1000000:.3f} MHz")
         print(f"{BLUE}{'Transmit time:':<25}{RESET}{LoRa.transmitTime() / 1000:0.2f}{' s'}")
         print(f"{BLUE}{'Data rate:':<25}{RESET}{LoRa.dataRate():0.2f}{' byte/s'}")
+        if energy is not None:
+            print(f"{BLUE}{'Energy:':<25}{RESET}{energy.summary()}")
+        if uplink is not None:
+            print(f"{BLUE}{'Uplink:':<25}{RESET}{uplink.summary()}")
+        print(f"{BLUE}{'Power profile:':<25}{RESET}{power_mgr.summary()}")
+        power_mgr.after_burst(asyncio.get_running_loop())     # Cruise: radio sleeps until the next burst
         print("----------------------------------------------------------------------------------------------")
-        await asyncio.sleep(update_interval * 60)  # Wait before the next update
+        if tx_slot_offset is not None and gps_clock.synced:
+            slot = gps_clock.next_slot(update_interval * 60, tx_slot_offset)     # Same UTC slots on every balloon
+            timeout = gps_clock.monotonic_at(slot) - time.monotonic()
+        else:
+            slot, timeout = None, update_interval * 60
+        try:
+            await asyncio.wait_for(update_now.wait(), timeout)  # Wait before the next update (or a ping)
+        except asyncio.TimeoutError:
+            if slot is not None:
+                await gps_clock.sleep_until_utc(slot)   # Final correction against a fresh clock reading
+        update_now.clear()
+
+
+async def uplink_monitor():  #~~~~~ TASK 9 ~~~~~
+    """Acts on ground commands as they arrive; the radio listens between bursts and wakes the loop on DIO0"""
+    global update_interval, msg_iterations
+    uplink.start()
+    while True:
+        try:
+            command = await uplink.get()
+            if command['command'] == CMD_CADENCE:
+                update_interval = max(command['argument'], 1)
+            elif command['command'] == CMD_ITERATIONS:
+                msg_iterations = min(max(command['argument'], 1), 10)
+            elif command['command'] == CMD_ACK:
+                frame_encoder.acknowledge(command['argument'])
+            if command['command'] in (CMD_PING, CMD_CADENCE):
+                update_now.set()        # Reply with a burst now; a new cadence runs from here
+            if command['command'] == CMD_TERMINATE and intact:
+                terminate_balloon()     # termination_watch() picks up the trigger once the core has acted
+            latency = uplink.acted(command)     # Terminate: measured to the request reaching the termination core
+            print(f"{MAGENTA}{'Uplink command:':<25}{CYAN}{command['name']} {command['argument']}{RESET} "
+                  f"(RSSI {command['rssi']}, {latency * 1000:.0f} ms to action)")
+        except Exception as e:
+            print(f"\n{RED}{'Uplink error:':<25}{RESET}{e}\n")
         
             
 #-------------------- TERMINATION --------------------
-async def flight_timer(airborne):   #~~~~~ TASK 10 ~~~~~
-    global start_time, flight_time, trigger, intact
-    while True:
-        if airborne() and start_time is None:    
-            start_time = asyncio.get_event_loop().time()
-        if start_time is not None:
-            flight_time = int(asyncio.get_event_loop().time() - start_time)
-            if flight_time > flight_time_limit and intact:
-                await terminate_balloon()
-                trigger = "Timing"
-                intact = False 
-            else:
-                pass
-        await asyncio.sleep(5)  # Update every 5 seconds
-
-
-async def geofencing():  #~~~~~ TASK 11 ~~~~~
-    global gps_lat, gps_lon, polygon, contained, trigger, intact
+def start_termination_core():
+    """Flight timer, geofence and cutdown run in their own process, which owns the servo and nichrome"""
+    config = {'fence': fence, 'flight_time_limit': flight_time_limit, 'heat_time': heat_time, 'primary': primary,
+              'servo_open': servo_open, 'servo_close': servo_close, 'relay_on': relay_on, 'relay_off': relay_off,
+              'trace_sample': trace_sample}
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'termination_core.py')
+    return subprocess.Popen([sys.executable, script, '--block', core_block.name, '--config', json.dumps(config)],
+                            start_new_session=True)     # Ctrl-C here does not reach it; main() asks it to stop
+
+
+def core_exited():
+    """The core started here has exited, or the adopted one is gone"""
+    if core_process is not None:
+        return core_process.poll() is not None
+    return not termination_core.pid_alive(core_pid)
+
+
+def terminate_balloon():
+    """Manual termination (uplink): bump the request counter the core watches"""
+    core_block.write_telemetry(manual=core_block.telemetry['manual'] + 1)
+
+
+async def termination_watch():   #~~~~~ TASK 10 ~~~~~
+    """
+    - Mirrors the termination core's status into flight_time, contained, intact, trigger and terminate
+    - Sends the termination report once the nichrome is done; restarts the core if it ever exits (it resumes
+      its launch time and state from the shared block)
+    """
+    global core_process, core_pid, flight_time, contained, intact, trigger, terminate
+    reported = False
     while True:
         try:
-            location = Point(gps_lat, gps_lon)
-            contained = polygon.contains(location)
-            if gps_valid:
-                if not contained:
-                    await asyncio.sleep(10) # Wait for 10 seconds to check if the location is still outside
-                    # Recheck location after waiting
-                    location = Point(gps_lat, gps_lon)
-                    contained = polygon.contains(location)
-            
-                    if intact and not contained:  # Intact avoids repeated termination commands
-                        await terminate_balloon()
-                        trigger = "Geofencing"
-                        intact = False
-            else:
-                pass
+            core_block.write_telemetry(heartbeat=time.monotonic(), airborne=int(airborne))
+            status = core_block.read_status()
+            if status is not None:
+                tracer.core_status(status)      # Fix-to-actuation stages the core stamped
+                flight_time = int(status['flight_time'])
+                contained = status['contained']
+                terminate = status['phase'] != termination_core.PHASES.index('idle')
+                if intact and not status['intact']:
+                    trigger = TRIGGERS[status['trigger']]
+                    intact = False
+                    print(f'{CYAN}{"Termination has been commanded."}{RESET} ({trigger})\n')
+                if energy is not None:
+                    energy.mark('heat', status['phase'] == termination_core.PHASES.index('heating'))
+                if status['phase'] == termination_core.PHASES.index('done') and not reported:
+                    reported = True
+                    print(f'{GREEN}{"Termination complete":<25}{RESET}{termination_core.latency_text(status)}\n')
+                    if primary:
+                        tracer.stage(status['decision_fix'], 'report_start', time.monotonic(), force=True)
+                        await transmit_report()     # Send an update at termination
+                        tracer.stage(status['decision_fix'], 'report_sent', time.monotonic(), force=True)
+                        tracer.flush()
+            if core_exited():
+                code = core_process.returncode if core_process is not None else 'unknown'
+                print(f"\n{RED}{'Termination core exited:':<25}{RESET}code {code}, restarting\n")
+                core_process = start_termination_core()
+                core_pid = core_process.pid
         except Exception as e:
-            print(f'\n{RED}{"Geolocation error:":<30}{RESET}{e}\n')
-        await asyncio.sleep(10) # Wait 10 sec prior to next assessment
-
+            print(f'\n{RED}{"Termination watch error:":<25}{RESET}{e}\n')
+        await asyncio.sleep(0.5)
 
-async def terminate_balloon():  
-    global primary, intact
-    try:
-        print(f'{CYAN}{"Termination has been commanded."}{RESET}\n')
-        if primary:
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            servo.value = servo_open
-            print(f'{MAGENTA}{"Servo opened":<25}{RESET}{timestamp}')  # Release the line
-            await asyncio.sleep(3)
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f'{MAGENTA}{"Nichrome ON":<25}{RESET}{timestamp}') 
-        heat_element.value = relay_on  
-        await asyncio.sleep(heat_time)
-        heat_element.value = relay_off  
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f'{MAGENTA}{"Nichrome OFF":<25}{RESET}{timestamp}\n') 
-        print(f'{GREEN}{"Termination complete":<25}{RESET}\n') 
-        if primary:
-            await transmit_report()     # Send an update at termination
-        else:
-            pass
-    except Exception as e:
-            print(f'\n{RED}{"Termination error:":<25}{RESET}{e}\n')                       
-                     
 
 #-------------------- MAIN FUNCTION --------------------
 async def main():
+    global update_now, core_process, core_pid, publisher
+    update_now = asyncio.Event()
+    core_pid = termination_core.running_core(core_block)
+    if core_pid is None:
+        core_process = start_termination_core()
+        core_pid = core_process.pid
+    else:
+        print(f"{MAGENTA}{'Termination core:':<25}{RESET}pid {core_pid} still running, resuming with it")
+    publisher = TelemetryPublisher()
+    if status_server is not None:
+        try:
+            await status_server.start()
+        except OSError as e:
+            print(f"{RED}{'Status server error:':<25}{RESET}{e}")
+    if primary:
+        energy.start()      # Background INA219 sampling thread
     task1 = asyncio.create_task(gps())
     task2 = asyncio.create_task(record())
     task3 = asyncio.create_task(display())
     task4 = asyncio.create_task(assess_airborne())
     if primary:
-        task5 = asyncio.create_task(environmental_monitor())
-        task6 = asyncio.create_task(electrical_monitor())
+        task5 = asyncio.create_task(sensor_monitor())
         #task7 = asyncio.create_task(baro_monitor())
         task8 = asyncio.create_task(periodic_update())
-    task10 = asyncio.create_task(flight_timer(lambda: airborne))
-    task11 = asyncio.create_task(geofencing())
+        if uplink is not None:
+            task9 = asyncio.create_task(uplink_monitor())
+    task10 = asyncio.create_task(termination_watch())
+    task11 = asyncio.create_task(publish_telemetry())
+    task12 = asyncio.create_task(landing_prediction())
     
     
     await task1
@@ -671,15 +1009,27 @@ async def main():
     await task4
     if primary:
         await task5
-        await task6
         #await task7
         await task8
+        if uplink is not None:
+            await task9
     await task10
     await task11
+    await task12
     
 if __name__ == "__main__":
+    stopped = False
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
+        core_block.write_telemetry(stop=1)     # Only a deliberate stop ends the termination core
+        stopped = True
         print('\n', "User terminated program.")
+    finally:
+        if log_writer is not None:
+            log_writer.close()     # Write the partial last block
+        tracer.close()
+        core_block.close(unlink=stopped)     # Otherwise the block stays for the running core and the next run
+        if publisher is not None:
+            publisher.close()
 
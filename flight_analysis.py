@@ -0,0 +1,376 @@
+"""
+Post-flight analysis and export for the *_flight_data_*.csv logs written by record().
+
+Notes:
+1) Logs are read in chunks and converted column by column into NumPy arrays, so multi-day logs
+   with millions of rows load in seconds without holding the CSV text in memory
+2) Everything after loading is vectorized: ascent/descent rates, max altitude, drift track,
+   geofence margin over time and the power budget
+3) The CPU Time column has no date; midnight roll-overs are unwrapped so multi-day floats keep a continuous clock
+4) Exports the track as GeoJSON, KML and/or GPX
+5) Columnar .sbl logs from flight_log.py load the same way (and faster)
+
+Usage:
+    python3 flight_analysis.py 11a_flight_data_18Oct_1402.csv [more logs ...]
+    python3 flight_analysis.py *.csv --export geojson kml gpx --out exports/
+    python3 flight_analysis.py log.csv --fence 41.000187,-102.050539 36.988411,-102.038130 ...
+"""
+
+
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import flight_log
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+# Same corners as test_area in flight_3.5.py (lat, lon)
+DEFAULT_FENCE = [(41.000187, -102.050539), (36.988411, -102.038130), (37.000241, -109.040373), (41.008131, -109.054018)]
+
+EARTH_RADIUS_KM = 6371.0
+RATE_WINDOW_S = 60          # Seconds of track used for each vertical rate estimate
+
+# CSV header -> (array name, kind)
+COLUMNS = {
+    "CPU Time": ('time', 'clock'),
+    "Latitude": ('lat', 'float'),
+    "Longitude": ('lon', 'float'),
+    "Altitude (M)": ('alt', 'float'),
+    "Track": ('track', 'float'),
+    "Speed (kts)": ('speed', 'float'),
+    "Flt mode": ('airborne', 'bool'),
+    "Elapsed (s)": ('elapsed', 'float'),
+    "Contained": ('contained', 'bool'),
+    "Intact": ('intact', 'bool'),
+    "Trigger": ('trigger', 'str'),
+    "Int temp": ('temp', 'float'),
+    "Int humid": ('humid', 'float'),
+    "Voltage (V)": ('voltage', 'float'),
+    "Current (mA)": ('current', 'float'),
+    "Power (mW)": ('power', 'float'),
+    "Charge (%)": ('charge', 'float'),
+    "Power profile": ('profile', 'str'),
+    "Landing lat": ('landing_lat', 'float'),
+    "Landing lon": ('landing_lon', 'float'),
+}
+
+
+#-------------------- LOADING --------------------
+def to_float(values):
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:      # 'None' or '' in a column (e.g. no endurance estimate yet)
+        return np.array([float(v) if v not in ('', 'None') else np.nan for v in values], dtype=np.float64)
+
+
+def to_seconds(values):
+    """'HH:MM:SS' strings -> seconds of day, vectorized over the fixed-width bytes"""
+    digits = np.frombuffer(''.join(v[:8].rjust(8) for v in values).encode('ascii'), dtype=np.uint8).reshape(-1, 8).astype(np.int32) - 48
+    return (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60 + digits[:, 6] * 10 + digits[:, 7]
+
+
+def convert(kind, values):
+    if kind == 'float':
+        return to_float(values)
+    if kind == 'bool':
+        return np.fromiter(map('True'.__eq__, values), dtype=bool, count=len(values))
+    if kind == 'clock':
+        return to_seconds(values)
+    return np.array(values, dtype=object)
+
+
+def split_lines(lines, width):
+    """
+    - Splits unquoted CSV lines into one flat field list with a single str.split (no per-row Python work)
+    - Rows cut short by a power loss are skipped; the rare quoted row goes through the csv module in its place,
+      so the rows stay in time order
+    """
+    if not any('"' in line for line in lines):
+        plain = [line for line in lines if line.count(',') == width - 1]
+    else:
+        plain = []
+        for line in lines:
+            if '"' not in line:
+                if line.count(',') == width - 1:
+                    plain.append(line)
+                continue
+            row = next(csv.reader([line]), [])
+            if len(row) == width:
+                plain.append(','.join(field.replace(',', ';') for field in row) + '\n')
+    if not plain:
+        return 0, []
+    fields = ''.join(plain).replace('\r', '').replace('\n', ',').split(',')
+    return len(plain), fields
+
+
+def load_sbl(filename):
+    """Columnar .sbl log (flight_log.py) -> the same arrays load_log() returns for a CSV"""
+    columns = flight_log.read_log(filename, [name for name, (key, kind) in COLUMNS.items() if kind != 'clock'], cpu_time=False)
+    flight = {}
+    for name, (key, kind) in COLUMNS.items():
+        if name not in columns or kind == 'clock':
+            continue
+        values = columns[name]
+        flight[key] = np.asarray(values, dtype=bool if kind == 'bool' else object if kind == 'str' else np.float64)
+    unix_time = np.asarray(columns.get("Unix time", []), dtype=np.float64)
+    flight['t'] = unix_time - unix_time[0] if len(unix_time) else unix_time
+    flight['start'] = datetime.fromtimestamp(unix_time[0], timezone.utc) if len(unix_time) else None
+    flight['name'] = os.path.splitext(os.path.basename(filename))[0]
+    return flight
+
+
+def load_log(filename, chunk_bytes=32_000_000):
+    """
+    - Reads one flight CSV in chunks of ~chunk_bytes and returns a dict of NumPy column arrays
+    - Adds 't' = seconds since the first row, with midnight roll-overs unwrapped
+    - Columnar .sbl logs are handed to load_sbl()
+    """
+    if filename.endswith('.sbl'):
+        return load_sbl(filename)
+    with open(filename, newline='') as file:
+        header = next(csv.reader([file.readline()]))
+        width = len(header)
+        wanted = {COLUMNS[name]: header.index(name) for name in COLUMNS if name in header}
+        parts = {key: [] for key in wanted}
+        while True:
+            lines = file.readlines(chunk_bytes)
+            if not lines:
+                break
+            rows, fields = split_lines(lines, width)
+            if not rows:
+                continue
+            for (name, kind), index in wanted.items():
+                parts[(name, kind)].append(convert(kind, fields[index:rows * width:width]))
+    flight = {name: np.concatenate(chunks) if chunks else np.array([]) for (name, kind), chunks in parts.items()}
+    seconds = flight.get('time', np.array([], dtype=np.int32)).astype(np.float64)
+    if len(seconds):
+        rollover = np.concatenate(([0], np.cumsum(np.diff(seconds) < -43200)))     # Clock went back by >12 h: next day
+        seconds = seconds + 86400 * rollover
+        seconds -= seconds[0]
+    flight['t'] = seconds
+    flight['start'] = flight_log.log_start(filename)
+    flight['name'] = os.path.splitext(os.path.basename(filename))[0]
+    return flight
+
+
+#-------------------- ANALYSIS --------------------
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    return (np.degrees(np.arctan2(y, x)) + 360) % 360
+
+
+def vertical_rate(t, alt, window=RATE_WINDOW_S):
+    """m/s over a centred window of ~window seconds, for every row"""
+    if len(t) < 2:
+        return np.zeros(len(t))
+    lo = np.searchsorted(t, t - window / 2, side='left')
+    hi = np.clip(np.searchsorted(t, t + window / 2, side='right') - 1, 0, len(t) - 1)
+    dt = t[hi] - t[lo]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(dt > 0, (alt[hi] - alt[lo]) / dt, 0.0)
+    return rate
+
+
+def fence_margin_km(lat, lon, fence):
+    """
+    - Signed distance (km) from each fix to the geofence edge: positive inside, negative outside
+    - Local equirectangular projection around the fence centre; ample for a state-sized polygon
+    """
+    fence = np.asarray(fence, dtype=np.float64)
+    lat0 = np.radians(fence[:, 0].mean())
+    scale = np.array([np.pi / 180 * EARTH_RADIUS_KM, np.pi / 180 * EARTH_RADIUS_KM * np.cos(lat0)])
+    corners = fence * scale
+    points = np.column_stack((lat, lon)) * scale
+    a = corners
+    b = np.roll(corners, -1, axis=0)
+    ab = b - a                                              # (edges, 2)
+    ap = points[:, None, :] - a[None, :, :]                 # (points, edges, 2)
+    u = np.clip((ap * ab).sum(axis=2) / (ab * ab).sum(axis=1), 0, 1)
+    closest = a[None, :, :] + u[:, :, None] * ab[None, :, :]
+    distance = np.sqrt(((points[:, None, :] - closest) ** 2).sum(axis=2)).min(axis=1)
+    # Ray casting for inside/outside, all edges at once
+    y, x = points[:, 0:1], points[:, 1:2]
+    ya, xa, yb, xb = a[:, 0], a[:, 1], b[:, 0], b[:, 1]
+    crosses = (ya > y) != (yb > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = xa + (y - ya) * (xb - xa) / (yb - ya)
+    inside = (crosses & (x < x_cross)).sum(axis=1) % 2 == 1
+    return np.where(inside, distance, -distance)
+
+
+def analyze(flight, fence=DEFAULT_FENCE):
+    """Returns the per-row derived arrays and a summary dictionary for one flight"""
+    t, lat, lon, alt = flight['t'], flight['lat'], flight['lon'], flight['alt']
+    valid = (lat != 0) | (lon != 0)                         # record() writes 0.0/0.0 before the first fix
+    derived = {'valid': valid}
+    summary = {'name': flight['name'], 'rows': len(t), 'fixes': int(valid.sum()),
+               'duration_h': round(float(t[-1]) / 3600, 2) if len(t) else 0.0}
+    if not valid.any():
+        return derived, summary
+
+    tv, latv, lonv, altv = t[valid], lat[valid], lon[valid], alt[valid]
+    rate = vertical_rate(tv, altv)
+    airborne = flight['airborne'][valid] if 'airborne' in flight else np.ones(len(tv), dtype=bool)
+    step_km = haversine_km(latv[:-1], lonv[:-1], latv[1:], lonv[1:])
+    margin = fence_margin_km(latv, lonv, fence)
+    derived.update(t=tv, lat=latv, lon=lonv, alt=altv, rate=rate, margin_km=margin,
+                   distance_km=np.concatenate(([0.0], np.cumsum(step_km))))
+
+    top = int(np.argmax(altv))
+    climbing = airborne & (rate > 0.5)
+    falling = airborne & (rate < -0.5)
+    summary.update(
+        launch=(float(latv[0]), float(lonv[0]), float(altv[0])),
+        last=(float(latv[-1]), float(lonv[-1]), float(altv[-1])),
+        max_alt_m=float(altv[top]),
+        max_alt_time_h=round(float(tv[top]) / 3600, 2),
+        ascent_rate_ms=round(float(rate[climbing].mean()), 2) if climbing.any() else None,
+        descent_rate_ms=round(float(rate[falling].mean()), 2) if falling.any() else None,
+        peak_ascent_ms=round(float(rate.max()), 2),
+        peak_descent_ms=round(float(rate.min()), 2),
+        track_km=round(float(step_km.sum()), 1),
+        drift_km=round(float(haversine_km(latv[0], lonv[0], latv[-1], lonv[-1])), 1),
+        drift_bearing=round(float(bearing_deg(latv[0], lonv[0], latv[-1], lonv[-1])), 0),
+        min_fence_margin_km=round(float(margin.min()), 1),
+        min_fence_margin_time_h=round(float(tv[int(np.argmin(margin))]) / 3600, 2),
+        outside_fence_s=float(np.diff(tv, append=tv[-1])[margin < 0].sum()),
+    )
+    if 'intact' in flight and not flight['intact'].all():
+        cut = int(np.argmin(flight['intact']))
+        summary['termination_h'] = round(float(t[cut]) / 3600, 2)
+        summary['trigger'] = flight['trigger'][cut] if 'trigger' in flight else ''
+
+    if 'landing_lat' in flight:
+        predicted = valid & np.isfinite(flight['landing_lat']) & np.isfinite(flight['landing_lon'])
+        if predicted.any():     # Miss distance of the first and last on-board predictions against the last fix
+            miss = haversine_km(flight['landing_lat'][predicted], flight['landing_lon'][predicted], latv[-1], lonv[-1])
+            summary['landing_miss_km'] = (round(float(miss[0]), 1), round(float(miss[-1]), 1))
+            summary['landing_predicted_h'] = round(float(t[predicted][0]) / 3600, 2)
+
+    if 'power' in flight and len(t) > 1:
+        power, current = flight['power'], flight['current']
+        dt = np.diff(t)
+        watt_hours = float(np.sum((power[1:] + power[:-1]) / 2 * dt) / 1000 / 3600)
+        mah = float(np.sum((current[1:] + current[:-1]) / 2 * dt) / 3600)
+        summary.update(energy_wh=round(watt_hours, 2), charge_mah=round(mah, 0),
+                       mean_power_mw=round(float(np.nanmean(power)), 0), peak_power_mw=round(float(np.nanmax(power)), 0),
+                       min_voltage=round(float(np.nanmin(flight['voltage'])), 2))
+        if 'profile' in flight:
+            profile = flight['profile'][:-1]
+            step_wh = np.nan_to_num((power[1:] + power[:-1]) / 2 * dt / 1000 / 3600)
+            summary['profile_wh_h'] = {str(name): round(float(step_wh[profile == name].sum() / dt[profile == name].sum() * 3600), 2)
+                                       for name in np.unique(profile) if dt[profile == name].sum() > 0}
+        if 'charge' in flight and np.isfinite(flight['charge']).any():
+            charge = flight['charge'][np.isfinite(flight['charge'])]
+            summary['charge_pct'] = (round(float(charge[0]), 1), round(float(charge[-1]), 1))
+    return derived, summary
+
+
+#-------------------- EXPORT --------------------
+def timestamps(flight, t):
+    # CPU Time is the Pi clock; GPX expects UTC, so keep the flight computers on UTC
+    if flight['start'] is None:
+        return None
+    return [(flight['start'] + timedelta(seconds=float(s))).strftime('%Y-%m-%dT%H:%M:%SZ') for s in t]
+
+
+def export_geojson(flight, derived, summary, filename):
+    coords = np.column_stack((derived['lon'], derived['lat'], derived['alt'])).round(6).tolist()
+    features = [{'type': 'Feature', 'properties': {'name': flight['name'], 'max_alt_m': summary['max_alt_m']},
+                 'geometry': {'type': 'LineString', 'coordinates': coords}}]
+    for label, index in (('Launch', 0), ('Max altitude', int(np.argmax(derived['alt']))), ('Last fix', -1)):
+        features.append({'type': 'Feature', 'properties': {'name': label},
+                         'geometry': {'type': 'Point', 'coordinates': coords[index]}})
+    with open(filename, 'w') as file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, file)
+
+
+def export_kml(flight, derived, summary, filename):
+    coords = '\n'.join(f"{x:.6f},{y:.6f},{z:.1f}" for x, y, z in zip(derived['lon'], derived['lat'], derived['alt']))
+    with open(filename, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+                   f'<name>{flight["name"]}</name>\n<Placemark><name>Track</name><LineString>'
+                   '<extrude>1</extrude><altitudeMode>absolute</altitudeMode>\n'
+                   f'<coordinates>\n{coords}\n</coordinates></LineString></Placemark>\n'
+                   f'<Placemark><name>Last fix</name><Point><coordinates>{derived["lon"][-1]:.6f},{derived["lat"][-1]:.6f},'
+                   f'{derived["alt"][-1]:.1f}</coordinates></Point></Placemark>\n</Document></kml>\n')
+
+
+def export_gpx(flight, derived, summary, filename):
+    stamps = timestamps(flight, derived['t'])
+    points = []
+    for k, (lat, lon, alt) in enumerate(zip(derived['lat'], derived['lon'], derived['alt'])):
+        stamp = f"<time>{stamps[k]}</time>" if stamps else ''
+        points.append(f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}"><ele>{alt:.1f}</ele>{stamp}</trkpt>')
+    with open(filename, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<gpx version="1.1" creator="SABER flight_analysis" '
+                   'xmlns="http://www.topografix.com/GPX/1/1">\n'
+                   f'<trk><name>{flight["name"]}</name><trkseg>\n' + '\n'.join(points) + '\n</trkseg></trk></gpx>\n')
+
+
+EXPORTERS = {'geojson': export_geojson, 'kml': export_kml, 'gpx': export_gpx}
+
+
+def print_summary(summary, load_s):
+    print(f"{MAGENTA}{'-' * 100}{RESET}")
+    print(f"{CYAN}{summary['name']}{RESET}  ({summary['rows']:,} rows, {summary['fixes']:,} fixes, loaded in {load_s:.2f} s)")
+    if 'max_alt_m' not in summary:
+        print(f"{RED}{'No GPS fixes in log':<25}{RESET}")
+        return
+    print(f"{'Duration (h):':<25}{summary['duration_h']:<20}{'Max Alt (M):':<25}{summary['max_alt_m']:.0f} at {summary['max_alt_time_h']} h")
+    print(f"{'Ascent rate (m/s):':<25}{str(summary['ascent_rate_ms']):<20}{'Descent rate (m/s):':<25}{summary['descent_rate_ms']}")
+    print(f"{'Track (km):':<25}{summary['track_km']:<20}{'Drift (km / deg):':<25}{summary['drift_km']} / {summary['drift_bearing']:.0f}")
+    print(f"{'Min fence margin (km):':<25}{summary['min_fence_margin_km']:<20}{'Outside fence (s):':<25}{summary['outside_fence_s']:.0f}")
+    if 'termination_h' in summary:
+        print(f"{'Termination (h):':<25}{ORANGE}{summary['termination_h']:<20}{RESET}{'Trigger:':<25}{summary['trigger']}")
+    if 'landing_miss_km' in summary:
+        print(f"{'Landing miss (km):':<25}{' -> '.join(map(str, summary['landing_miss_km'])):<20}{'First prediction (h):':<25}{summary['landing_predicted_h']}")
+    if 'energy_wh' in summary:
+        print(f"{'Energy (Wh):':<25}{summary['energy_wh']:<20}{'Charge used (mAh):':<25}{summary['charge_mah']:.0f}")
+        print(f"{'Mean / peak power (mW):':<25}{summary['mean_power_mw']:.0f} / {summary['peak_power_mw']:<13.0f}{'Min voltage (V):':<25}{summary['min_voltage']}")
+    if summary.get('profile_wh_h'):
+        print(f"{'Wh/h by power profile:':<25}{', '.join(f'{name} {rate}' for name, rate in summary['profile_wh_h'].items())}")
+
+
+#-------------------- MAIN FUNCTION --------------------
+def main():
+    parser = argparse.ArgumentParser(description="SABER post-flight analysis and export")
+    parser.add_argument('logs', nargs='+', help="flight CSV or .sbl logs")
+    parser.add_argument('--export', nargs='*', choices=sorted(EXPORTERS), default=[], help="export formats")
+    parser.add_argument('--out', default='.', help="export directory")
+    parser.add_argument('--fence', nargs='+', metavar='LAT,LON', help="geofence corners (default: flight_3.5.py test area)")
+    args = parser.parse_args()
+
+    fence = [tuple(float(x) for x in corner.split(',')) for corner in args.fence] if args.fence else DEFAULT_FENCE
+    os.makedirs(args.out, exist_ok=True)
+    for filename in args.logs:
+        start = time.perf_counter()
+        flight = load_log(filename)
+        load_s = time.perf_counter() - start
+        derived, summary = analyze(flight, fence)
+        print_summary(summary, load_s)
+        if 'max_alt_m' not in summary:
+            continue
+        for fmt in args.export:
+            out = os.path.join(args.out, f"{flight['name']}.{fmt}")
+            EXPORTERS[fmt](flight, derived, summary, out)
+            print(f"{MAGENTA}{'Exported:':<25}{RESET}{out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Compressed columnar flight log (.sbl) for long-duration flights.
+
+Notes:
+1) Rows from record() are buffered and written as blocks of log_block_rows rows
+2) Inside a block every column is stored on its own:
+    - numbers are scaled to integers (lat/lon x1e5, alt x10, ...) and delta encoded in the narrowest int type that fits
+    - booleans (airborne, contained, terminate, intact) are bit-packed, 8 rows per byte
+    - repeated strings (trigger) are dictionary encoded
+    - timestamps are stored as unix time, not 'HH:MM:SS', so multi-day logs keep a continuous clock
+3) Each block is zlib compressed with its own CRC and starts from absolute values, so any block decodes on its own;
+   a torn block at the end of the file (power loss) is skipped
+4) An unclean power-off loses at most the rows buffered since the last block
+
+Usage:
+    python3 flight_log.py convert 11a_flight_data_18Oct_1402.csv       CSV -> .sbl
+    python3 flight_log.py dump 11a_flight_data_18Oct_1402.sbl > out.csv .sbl -> CSV
+    python3 flight_log.py stats 11a_flight_data_18Oct_1402.sbl          Block and size summary
+"""
+
+
+import array
+import csv
+import itertools
+import json
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import numpy as np      # Optional: faster decoding on the ground
+except ImportError:
+    np = None
+
+
+FILE_MAGIC = b'SABERLOG'
+BLOCK_MAGIC = b'BLK1'
+VERSION = 1
+BLOCK_HEADER = struct.Struct('<4sIHI')          # magic, payload length, rows, crc32
+INT_TYPES = ('b', 'h', 'i', 'q')                # narrowest first
+
+# (column name, kind, scale); the names match the CSV header from record()
+RECORD_SCHEMA = [
+    ("Unix time", 'delta', 10),                 # Written instead of "CPU Time", which is derived on read
+    ("GPS Time", 'clock', 1),
+    ("Latitude", 'delta', 100000),
+    ("Longitude", 'delta', 100000),
+    ("Altitude (M)", 'delta', 10),
+    ("Track", 'delta', 10),
+    ("Speed (kts)", 'delta', 10),
+    ("Flt mode", 'bool', 1),
+    ("Elapsed (s)", 'delta', 1),
+    ("Contained", 'bool', 1),
+    ("Terminate", 'bool', 1),
+    ("Intact", 'bool', 1),
+    ("Trigger", 'dict', 1),
+    ("Int temp", 'delta', 10),
+    ("Int humid", 'delta', 10),
+    ("Voltage (V)", 'delta', 100),
+    ("Current (mA)", 'delta', 10),
+    ("Power (mW)", 'delta', 1),
+    ("Charge (%)", 'delta', 10),
+    ("Energy (Wh)", 'delta', 1000),
+    ("Endurance (min)", 'delta', 1),
+    ("Power profile", 'dict', 1),
+    ("Profile (Wh/h)", 'delta', 1000),
+    ("Landing lat", 'delta', 100000),           # Predicted landing (landing_predictor.py); None until descent
+    ("Landing lon", 'delta', 100000),
+    ("Landing UTC (s)", 'delta', 1),
+]
+
+
+#-------------------- COLUMN ENCODING --------------------
+def pack_bits(values):
+    bits = 0
+    for k, value in enumerate(values):
+        if value:
+            bits |= 1 << k
+    return bits.to_bytes((len(values) + 7) // 8, 'little')
+
+
+def unpack_bits(data, rows):
+    if np is not None:
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')[:rows].astype(bool)
+    bits = int.from_bytes(data, 'little')
+    return [bool(bits >> k & 1) for k in range(rows)]
+
+
+def to_number(value):
+    if value is None or value == '' or value == 'None':
+        return None
+    if value is True or value == 'True':
+        return 1
+    if value is False or value == 'False':
+        return 0
+    return float(value)
+
+
+def clock_seconds(value):
+    """'HH:MM:SS' -> seconds of day (None when there is no GPS time yet)"""
+    if not value or len(value) < 8:
+        return None
+    return int(value[:2]) * 3600 + int(value[3:5]) * 60 + int(value[6:8])
+
+
+def encode_ints(ints):
+    """Delta encode: type code + absolute first value + deltas in the narrowest int array that fits"""
+    deltas = [b - a for a, b in zip(ints, ints[1:])]
+    low, high = min(deltas, default=0), max(deltas, default=0)
+    for code in INT_TYPES:
+        limit = 1 << (8 * array.array(code).itemsize - 1)
+        if -limit <= low and high < limit:
+            break
+    return code.encode('ascii') + struct.pack('<q', ints[0] if ints else 0) + array.array(code, deltas).tobytes()
+
+
+def decode_ints(data, rows):
+    code = data[:1].decode('ascii')
+    first = struct.unpack_from('<q', data, 1)[0]
+    if np is not None:
+        deltas = np.frombuffer(data[9:], dtype=np.dtype(code)).astype(np.int64)
+        return np.concatenate(([first], first + np.cumsum(deltas)))[:rows]
+    deltas = array.array(code)
+    deltas.frombytes(data[9:])
+    return list(itertools.accumulate(deltas, initial=first))[:rows]
+
+
+def encode_column(kind, scale, values):
+    """Returns the encoded bytes for one column of one block"""
+    if kind == 'bool':
+        return pack_bits([value is True or value == 'True' for value in values])
+    if kind == 'dict':
+        index = {}
+        codes = array.array('H', (index.setdefault(str(value), len(index)) for value in values))
+        encoded_table = json.dumps(list(index)).encode('utf-8')
+        return struct.pack('<I', len(encoded_table)) + encoded_table + codes.tobytes()
+    numbers = [clock_seconds(v) for v in values] if kind == 'clock' else [to_number(v) for v in values]
+    nulls = [number is None for number in numbers]
+    ints = []
+    last = 0
+    for number in numbers:
+        if number is not None:
+            last = round(number * scale)
+        ints.append(last)                       # A null repeats the previous value (delta 0)
+    null_bytes = pack_bits(nulls) if any(nulls) else b''
+    return struct.pack('<B', 1 if null_bytes else 0) + null_bytes + encode_ints(ints)
+
+
+def decode_column(kind, scale, data, rows):
+    if kind == 'bool':
+        return unpack_bits(data, rows)
+    if kind == 'dict':
+        size = struct.unpack_from('<I', data)[0]
+        table = json.loads(data[4:4 + size].decode('utf-8'))
+        codes = array.array('H')
+        codes.frombytes(data[4 + size:])
+        return [table[code] for code in codes]
+    has_nulls = data[0]
+    offset = 1
+    nulls = None
+    if has_nulls:
+        nulls = unpack_bits(data[1:1 + (rows + 7) // 8], rows)
+        offset += (rows + 7) // 8
+    ints = decode_ints(data[offset:], rows)
+    if kind == 'clock':
+        values = [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in (int(s) for s in ints)]
+        return [('' if null else value) for value, null in zip(values, nulls)] if nulls is not None else values
+    if np is not None:
+        values = ints / scale if scale != 1 else ints.astype(np.float64)
+        if nulls is not None:
+            values[nulls] = np.nan
+        return values
+    values = [i / scale for i in ints]
+    return [None if null else value for value, null in zip(values, nulls)] if nulls is not None else values
+
+
+def encode_block(schema, rows):
+    """rows: list of row sequences in schema order -> block bytes (header + zlib payload)"""
+    columns = list(zip(*rows))
+    payload = bytearray()
+    for (name, kind, scale), values in zip(schema, columns):
+        encoded = encode_column(kind, scale, values)
+        payload += struct.pack('<I', len(encoded)) + encoded
+    compressed = zlib.compress(bytes(payload), 9)
+    return BLOCK_HEADER.pack(BLOCK_MAGIC, len(compressed), len(rows), zlib.crc32(compressed)) + compressed
+
+
+def decode_block(schema, payload, rows, names=None):
+    """Decodes the columns in `names` (all of them by default); the others are skipped unread"""
+    data = zlib.decompress(payload)
+    columns = {}
+    offset = 0
+    for name, kind, scale in schema:
+        size = struct.unpack_from('<I', data, offset)[0]
+        offset += 4
+        if names is None or name in names:
+            columns[name] = decode_column(kind, scale, data[offset:offset + size], rows)
+        offset += size
+    return columns
+
+
+#-------------------- WRITER --------------------
+class FlightLogWriter:
+    """
+    - append() one record() row at a time (same order as RECORD_SCHEMA, with unix time first)
+    - A block is compressed and written every block_rows rows; close() writes the partial last block
+    """
+    def __init__(self, filename, schema=RECORD_SCHEMA, block_rows=120):
+        self.filename = filename
+        self.schema = schema
+        self.block_rows = block_rows
+        self.rows = []
+        self.bytes_written = 0
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            encoded_schema = json.dumps(schema).encode('utf-8')
+            header = FILE_MAGIC + struct.pack('<HI', VERSION, len(encoded_schema)) + encoded_schema
+            with open(filename, mode='ab') as file:
+                file.write(header)
+            self.bytes_written += len(header)
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        block = encode_block(self.schema, self.rows)
+        with open(self.filename, mode='ab') as file:
+            file.write(block)
+            file.flush()
+            os.fsync(file.fileno())
+        self.bytes_written += len(block)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+
+#-------------------- READER --------------------
+def read_header(file):
+    magic = file.read(len(FILE_MAGIC))
+    if magic != FILE_MAGIC:
+        raise ValueError(f"{file.name} is not a SABER flight log")
+    version, size = struct.unpack('<HI', file.read(6))
+    return [tuple(column) for column in json.loads(file.read(size).decode('utf-8'))]
+
+
+def read_blocks(filename, names=None):
+    """Yields one column dictionary per good block; corrupt or torn blocks are skipped"""
+    with open(filename, mode='rb') as file:
+        schema = read_header(file)
+        data = file.read()
+    offset = 0
+    while offset + BLOCK_HEADER.size <= len(data):
+        magic, size, rows, crc = BLOCK_HEADER.unpack_from(data, offset)
+        payload = data[offset + BLOCK_HEADER.size:offset + BLOCK_HEADER.size + size]
+        if magic != BLOCK_MAGIC or len(payload) < size or zlib.crc32(payload) != crc:
+            offset = data.find(BLOCK_MAGIC, offset + 1)     # Resync on the next block
+            if offset < 0:
+                return
+            continue
+        yield decode_block(schema, payload, rows, names)
+        offset += BLOCK_HEADER.size + size
+
+
+def read_log(filename, names=None, cpu_time=True):
+    """
+    - Whole log as {column name: values}, plus the derived "CPU Time" column ('HH:MM:SS' local time)
+    - names limits decoding to those columns ("Unix time" is always included)
+    """
+    if names is not None:
+        names = set(names) | {"Unix time"}
+    blocks = list(read_blocks(filename, names))
+    if not blocks:
+        return {}
+    columns = {}
+    for name in blocks[0]:
+        parts = [block[name] for block in blocks]
+        if np is not None and isinstance(parts[0], np.ndarray):
+            columns[name] = np.concatenate(parts)
+        else:
+            columns[name] = [value for part in parts for value in part]
+    if cpu_time:
+        columns["CPU Time"] = [datetime.fromtimestamp(float(t)).strftime("%H:%M:%S") for t in columns["Unix time"]]
+    return columns
+
+
+#-------------------- TOOLS --------------------
+def log_start(filename):
+    """Start date/time from the record() file name (<id>_flight_data_DDMon_HHMM.csv); the year comes from the file"""
+    match = re.search(r"_flight_data_(\d{2}[A-Za-z]{3}_\d{4})", os.path.basename(filename))
+    if match is None:
+        return None
+    year = datetime.fromtimestamp(os.path.getmtime(filename)).year
+    return datetime.strptime(f"{year}{match.group(1)}", '%Y%d%b_%H%M')
+
+
+def convert_csv(csv_filename, block_rows=360):
+    """CSV from record() -> .sbl alongside it; the CPU Time is combined with the date in the file name"""
+    out_filename = os.path.splitext(csv_filename)[0] + '.sbl'
+    if os.path.exists(out_filename):
+        os.remove(out_filename)
+    writer = FlightLogWriter(out_filename, block_rows=block_rows)
+    try:
+        start = log_start(csv_filename) or datetime.now()      # Same year source as flight_analysis.py
+    except ValueError:
+        start = datetime.now()
+    day_start = datetime(start.year, start.month, start.day).timestamp()
+    with open(csv_filename, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        index = {name: header.index(name) for name in header}
+        last_seconds = None
+        for row in reader:
+            if len(row) != len(header):
+                continue
+            seconds = clock_seconds(row[index["CPU Time"]])
+            if last_seconds is not None and seconds < last_seconds - 43200:
+                day_start += 86400      # Midnight roll-over
+            last_seconds = seconds
+            values = [day_start + seconds]
+            values += [row[index[name]] if name in index else None for name, kind, scale in RECORD_SCHEMA[1:]]
+            writer.append(values)
+    writer.close()
+    return out_filename
+
+
+def dump_csv(filename, out=sys.stdout):
+    columns = read_log(filename)
+    names = ["CPU Time"] + [name for name, kind, scale in RECORD_SCHEMA[1:]]
+    writer = csv.writer(out)
+    writer.writerow(names)
+    for row in zip(*(columns[name] for name in names)):
+        writer.writerow(['' if isinstance(v, float) and v != v else v for v in row])
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('convert', 'dump', 'stats'):
+        print(__doc__)
+        sys.exit(1)
+    command, filenames = sys.argv[1], sys.argv[2:]
+    for filename in filenames:
+        if command == 'convert':
+            out = convert_csv(filename)
+            print(f"{filename}: {os.path.getsize(filename):,} bytes -> {out}: {os.path.getsize(out):,} bytes "
+                  f"({os.path.getsize(filename) / os.path.getsize(out):.1f}x)")
+        elif command == 'dump':
+            dump_csv(filename)
+        else:
+            start = time.perf_counter()
+            blocks = list(read_blocks(filename))
+            rows = sum(len(block["Unix time"]) for block in blocks)
+            print(f"{filename}: {len(blocks)} blocks, {rows:,} rows, {os.path.getsize(filename):,} bytes "
+                  f"({os.path.getsize(filename) / max(rows, 1):.1f} bytes/row), read in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+GPS-disciplined clock: maps the monotonic clock (asyncio's loop.time()) onto GPS UTC.
+
+Notes:
+1) Every valid RMC sentence gives one sample: the UTC second it reports against the monotonic time it belongs to
+    - With PPS wired, that is the PPS edge just before the sentence (sub-millisecond)
+    - Without PPS, it is the time the sentence was read, less its time on the wire at the GPS baud rate and the
+      receiver's output delay (nmea_delay). NMEA arrives late by a varying amount, never early, so each bin_seconds
+      bin keeps only its least delayed sample
+2) A straight line through the bin samples over the last `window` seconds gives the offset and drift (ppm) of the
+   monotonic clock against UTC. When the fix is lost the clock holds over on that line
+3) utc_now() / utc_timestamp() read the clock; sleep_until_utc() sleeps on the event loop until a UTC instant
+   (coarse sleep, then a short final sleep against a fresh reading); aprs_timestamp() gives DDHHMMz
+4) Until the first sample it falls back to the system clock and reports itself unsynced
+5) The sub-10 ms goal needs PPS; NMEA-only timing is consistent to a few ms but offset by the NEO-6M's
+   sentence output delay (tens of ms), which nmea_delay can calibrate out
+"""
+
+
+import asyncio
+import collections
+import time
+from datetime import datetime, timezone
+
+from aprs_codec import aprs_timestamp
+
+
+class GpsClock:
+    """
+    - on_rmc(utc, received, sentence_bytes) with each valid RMC; pps(edge) from the PPS interrupt, if wired
+    - utc_timestamp(mono) / monotonic_at(utc) convert between the two time scales
+    """
+    def __init__(self, window=900, bin_seconds=30, nmea_baud=9600, nmea_delay=0.0, clock=time.monotonic):
+        self.window = window
+        self.bin_seconds = bin_seconds
+        self.nmea_baud = nmea_baud
+        self.nmea_delay = nmea_delay
+        self.clock = clock
+        self.samples = collections.deque()      # (monotonic, utc - monotonic)
+        self.offset = None                      # utc - monotonic at self.epoch
+        self.epoch = 0.0
+        self.drift = 0.0                        # Seconds gained by UTC on the monotonic clock per second
+        self.spread = None                      # RMS residual of the fit (s)
+        self.source = None                      # 'pps' or 'nmea'
+        self.fixes = 0
+        self.pps_edges = 0
+        self._pps = None
+        self._pps_device = None
+
+    # ---------- Inputs ----------
+    def attach_pps(self, pin):
+        """Timestamps the NEO-6M PPS rising edge on a GPIO (gpiozero callback thread)"""
+        import gpiozero
+        self._pps_device = gpiozero.DigitalInputDevice(pin, pull_up=False)
+        self._pps_device.when_activated = lambda: self.pps()
+
+    def pps(self, edge=None):
+        self._pps = self.clock() if edge is None else edge
+        self.pps_edges += 1
+
+    def on_rmc(self, utc, received=None, sentence_bytes=0):
+        """
+        - utc: datetime of the fix (naive = UTC) or Unix seconds, from a valid RMC sentence
+        - received: monotonic time the sentence was read (default now); sentence_bytes: its length
+        """
+        received = self.clock() if received is None else received
+        if isinstance(utc, datetime):
+            utc = (utc if utc.tzinfo else utc.replace(tzinfo=timezone.utc)).timestamp()
+        if self._pps is not None and 0 <= received - self._pps < 1.0:
+            source, mono = 'pps', self._pps     # The edge that started this second
+        else:
+            source, mono = 'nmea', received - sentence_bytes * 10 / self.nmea_baud - self.nmea_delay
+        if source != self.source:
+            self.samples.clear()        # PPS and NMEA samples carry different biases; don't fit across them
+            self.source = source
+        self.samples.append((mono, utc - mono))
+        self.fixes += 1
+        self._fit()
+
+    # ---------- Estimation ----------
+    def _fit(self):
+        samples = self.samples
+        newest = samples[-1][0]
+        while newest - samples[0][0] > self.window:
+            samples.popleft()
+        bins = {}
+        for mono, offset in samples:
+            key = int(mono // self.bin_seconds)
+            if key not in bins or offset > bins[key][1]:
+                bins[key] = (mono, offset)      # Least delayed sample of the bin
+        points = sorted(bins.values())
+        self.epoch = points[-1][0]
+        if len(points) < 3:
+            self.offset, self.drift = points[-1][1], 0.0
+            self.spread = None
+            return
+        n = len(points)
+        mean_t = sum(t for t, o in points) / n
+        mean_o = sum(o for t, o in points) / n
+        sxx = sum((t - mean_t) ** 2 for t, o in points)
+        drift = sum((t - mean_t) * (o - mean_o) for t, o in points) / sxx if sxx else 0.0
+        self.drift = drift
+        self.offset = mean_o + drift * (self.epoch - mean_t)
+        residuals = [o - (mean_o + drift * (t - mean_t)) for t, o in points]
+        self.spread = (sum(r * r for r in residuals) / n) ** 0.5
+
+    @property
+    def synced(self):
+        return self.offset is not None
+
+    # ---------- Readouts ----------
+    def utc_timestamp(self, mono=None):
+        """Unix seconds (UTC) at monotonic time mono (default now); the system clock until synced"""
+        mono = self.clock() if mono is None else mono
+        if self.offset is None:
+            return time.time() - (self.clock() - mono)
+        return mono + self.offset + self.drift * (mono - self.epoch)
+
+    def utc_now(self):
+        return datetime.fromtimestamp(self.utc_timestamp(), timezone.utc)
+
+    def monotonic_at(self, utc):
+        """Monotonic (loop) time of a UTC instant given as a datetime or Unix seconds"""
+        if isinstance(utc, datetime):
+            utc = (utc if utc.tzinfo else utc.replace(tzinfo=timezone.utc)).timestamp()
+        if self.offset is None:
+            return self.clock() + utc - time.time()
+        return (utc - self.offset + self.drift * self.epoch) / (1 + self.drift)
+
+    async def sleep_until_utc(self, utc, final=0.05):
+        """Sleeps until the UTC instant; returns how late it woke (s)"""
+        target = self.monotonic_at(utc)
+        remaining = target - self.clock()
+        if remaining > final:
+            await asyncio.sleep(remaining - final)      # Coarse: other tasks can run (and the fit can move)
+            target = self.monotonic_at(utc)
+        await asyncio.sleep(max(target - self.clock(), 0))
+        return self.clock() - target
+
+    def next_slot(self, period, offset=0.0):
+        """Unix time of the next UTC slot: multiples of period seconds (since 00:00 UTC) plus offset"""
+        now = self.utc_timestamp()
+        slot = (now - offset) // period * period + offset
+        return slot + period if slot <= now else slot
+
+    def aprs_timestamp(self):
+        """'182005z': DDHHMMz for the APRS object report"""
+        now = self.utc_now()
+        return aprs_timestamp(now.day, now.strftime('%H:%M:%S'))
+
+    def status(self):
+        """'PPS ±0.4 ms, drift +12.3 ppm, 412 fixes, last 1 s ago'"""
+        if self.offset is None:
+            return 'Unsynced (system clock)'
+        age = self.clock() - self.samples[-1][0] if self.samples else 0.0
+        spread = '' if self.spread is None else f" ±{self.spread * 1000:.1f} ms,"
+        return (f"{self.source.upper()}{spread} drift {self.drift * 1e6:+.1f} ppm, {self.fixes} fixes, "
+                f"last {age:.0f} s ago")
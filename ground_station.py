@@ -0,0 +1,547 @@
+"""
+Ground station receiver and decoder for the SABER balloon packets.
+
+Notes:
+1) Auto-detects the three framings the balloon code can put on air:
+    - LoRa-APRS (LoRa_APRS_5.py):   0x3C 0xFF 0x01 + TNC2 text + tx_counter byte
+    - AX.25 UI frame (LoRa_APRS_3.py): 0x7E flags + address/control/PID/info + FCS + 0x7E + tx_counter byte
+    - Raw object report (flight_3.5.py): ';' object report + tx_counter byte
+    - Binary telemetry frame (flight_3.5.py, downlink_format = 'binary'): telemetry_frame keyframe/delta + tx_counter byte
+    - Erasure-coded shard (flight_3.5.py, burst_mode = 'fec'): burst_fec shard + tx_counter byte; the report inside
+      (either of the two above) is rebuilt once any k shards of the burst are in
+2) Object reports are decoded into telemetry dictionaries in batches
+3) Repeats are dropped using the trailing tx_counter byte (same packet heard twice, and burst repeats)
+4) Packets come from the radio, from a recorded capture file, or from sim_hardware.SimulatedSX127x
+5) --store keeps every packet from our balloons in an indexed SQLite file (packet_store.py) for latest/track/gap queries
+
+Usage:
+    python3 ground_station.py capture.txt [capture2.txt ...]    Decode recorded captures
+    python3 ground_station.py --simulate 100000                 Throughput check on synthetic packets
+    python3 ground_station.py --live                            Receive with the SX1278 on the Pi
+    python3 ground_station.py --live --store saber.db           ... and store every packet
+"""
+
+
+import argparse
+import asyncio
+import re
+import time
+from datetime import datetime
+
+import burst_fec
+import telemetry_frame
+from aprs_codec import (AX25Encoder, CONTROL_FIELD, LORA_APRS_HEADER, PROTOCOL_ID, TNC2Encoder, aprs_timestamp,
+                        calculate_fcs, flight_comment, object_report, parse_landing, trigger_name)
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+#-------------------- FRAMING --------------------
+FRAMING_LORA_APRS = 'lora_aprs'
+FRAMING_AX25 = 'ax25'
+FRAMING_OBJECT = 'object'
+FRAMING_BINARY = 'binary'
+FRAMING_FEC = 'fec'
+
+CALLSIGN_CHARS = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ')
+
+
+def detect_framing(packet):
+    """Returns the framing of a received packet, or None if it is not one of ours"""
+    if packet[:3] == LORA_APRS_HEADER:
+        return FRAMING_LORA_APRS
+    if packet[:1] == b'\x7e':
+        return FRAMING_AX25
+    if packet[:1] == b';':
+        return FRAMING_OBJECT
+    if packet[:1] and packet[0] in telemetry_frame.FRAME_TYPES:
+        return FRAMING_BINARY
+    if packet[:1] and packet[0] == burst_fec.FEC_MAGIC:
+        return FRAMING_FEC
+    return None
+
+
+def decode_ax25_address(chunk):
+    """
+    - Decodes one 7-byte AX.25 address field into 'CALL-SSID'
+    - Handles both the standard shifted-bit encoding (aprs_codec) and the unshifted ASCII in older LoRa_APRS_3.py captures
+    """
+    if all(not b & 1 and (b >> 1) in CALLSIGN_CHARS for b in chunk[:6]):
+        call = bytes(b >> 1 for b in chunk[:6]).decode('ascii').strip()
+        ssid = (chunk[6] >> 1) & 0x0F
+    else:
+        call = bytes(b for b in chunk if b >= 0x20).decode('ascii', 'replace').strip()
+        ssid = next((b for b in chunk if b < 0x10), 0)
+    return f"{call}-{ssid}" if ssid else call
+
+
+def split_ax25(packet):
+    """Returns (source, dest, path, info, fcs_ok) for a flagged AX.25 frame"""
+    body = packet.lstrip(b'\x7e')
+    if body[-1:] == b'\x7e':       # Closing flag (strip() could also eat an FCS byte of 0x7e)
+        body = body[:-1]
+    frame, fcs_bytes = body[:-2], body[-2:]
+    fcs_ok = calculate_fcs(frame).to_bytes(2, byteorder='little') == fcs_bytes
+    # The address field runs in 7-byte steps up to the control/PID pair
+    end = 14
+    while end + 2 <= len(frame) and frame[end:end + 2] != bytes((CONTROL_FIELD, PROTOCOL_ID)):
+        end += 7
+    addresses = [decode_ax25_address(frame[i:i + 7]) for i in range(0, min(end, len(frame)), 7)]
+    info = frame[end + 2:]
+    dest = addresses[0] if addresses else ''
+    source = addresses[1] if len(addresses) > 1 else ''
+    return source, dest, addresses[2:], info, fcs_ok
+
+
+TNC2_RE = re.compile(rb"(?P<src>[A-Za-z0-9-]+)>(?P<dest>[^,:!;=/@]+)(?P<path>(?:,[^,:!;=/@]+)*):?(?P<info>.*)", re.S)
+
+def split_tnc2(text):
+    """Returns (source, dest, path, info) for a TNC2 'SRC-SSID>DEST,PATH:info' line"""
+    match = TNC2_RE.match(text)
+    if match is None:
+        return '', '', [], text
+    path = match.group('path').decode('ascii', 'replace').split(',')[1:]
+    return (match.group('src').decode('ascii', 'replace'), match.group('dest').decode('ascii', 'replace'),
+            path, match.group('info'))
+
+
+#-------------------- OBJECT REPORT --------------------
+OBJECT_RE = re.compile(
+    r";(?P<name>.{9})(?P<live>[*_])(?P<ts>\d*)z"
+    r"(?P<lat>\d{4}\.\d{2})(?P<ns>[NS])(?P<table>.)(?P<lon>\d{5}\.\d{2})(?P<ew>[EW])(?P<symbol>.)"
+    r"(?P<crs>\d{3})/(?P<spd>\d{3})(?P<comment>.*)", re.S)
+COMMENT_RE = re.compile(
+    r"\+\+Alt:(?P<alt>-?[\d.]+)m_(?P<minutes>-?[\d.]+)min\^(?P<status>\w+)>(?P<trigger>[^<]*)<(?P<extra>.*)", re.S)
+BATTERY_RE = re.compile(r"B(?P<soc>\d+)%(?P<hours>[\d.]*)h")     # Appended by flight computers with an INA219
+LANDING_RE = re.compile(r"L(?P<code>[!-{]{6})")     # Predicted landing in place of the battery, on descent
+
+
+def aprs_to_degrees(ddmm, hemisphere):
+    """'3823.62' + 'N' -> 38.3937 (inverse of convert_coordinates)"""
+    split = ddmm.index('.') - 2
+    value = int(ddmm[:split]) + float(ddmm[split:]) / 60
+    return -value if hemisphere in 'SW' else value
+
+
+def parse_object_report(info):
+    """
+    - Decodes an APRS object report as built by format_report()/create_obj_report()
+    - Returns a telemetry dictionary, or None if the info field is not an object report
+    """
+    match = OBJECT_RE.match(info)
+    if match is None:
+        return None
+    ts = match.group('ts')
+    telemetry = {
+        'object': match.group('name').strip(),
+        'live': match.group('live') == '*',
+        'day': int(ts[:-4]) if len(ts) >= 5 else None,
+        'time': f"{ts[-4:-2]}:{ts[-2:]}" if len(ts) >= 5 else None,
+        'lat': round(aprs_to_degrees(match.group('lat'), match.group('ns')), 5),
+        'lon': round(aprs_to_degrees(match.group('lon'), match.group('ew')), 5),
+        'symbol': match.group('table') + match.group('symbol'),
+        'track': int(match.group('crs')),
+        'speed_kts': int(match.group('spd')),
+        'alt_m': None,
+        'flight_min': None,
+        'intact': None,
+        'trigger': None,
+        'battery_pct': None,
+        'endurance_h': None,
+        'landing_lat': None,
+        'landing_lon': None,
+        'landing_utc': None,
+        'comment': match.group('comment'),
+    }
+    comment = COMMENT_RE.match(telemetry['comment'])
+    if comment is not None:
+        telemetry['alt_m'] = float(comment.group('alt'))
+        telemetry['flight_min'] = float(comment.group('minutes'))
+        telemetry['intact'] = comment.group('status') == 'Intact'
+        telemetry['trigger'] = trigger_name(comment.group('trigger'))
+        telemetry['comment'] = comment.group('extra')
+        battery = BATTERY_RE.match(telemetry['comment'])
+        if battery is not None:
+            telemetry['battery_pct'] = int(battery.group('soc'))
+            telemetry['endurance_h'] = float(battery.group('hours')) if battery.group('hours') else None
+            telemetry['comment'] = telemetry['comment'][battery.end():]
+        landing = LANDING_RE.match(telemetry['comment'])
+        if landing is not None:
+            (telemetry['landing_lat'], telemetry['landing_lon'], telemetry['landing_utc']) = parse_landing(
+                landing.group('code'), telemetry['lat'], telemetry['lon'])
+            telemetry['comment'] = telemetry['comment'][landing.end():]
+    return telemetry
+
+
+#-------------------- PACKET DECODING --------------------
+def decode_packet(packet, rx_time=None, rssi=None, snr=None, frames=None):
+    """
+    - Decodes one received packet (bytes) in any of the four framings
+    - Returns a packet dictionary; 'telemetry' holds the decoded object report when there is one
+    - frames: telemetry_frame.FrameDecoder holding the earlier frames that binary deltas are taken against
+    """
+    framing = detect_framing(packet)
+    decoded = {'rx_time': rx_time, 'raw': packet, 'framing': framing, 'source': '', 'dest': '', 'path': [],
+               'info': '', 'tx_counter': None, 'fcs_ok': None, 'rssi': rssi, 'snr': snr, 'telemetry': None}
+    if framing is None or len(packet) < 2:
+        return decoded
+    decoded['tx_counter'] = packet[-1]
+    body = packet[:-1]
+    if framing == FRAMING_FEC:
+        return decoded      # A shard on its own carries no report; ReceiverPipeline reassembles the burst
+    if framing == FRAMING_BINARY:
+        try:
+            telemetry = (frames or telemetry_frame.FrameDecoder()).decode(body, decoded['tx_counter'], rx_time)
+        except Exception:       # Truncated or corrupt frame
+            telemetry = None
+        if telemetry is not None:
+            # The equivalent object report keeps dedupe, display and the APRS-IS gateway working unchanged
+            decoded.update(source='', info=telemetry_frame.to_object_report(telemetry), telemetry=telemetry)
+        return decoded
+    if framing == FRAMING_LORA_APRS:
+        source, dest, path, info = split_tnc2(body[3:])
+    elif framing == FRAMING_AX25:
+        source, dest, path, info, decoded['fcs_ok'] = split_ax25(body)
+    else:
+        source, dest, path, info = '', '', [], body
+    info = info.decode('utf-8', 'replace')
+    decoded.update(source=source, dest=dest, path=path, info=info)
+    decoded['telemetry'] = parse_object_report(info)
+    return decoded
+
+
+def decode_packets(packets, frames=None):
+    """Batch decode an iterable of (rx_time, bytes, rssi, snr) tuples"""
+    return [decode_packet(packet, rx_time, rssi, snr, frames) for rx_time, packet, rssi, snr in packets]
+
+
+class Deduplicator:
+    """
+    - Drops packets already seen from the same station with the same tx_counter inside `window` seconds
+    - Also drops burst repeats: identical info field with a tx_counter only a few steps after the last one
+    - The tx_counter wraps at 256, so keys expire after `window` seconds
+    """
+    def __init__(self, window=600, max_burst=8):
+        self.window = window
+        self.max_burst = max_burst
+        self._seen = {}     # (station, tx_counter) -> rx_time
+        self._last = {}     # station -> (tx_counter, info, rx_time)
+        self._purge_time = 0
+
+    def is_duplicate(self, decoded):
+        station = decoded['telemetry']['object'] if decoded['telemetry'] else decoded['source']
+        counter = decoded['tx_counter']
+        now = decoded['rx_time'] if decoded['rx_time'] is not None else time.time()
+        if now - self._purge_time > self.window:
+            self._seen = {k: t for k, t in self._seen.items() if now - t <= self.window}
+            self._purge_time = now
+
+        key = (station, counter)
+        seen = self._seen.get(key)
+        self._seen[key] = now
+        if seen is not None and now - seen <= self.window:
+            return True
+
+        last = self._last.get(station)
+        self._last[station] = (counter, decoded['info'], now)
+        if last is not None and last[1] == decoded['info'] and now - last[2] <= self.window:
+            if 0 < (counter - last[0]) % 256 <= self.max_burst:
+                return True
+        return False
+
+
+class ReceiverPipeline:
+    """
+    - Decode -> validate -> dedupe, one batch at a time
+    - Keeps running counts for the display and the latest telemetry per balloon object
+    - store: optional packet_store.PacketStore that gets every packet of ours, duplicates and FEC shards included
+    """
+    def __init__(self, dedupe_window=600, store=None):
+        self.dedupe = Deduplicator(dedupe_window)
+        self.frames = telemetry_frame.FrameDecoder()
+        self.bursts = burst_fec.BurstAssembler()
+        self.latest = {}
+        self.store = store
+        self.stats = {'packets': 0, 'unknown': 0, 'fcs_errors': 0, 'unreferenced': 0, 'duplicates': 0, 'reports': 0,
+                      'fec_recovered': 0, 'fec_repaired': 0}
+        for framing in (FRAMING_LORA_APRS, FRAMING_AX25, FRAMING_OBJECT, FRAMING_BINARY, FRAMING_FEC):
+            self.stats[framing] = 0
+
+    def process(self, packets):
+        """Takes (rx_time, bytes, rssi, snr) tuples and returns the new, unique decoded packets"""
+        accepted = []
+        stats = self.stats
+        for decoded in decode_packets(packets, self.frames):
+            stats['packets'] += 1
+            if decoded['framing'] is None:
+                stats['unknown'] += 1
+                continue
+            stats[decoded['framing']] += 1
+            if decoded['framing'] == FRAMING_FEC:
+                if self.store is not None:
+                    self.store.add(decoded)     # The shard's tx_counter, for gap counting
+                decoded = self.reassemble(decoded)
+                if decoded is None:
+                    continue
+            if decoded['fcs_ok'] is False:
+                stats['fcs_errors'] += 1
+                continue
+            if decoded['framing'] == FRAMING_BINARY and decoded['telemetry'] is None:
+                stats['unreferenced'] += 1      # Delta whose keyframe was not heard (or a corrupt frame)
+                continue
+            if self.dedupe.is_duplicate(decoded):
+                stats['duplicates'] += 1
+                if self.store is not None:
+                    self.store.add(decoded, duplicate=True)
+                continue
+            if decoded['telemetry'] is not None:
+                stats['reports'] += 1
+                self.latest[decoded['telemetry']['object']] = decoded
+                if self.store is not None:
+                    self.store.add(decoded)
+            accepted.append(decoded)
+        return accepted
+
+    def reassemble(self, shard):
+        """Adds an FEC shard to its burst; returns the decoded report once the burst is complete, else None"""
+        try:
+            rebuilt = self.bursts.add(shard['raw'][:-1], shard['tx_counter'], shard['rx_time'])
+        except Exception:       # Truncated shard
+            rebuilt = None
+        if rebuilt is None:
+            return None
+        self.stats['fec_recovered'] = self.bursts.recovered
+        self.stats['fec_repaired'] = self.bursts.repaired
+        # The rebuilt report takes the tx_counter of the burst's first shard, as the balloon encoded it
+        (first_counter, report) = rebuilt
+        decoded = decode_packet(report + bytes((first_counter,)), shard['rx_time'], shard['rssi'], shard['snr'], self.frames)
+        decoded['fec'] = True
+        return decoded
+
+
+#-------------------- CAPTURE FILES --------------------
+def read_capture(filename):
+    """
+    - Capture format: one packet per line, '<unix time> <hex bytes> [rssi] [snr]'; '#' lines are comments
+    - Yields (rx_time, bytes, rssi, snr) tuples ready for ReceiverPipeline.process()
+    """
+    with open(filename) as file:
+        for line in file:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            rssi = float(fields[2]) if len(fields) > 2 else None
+            snr = float(fields[3]) if len(fields) > 3 else None
+            yield float(fields[0]), bytes.fromhex(fields[1]), rssi, snr
+
+
+def write_capture(filename, packets):
+    """Appends (rx_time, bytes, rssi, snr) tuples to a capture file"""
+    with open(filename, mode='a') as file:
+        for rx_time, packet, rssi, snr in packets:
+            file.write(f"{rx_time:.3f} {bytes(packet).hex()} {'' if rssi is None else rssi} {'' if snr is None else snr}\n")
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+#-------------------- SIMULATION --------------------
+def simulated_packets(count, balloons=('11a', '12a', '13a'), msg_iterations=2, start=None):
+    """
+    - Synthetic over-the-air traffic in every framing, with burst repeats, FEC bursts and the odd re-heard packet
+    - Yields (rx_time, bytes, rssi, snr) tuples
+    """
+    start = time.time() if start is None else start
+    counters = {balloon: 0 for balloon in balloons}
+    encoders = {balloon: telemetry_frame.FrameEncoder(balloon) for balloon in balloons}
+    tnc2 = TNC2Encoder('KW5AUS', 11)
+    ax25 = AX25Encoder('KW5AUS', 11)
+    produced = 0
+    step = 0
+    while produced < count:
+        balloon = balloons[step % len(balloons)]
+        minutes = step // len(balloons)
+        lat = 38.3936 + 0.001 * minutes
+        lon = -104.5952 + 0.002 * minutes
+        alt = 2400.0 + 5.0 * minutes
+        timestamp = aprs_timestamp(18, f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}")
+        report = object_report(f"SABER_{balloon}", timestamp, lat, lon, 101, 69,
+                               flight_comment(alt, minutes * 60, True, 'None')).encode('utf-8')
+        framing = step % 5
+        values = {'time': 18 * 86400 + minutes * 60, 'lat': lat, 'lon': lon, 'alt': alt, 'vrate': 5.0 / 60,
+                  'track': 101, 'speed': 69, 'flight': minutes * 60, 'volts': 12.1, 'temp': 20.0, 'battery': 0,
+                  'state': telemetry_frame.pack_state(True, True, True, False, True)}
+        shards = burst_fec.encode_burst(balloon, report, 2, 3) if framing == 4 else None
+        if shards is not None and minutes % 2:
+            counters[balloon] = (counters[balloon] + 1) % 256      # First data shard lost: rebuilt from the parity shard
+            shards = shards[1:]
+        for iteration in range(len(shards) if shards else msg_iterations):
+            if framing == 4:
+                body = shards[iteration]
+            elif framing == 3:
+                body = encoders[balloon].encode(values, counters[balloon])
+            elif framing == 0:
+                body = report
+            elif framing == 1:
+                body = tnc2.frame(report)
+            else:
+                body = ax25.frame(report)
+            packet = body + bytes((counters[balloon],))
+            counters[balloon] = (counters[balloon] + 1) % 256
+            rx_time = start + step * 2.0
+            yield rx_time, packet, -110.0, 5.0
+            produced += 1
+            if produced % 10 == 0 and produced < count:      # Same packet heard again (e.g. via a digipeater)
+                yield rx_time + 0.5, packet, -115.0, 1.0
+                produced += 1
+            if produced >= count:
+                break
+        step += 1
+
+
+#-------------------- LIVE RECEIVER --------------------
+def configure_receiver(LoRa, frequency=433500000, sync_word=0x2005):
+    """Mirror of configure_sx1278() in flight_3.5.py; the receiver must match the balloon SF/BW/CR"""
+    LoRa.setSpi(0, 0, 7800000)
+    LoRa.setPins(22, 23)        # RESET->22, DIO0 (IRQ)->23
+    LoRa.begin()
+    LoRa.setRxGain(LoRa.RX_GAIN_BOOSTED, LoRa.RX_GAIN_AUTO)
+    LoRa.setFrequency(frequency)
+    LoRa.setSpreadingFactor(12)
+    LoRa.setBandwidth(125000)
+    LoRa.setCodeRate(5)
+    LoRa.setLoRaPacket(LoRa.HEADER_EXPLICIT, 12, 255, True, False)
+    LoRa.setSyncWord(sync_word)
+
+
+async def receive(LoRa, pipeline, on_packets=None, batch_interval=0.5, on_batch=None):  #~~~~~ GROUND TASK 1 ~~~~~
+    """
+    - Keeps the radio in continuous RX and hands packets to the pipeline in batches
+    - With DIO0 wired the LoRaRF interrupt thread queues each packet; without it the radio is polled
+    - on_batch gets each raw batch before decoding (--record), on_packets the accepted packets after it
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def read_packet():
+        length = LoRa.available()
+        if length:
+            return (time.time(), bytes(LoRa.get(length)), LoRa.packetRssi(), LoRa.snr())
+        return None
+
+    def rx_done():  # Runs on the GPIO interrupt thread
+        packet = read_packet()
+        if packet is not None:
+            loop.call_soon_threadsafe(queue.put_nowait, packet)
+
+    LoRa.onReceive(rx_done)
+    LoRa.request(LoRa.RX_CONTINUOUS)
+    while True:
+        try:
+            if LoRa._irq == -1:
+                while LoRa.wait(0.001):
+                    packet = read_packet()
+                    if packet is not None:
+                        queue.put_nowait(packet)
+            await asyncio.sleep(batch_interval)
+            batch = []
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch:
+                if on_batch is not None:
+                    on_batch(batch)
+                accepted = pipeline.process(batch)
+                if on_packets is not None and accepted:
+                    on_packets(accepted)
+            if pipeline.store is not None:
+                pipeline.store.flush_due()      # Rows from the last packets before a quiet spell
+        except Exception as e:
+            print(f"\n{RED}{'Receive error:':<25}{RESET}{e}\n")
+
+
+def print_packets(accepted):
+    for decoded in accepted:
+        telemetry = decoded['telemetry']
+        stamp = datetime.fromtimestamp(decoded['rx_time']).strftime('%H:%M:%S') if decoded['rx_time'] else '--:--:--'
+        if telemetry is None:
+            print(f"{BLUE}{stamp:<10}{RESET}{decoded['framing']:<11}{decoded['source']:<12}{decoded['info']}")
+            continue
+        print(f"{BLUE}{stamp:<10}{RESET}{decoded['framing']:<11}{CYAN}{telemetry['object']:<11}{RESET}"
+              f"{telemetry['lat']:<11.5f}{telemetry['lon']:<12.5f}{telemetry['alt_m']!s:<9}"
+              f"{telemetry['track']:03d}/{telemetry['speed_kts']:03d}  "
+              f"{GREEN if telemetry['intact'] else RED}{'Intact' if telemetry['intact'] else 'Killed':<8}{RESET}"
+              f"#{decoded['tx_counter']:<4}{telemetry['trigger'] or ''}")
+
+
+def print_stats(pipeline, elapsed=None, store=None):
+    stats = pipeline.stats
+    print(f"\n{MAGENTA}{'Packets:':<20}{RESET}{stats['packets']}"
+          f"  ({FRAMING_LORA_APRS} {stats[FRAMING_LORA_APRS]}, {FRAMING_AX25} {stats[FRAMING_AX25]}, "
+          f"{FRAMING_OBJECT} {stats[FRAMING_OBJECT]}, {FRAMING_BINARY} {stats[FRAMING_BINARY]}, "
+          f"{FRAMING_FEC} {stats[FRAMING_FEC]}, unknown {stats['unknown']})")
+    print(f"{MAGENTA}{'Reports:':<20}{RESET}{stats['reports']}  (duplicates {stats['duplicates']}, FCS errors {stats['fcs_errors']}, "
+          f"unreferenced deltas {stats['unreferenced']})")
+    if stats[FRAMING_FEC]:
+        print(f"{MAGENTA}{'FEC bursts:':<20}{RESET}{stats['fec_recovered']} rebuilt ({stats['fec_repaired']} with parity shards)")
+    if elapsed:
+        print(f"{MAGENTA}{'Throughput:':<20}{RESET}{stats['packets'] / elapsed:,.0f} packets/s")
+    if store is not None:
+        store.close()       # Writes the last batch
+        print(f"{MAGENTA}{'Packet store:':<20}{RESET}{store.filename}")
+
+
+#-------------------- MAIN FUNCTION --------------------
+def main():
+    parser = argparse.ArgumentParser(description="SABER ground station receiver and decoder")
+    parser.add_argument('captures', nargs='*', help="capture files to decode")
+    parser.add_argument('--simulate', type=int, metavar='N', help="decode N synthetic packets and report throughput")
+    parser.add_argument('--live', action='store_true', help="receive with the SX1278")
+    parser.add_argument('--record', metavar='FILE', help="append received packets to a capture file (live mode)")
+    parser.add_argument('--store', metavar='FILE', help="keep every packet in an SQLite packet store (packet_store.py)")
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    args = parser.parse_args()
+
+    store = None
+    if args.store:
+        from packet_store import PacketStore
+        store = PacketStore(args.store)
+    pipeline = ReceiverPipeline(store=store)
+    if args.live:
+        from LoRaRF import SX127x
+        LoRa = SX127x()
+        configure_receiver(LoRa)
+        print(f"\n{CYAN}Listening on {LoRa._frequency / 1000000:.3f} MHz{RESET}\n")
+
+        def on_batch(batch):
+            write_capture(args.record, batch)      # Everything heard, so a replay sees the same duplicates and shards
+        try:
+            asyncio.run(receive(LoRa, pipeline, print_packets, on_batch=on_batch if args.record else None))
+        except KeyboardInterrupt:
+            print('\n', "User terminated program.")
+        print_stats(pipeline, store=store)
+        return
+
+    if args.simulate:
+        sources = [simulated_packets(args.simulate)]
+    else:
+        sources = [read_capture(filename) for filename in args.captures]
+    start = time.perf_counter()
+    for source in sources:
+        for batch in batched(source, 1024):
+            accepted = pipeline.process(batch)
+            if not args.quiet and not args.simulate:
+                print_packets(accepted)
+    print_stats(pipeline, time.perf_counter() - start, store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+On-board landing prediction: a wind profile learned on the way up, and a drag-based descent integrated through it.
+
+Notes:
+1) The balloon moves with the air, so its GPS ground velocity (track and speed) is the wind at its altitude
+    - WindProfile bins it by altitude as east/north components, each bin an exponentially weighted mean, so the
+      float and the descent keep refining what the ascent learned
+    - Bins never visited are interpolated between learned ones (the nearest learned bin beyond either end)
+2) Under a parachute the descent rate goes as 1/sqrt(air density): v(h) = v0 * sqrt(rho0 / rho(h)), with rho(h)
+   from the 1976 standard atmosphere (to 47 km)
+    - v0 (sea-level rate) starts at the configured parachute rate and is refit from the measured descent once falling
+3) predict() integrates from the current fix down to the ground on a fixed altitude grid as numpy array operations,
+   with no Python loop over the steps, and returns the landing point, time and distance
+4) Flat-earth offsets from the current fix: the error is well below the prediction's own over a 100 km drift
+
+Usage:
+    python3 landing_predictor.py        Learn a synthetic wind profile, predict from 30 km and time it
+"""
+
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+EARTH_RADIUS_M = 6371000.0
+KNOTS_TO_MS = 0.514444
+RHO0 = 1.225                # kg/m3 at sea level
+
+# 1976 standard atmosphere layers: base altitude (m), base temperature (K), lapse rate (K/m), base pressure (Pa)
+ISA_BASE = np.array([0.0, 11000.0, 20000.0, 32000.0])
+ISA_TEMP = np.array([288.15, 216.65, 216.65, 228.65])
+ISA_LAPSE = np.array([-0.0065, 0.0, 0.001, 0.0028])
+ISA_PRESSURE = np.array([101325.0, 22632.1, 5474.89, 868.019])
+GMR = 9.80665 * 0.0289644 / 8.3144598      # g0 * M / R (K/m)
+AIR_R = 287.053                             # Specific gas constant of dry air (J/kg/K)
+
+
+def air_density(alt_m):
+    """Standard-atmosphere air density (kg/m3) for an altitude array (m), clipped to 0-47 km"""
+    h = np.clip(np.asarray(alt_m, dtype=np.float64), 0.0, 47000.0)
+    layer = np.searchsorted(ISA_BASE, h, side='right') - 1
+    base, temp0, lapse, pressure0 = ISA_BASE[layer], ISA_TEMP[layer], ISA_LAPSE[layer], ISA_PRESSURE[layer]
+    temp = temp0 + lapse * (h - base)
+    isothermal = lapse == 0.0
+    safe_lapse = np.where(isothermal, 1.0, lapse)
+    pressure = np.where(isothermal, pressure0 * np.exp(-GMR * (h - base) / temp0),
+                        pressure0 * (temp0 / temp) ** (GMR / safe_lapse))
+    return pressure / (AIR_R * temp)
+
+
+#-------------------- WIND PROFILE --------------------
+class WindProfile:
+    """
+    - add(alt, track, speed_kts) with each fix; winds(altitudes) returns east and north wind (m/s) arrays
+    - bin_m: altitude bin height; weight: share of a new sample in its bin's mean
+    """
+    def __init__(self, bin_m=250, ceiling_m=40000, weight=0.3):
+        self.bin_m = bin_m
+        self.weight = weight
+        bins = int(ceiling_m // bin_m) + 1
+        self.east = np.zeros(bins)
+        self.north = np.zeros(bins)
+        self.count = np.zeros(bins, dtype=np.int32)
+        self.centers = (np.arange(bins) + 0.5) * bin_m
+
+    def add(self, alt, track, speed_kts):
+        index = int(alt // self.bin_m)
+        if not 0 <= index < len(self.count):
+            return
+        speed = speed_kts * KNOTS_TO_MS
+        east = speed * math.sin(math.radians(track))
+        north = speed * math.cos(math.radians(track))
+        if self.count[index] == 0:
+            self.east[index], self.north[index] = east, north
+        else:
+            self.east[index] += self.weight * (east - self.east[index])
+            self.north[index] += self.weight * (north - self.north[index])
+        self.count[index] += 1
+
+    @property
+    def learned(self):
+        return int(np.count_nonzero(self.count))
+
+    def winds(self, altitudes):
+        learned = self.count > 0
+        if not learned.any():
+            zeros = np.zeros(len(altitudes))
+            return zeros, zeros
+        centers = self.centers[learned]
+        return np.interp(altitudes, centers, self.east[learned]), np.interp(altitudes, centers, self.north[learned])
+
+
+#-------------------- PREDICTOR --------------------
+class LandingPredictor:
+    """
+    - observe(alt, track, speed_kts, now) with each fix while airborne (now: monotonic seconds)
+    - predict(lat, lon, alt, utc) once the balloon is coming down; the result is also kept in .last
+    - descent_rate: the parachute's sea-level descent rate (m/s); ground_alt: landing elevation (m MSL)
+    """
+    def __init__(self, descent_rate=5.0, ground_alt=0.0, step_m=50, wind_bin_m=250, refit_weight=0.2, min_rate_dt=10):
+        self.v0 = descent_rate
+        self.ground_alt = ground_alt
+        self.step_m = step_m
+        self.wind = WindProfile(wind_bin_m)
+        self.refit_weight = refit_weight
+        self.min_rate_dt = min_rate_dt
+        self.falling = False        # Measured descent faster than 2 m/s
+        self.measured_rate = None
+        self.last = None
+        self.predictions = 0
+        self.predict_ms = 0.0
+        self._previous = None       # (now, alt) of the last rate measurement
+
+    def observe(self, alt, track, speed_kts, now):
+        self.wind.add(alt, track, speed_kts)
+        if self._previous is None:
+            self._previous = (now, alt)
+            return
+        dt = now - self._previous[0]
+        if dt < self.min_rate_dt:
+            return
+        rate = (self._previous[1] - alt) / dt          # Positive going down
+        self._previous = (now, alt)
+        self.measured_rate = rate
+        self.falling = rate > 2.0
+        if self.falling:
+            sea_level = rate * math.sqrt(float(air_density(alt + rate * dt / 2)) / RHO0)
+            if 1.0 < sea_level < 30.0:      # Ignore a tumbling or still-attached payload's transients
+                self.v0 += self.refit_weight * (sea_level - self.v0)
+
+    def predict(self, lat, lon, alt, utc=None):
+        """{'lat', 'lon', 'utc', 'seconds', 'distance_km'}: where and when the descent from here reaches the ground"""
+        started = time.perf_counter()
+        utc = utc or datetime.now(timezone.utc)
+        if alt <= self.ground_alt:
+            levels = np.array([self.ground_alt, self.ground_alt])
+        else:
+            levels = np.append(np.arange(alt, self.ground_alt, -self.step_m), self.ground_alt)
+        middle = (levels[:-1] + levels[1:]) / 2
+        dt = (levels[:-1] - levels[1:]) / (self.v0 * np.sqrt(RHO0 / air_density(middle)))
+        east, north = self.wind.winds(middle)
+        east_m, north_m = float(east @ dt), float(north @ dt)
+        seconds = float(dt.sum())
+        landing_lat = lat + math.degrees(north_m / EARTH_RADIUS_M)
+        landing_lon = lon + math.degrees(east_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+        self.last = {'lat': round(landing_lat, 5), 'lon': round(landing_lon, 5), 'utc': utc + timedelta(seconds=seconds),
+                     'seconds': round(seconds), 'distance_km': round(math.hypot(east_m, north_m) / 1000, 1)}
+        self.predictions += 1
+        self.predict_ms = (time.perf_counter() - started) * 1000
+        return self.last
+
+    def summary(self):
+        """'38.81234,-104.71234 at 14:23Z (12.3 km, 18 min), 5.2 m/s, 64 wind bins'"""
+        bins = f"{self.wind.learned} wind bins"
+        if self.last is None:
+            return f"Learning: {bins}"
+        return (f"{self.last['lat']},{self.last['lon']} at {self.last['utc'].strftime('%H:%MZ')} "
+                f"({self.last['distance_km']} km, {self.last['seconds'] / 60:.0f} min), {self.v0:.1f} m/s, {bins}")
+
+
+#-------------------- MAIN FUNCTION --------------------
+def main():
+    """Synthetic ascent through a jet-stream-like profile, then a timed prediction from 30 km"""
+    predictor = LandingPredictor(descent_rate=5.0, ground_alt=1840)
+    for second in range(0, 5600, 5):
+        alt = 1840 + 5 * second
+        jet = 25 * math.exp(-((alt - 11000) / 3000) ** 2)           # m/s, westerly
+        predictor.observe(alt, 80.0, (4 + jet) / KNOTS_TO_MS, second)
+    predict = lambda: predictor.predict(38.8339, -104.8214, 30000.0, datetime(2026, 6, 1, 15, 0, tzinfo=timezone.utc))
+    predict()
+    runs = 200
+    started = time.perf_counter()
+    for _ in range(runs):
+        predict()
+    print(f"{CYAN}{'Predicted landing:':<25}{RESET}{predictor.summary()}")
+    print(f"{MAGENTA}{'Prediction time:':<25}{RESET}{(time.perf_counter() - started) / runs * 1000:.2f} ms "
+          f"({int((30000 - 1840) / predictor.step_m) + 1} steps)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Fix-to-actuation latency tracing: a trace id on each GPS fix, stamped at every stage on its way to a cutdown and the
+termination report, with a p50/p99 summary per stage.
+
+Notes:
+1) Stages, in order (all time.monotonic(), which both processes share):
+    - rx            Bytes read from the GPS serial port (gps())
+    - published     Fix decoded and written to the termination core's shared block, with its trace id
+    - checked       The core's first tick that evaluated it (geofence, timer)
+    - decided       The core's termination decision (geofence confirmed, time limit or manual); traced for the
+                    fix that first put the balloon outside the fence, or the latest fix when the time limit was
+                    crossed or the manual request arrived, so a geofence chain includes the confirm window
+    - actuated      First output fired (servo, or the nichrome on a secondary)
+    - heat_on       Nichrome switched on
+    - report_start  transmit_report() called for the termination report (the flight script sends it once the
+                    nichrome is done)
+    - report_sent   The radio finished transmitting it
+2) Every trace_sample-th fix is traced through rx/published/checked, which gives the steady-state latency without
+   logging 12 rows a second; the fix behind a decision is always traced, from a ring of recent fixes
+3) Rows are buffered and written as CSV in batches (and at once after a termination), so tracing never adds a file
+   write per fix to the GPS task
+4) Summary: for each stage, the latency from the previous stage the trace reached and from rx, as n, p50, p99, max;
+   then every termination chain in full
+5) --replay drives the same chain off the Pi: UBX fixes from a flight log (or a synthetic track drifting out of the
+   fence) through the UBX parser, the shared block, a dry-run termination core and a simulated radio that takes
+   the real airtime, all in real time
+
+Usage:
+    python3 latency_trace.py KW5AUS_latency_19Oct_1400.csv      Summarize a live run's trace
+    python3 latency_trace.py --replay                           Synthetic geofence breach, then summarize
+    python3 latency_trace.py --replay flight.sbl --limit 60     Replay a flight log; time limit after 60 s
+"""
+
+
+import argparse
+import csv
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+STAGES = ('rx', 'published', 'checked', 'decided', 'actuated', 'heat_on', 'report_start', 'report_sent')
+HEADER = ("Trace id", "Stage", "Monotonic (s)")
+NO_TIME = -1.0      # termination_core.NO_TIME
+ITOW_START_MS = 302400000       # Replay epoch 0: Wednesday 12:00:00 GPS time of week
+
+
+#-------------------- TRACE LOG --------------------
+class LatencyTrace:
+    """
+    - fix(trace_id, rx, published) from the GPS task; stage(trace_id, name, when) for the later stages
+    - core_status(status) from the task that reads the termination core's status; it adds checked/decided/
+      actuated/heat_on as they appear
+    - sample: trace every Nth fix (0 = tracing off; nothing is written and no file is created)
+    """
+    def __init__(self, filename, sample=4, keep=256, flush_rows=240):
+        self.filename = filename
+        self.sample = sample
+        self.keep = keep
+        self.flush_rows = flush_rows
+        self.recent = OrderedDict()     # trace id -> (rx, published) of the last `keep` fixes, sampled or not
+        self.forced = set()             # Unsampled trace ids pulled in by a decision
+        self.rows = []
+        self.written = 0
+        self.traced_fix = 0
+        self.seen = {}                  # Decision stages already written: name -> time
+
+    def _traced(self, trace_id):
+        return bool(self.sample) and (trace_id % self.sample == 0 or trace_id in self.forced)
+
+    def fix(self, trace_id, rx, published):
+        if not self.sample:
+            return
+        self.recent[trace_id] = (rx, published)
+        if len(self.recent) > self.keep:
+            self.recent.popitem(last=False)
+        if trace_id % self.sample == 0:
+            self.rows += [(trace_id, 'rx', rx), (trace_id, 'published', published)]
+            if len(self.rows) >= self.flush_rows:
+                self.flush()
+
+    def stage(self, trace_id, name, when, force=False):
+        if not self.sample:
+            return
+        if force and not self._traced(trace_id):
+            self.forced.add(trace_id)
+            if trace_id in self.recent:
+                rx, published = self.recent[trace_id]
+                self.rows += [(trace_id, 'rx', rx), (trace_id, 'published', published)]
+        if self._traced(trace_id):
+            self.rows.append((trace_id, name, when))
+
+    def core_status(self, status):
+        """Stages the termination core stamped into its status half (see termination_core.SharedBlock)"""
+        if status['traced_fix'] != self.traced_fix and status['traced_time'] != NO_TIME:
+            self.traced_fix = status['traced_fix']
+            self.stage(self.traced_fix, 'checked', status['traced_time'])
+        for name, field in (('decided', 'decision_time'), ('actuated', 'actuation_time'), ('heat_on', 'heat_on_time')):
+            if name not in self.seen and status[field] != NO_TIME:
+                self.seen[name] = status[field]
+                self.stage(status['decision_fix'], name, status[field], force=True)
+                self.flush()        # A termination is written at once
+
+    def flush(self):
+        if not self.rows:
+            return
+        new_file = not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0
+        with open(self.filename, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(HEADER)
+            writer.writerows((trace_id, name, f"{when:.6f}") for trace_id, name, when in self.rows)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def summary(self):
+        """'1,234 stages written, 1 in 4 fixes'"""
+        if not self.sample:
+            return 'Off'
+        return f"{self.written + len(self.rows):,} stages written, 1 in {self.sample} fixes"
+
+
+#-------------------- SUMMARY --------------------
+def load_traces(filename):
+    """{trace id: {stage: monotonic time}}"""
+    traces = defaultdict(dict)
+    with open(filename, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for trace_id, name, when in reader:
+            traces[int(trace_id)].setdefault(name, float(when))
+    return traces
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def stage_latencies(traces):
+    """{stage: (latencies from the previous stage reached, latencies from rx)}, in seconds"""
+    step, total = defaultdict(list), defaultdict(list)
+    for stages in traces.values():
+        previous = None
+        for name in STAGES:
+            if name not in stages:
+                continue
+            if previous is not None:
+                step[name].append(stages[name] - stages[previous])
+            if 'rx' in stages and name != 'rx':
+                total[name].append(stages[name] - stages['rx'])
+            previous = name
+    return {name: (sorted(step[name]), sorted(total[name])) for name in STAGES[1:] if step[name]}
+
+
+def duration_text(seconds):
+    return f"{seconds * 1000:.1f} ms" if abs(seconds) < 1 else f"{seconds:.2f} s"
+
+
+def print_summary(traces, title):
+    print(f"{MAGENTA}{'-' * 100}{RESET}")
+    print(f"{CYAN}{title}{RESET}  ({len(traces):,} traced fixes)")
+    print(f"{'Stage:':<16}{'n':>7}  {'p50':>10}{'p99':>10}{'max':>10}    {'from rx p50':>12}{'p99':>10}")
+    for name, (step, total) in stage_latencies(traces).items():
+        from_rx = (f"{duration_text(percentile(total, 0.5)):>12}{duration_text(percentile(total, 0.99)):>10}"
+                   if total else '')
+        print(f"{name + ':':<16}{len(step):>7}  {duration_text(percentile(step, 0.5)):>10}"
+              f"{duration_text(percentile(step, 0.99)):>10}{duration_text(step[-1]):>10}    {from_rx}")
+    for trace_id, stages in traces.items():
+        if 'decided' in stages:
+            chain = sorted((when, name) for name, when in stages.items())
+            start = chain[0][0]
+            print(f"{ORANGE}{'Termination:':<16}{RESET}fix {trace_id}: "
+                  + ' -> '.join(f"{name} +{duration_text(when - start)}" for when, name in chain))
+
+
+#-------------------- REPLAY --------------------
+def ubx_epoch(itow, lat, lon, alt):
+    """NAV-POSLLH + NAV-SOL frames for one fix, as the NEO-6M sends them"""
+    import ubx
+    hmsl = round(alt * 1000)
+    return (ubx.message(ubx.CLASS_NAV, ubx.NAV_POSLLH, ubx.POSLLH.pack(itow, round(lon * 1e7), round(lat * 1e7),
+                                                                       hmsl + 20000, hmsl, 2500, 4000))
+            + ubx.message(ubx.CLASS_NAV, ubx.NAV_SOL, ubx.SOL.pack(itow, 0, 0, 3, 0x0D, 0, 0, 0, 300, 0, 0, 0, 10,
+                                                                   180, 0, 9, 0)))
+
+
+def log_positions(filename):
+    import flight_analysis
+    flight = flight_analysis.load_log(filename)
+    return [(float(lat), float(lon), float(alt)) for lat, lon, alt in zip(flight['lat'], flight['lon'], flight['alt'])
+            if lat != 0 or lon != 0]
+
+
+def synthetic_positions(count=2000):
+    """Inside the default fence's east edge, drifting east out of it about 20 s in at 4 Hz"""
+    return [(39.0, -102.2 + 0.002 * k, 20000.0) for k in range(count)]
+
+
+def replay(positions, config, filename, rate_hz=4):
+    """Plays positions through the termination chain in real time; returns the trace file name"""
+    import aprs_codec
+    import termination_core
+    import ubx
+    from sim_hardware import SimulatedSX127x
+
+    block = termination_core.SharedBlock(create=True)
+    core = termination_core.TerminationCore(block, config, *termination_core.open_outputs(config, dry_run=True))
+    threading.Thread(target=core.run, name='core', daemon=True).start()
+    tracer = LatencyTrace(filename, config['trace_sample'])
+    parser = ubx.UBXParser()
+    radio = SimulatedSX127x(realtime=True)
+    radio.setSpreadingFactor(12)
+    radio.setBandwidth(125000)
+    fix_id = 0
+    (lat, lon, alt) = positions[0]
+    next_time = time.monotonic()
+    try:
+        for k, position in enumerate(positions):
+            data = ubx_epoch(ITOW_START_MS + round(k * 1000 / rate_hz), *position)
+            received = time.monotonic()
+            for msg in parser.feed(data):
+                if msg['name'] == 'NAV-POSLLH':
+                    fix_id += 1
+                    (lat, lon, alt) = (round(msg['lat'], 5), round(msg['lon'], 5), round(msg['alt'], 1))
+                    block.write_telemetry(heartbeat=received, fix_time=received, lat=lat, lon=lon, alt=alt,
+                                          airborne=1, fix_id=fix_id)
+                    tracer.fix(fix_id, received, time.monotonic())
+                elif msg['name'] == 'NAV-SOL':
+                    block.write_telemetry(gps_valid=msg['valid'])
+            status = block.read_status()
+            if status is not None:
+                tracer.core_status(status)
+                if status['phase'] == termination_core.PHASES.index('done'):
+                    tracer.stage(status['decision_fix'], 'report_start', time.monotonic())
+                    report = aprs_codec.object_report("SABER_R", aprs_codec.aprs_timestamp('01', '00:00:00'), lat, lon,
+                                                      0, 0, aprs_codec.flight_comment(alt, status['flight_time'], False,
+                                                                                      'Replay'))
+                    radio.beginPacket()
+                    radio.write(list(report.encode('utf-8')))
+                    radio.endPacket()
+                    radio.wait()
+                    tracer.stage(status['decision_fix'], 'report_sent', time.monotonic())
+                    break
+            next_time += 1 / rate_hz
+            time.sleep(max(next_time - time.monotonic(), 0))
+    finally:
+        tracer.close()
+        block.write_telemetry(stop=1)
+        time.sleep(2 * config['period'])
+        block.close()
+    return filename
+
+
+#-------------------- MAIN FUNCTION --------------------
+def main():
+    parser = argparse.ArgumentParser(description="SABER fix-to-actuation latency traces")
+    parser.add_argument('trace', nargs='?', help="trace CSV written by flight_3.5.py (or a flight log with --replay)")
+    parser.add_argument('--replay', action='store_true', help="replay a flight log (or a synthetic breach) through the chain")
+    parser.add_argument('--rate', type=float, default=4, help="replay fixes per second")
+    parser.add_argument('--sample', type=int, default=4, help="trace every Nth fix")
+    parser.add_argument('--limit', type=float, help="replay flight time limit (s); default: the core's")
+    parser.add_argument('--confirm', type=float, help="replay geofence confirm time (s); default: the core's")
+    parser.add_argument('--heat', type=float, default=2, help="replay nichrome time (s)")
+    parser.add_argument('--out', default='replay_latency.csv', help="replay trace file")
+    args = parser.parse_args()
+
+    if args.replay:
+        import termination_core
+        config = dict(termination_core.DEFAULT_CONFIG, heat_time=args.heat, servo_delay=min(args.heat, 1.0),
+                      trace_sample=args.sample)
+        if args.limit is not None:
+            config['flight_time_limit'] = args.limit
+        if args.confirm is not None:
+            config['confirm_s'] = args.confirm
+        positions = log_positions(args.trace) if args.trace else synthetic_positions()
+        if os.path.exists(args.out):
+            os.remove(args.out)
+        print(f"{MAGENTA}{'Replaying:':<25}{RESET}{len(positions):,} fixes at {args.rate:g} Hz from "
+              f"{args.trace or 'a synthetic geofence breach'}")
+        filename = replay(positions, config, args.out, args.rate)
+        print_summary(load_traces(filename), f"Replay: {filename}")
+    elif args.trace:
+        print_summary(load_traces(args.trace), args.trace)
+    else:
+        parser.error("a trace file, or --replay")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Indexed SQLite store for every packet the ground station hears, for multi-balloon days.
+
+Notes:
+1) One row per received packet from a SABER_<id> object:
+    - kind 0: a report (decoded position and status); kind 1: a duplicate of one (burst repeat or re-heard);
+      kind 2: an FEC shard (object and tx_counter only; the rebuilt report is a kind 0 row)
+    - Duplicates and shards carry no new position but are kept for the tx_counter sequence
+2) Rows are buffered and inserted in one transaction per batch (batch_rows, or batch_s after the last batch),
+   so a busy pass costs a few commits, not one per packet; close() writes the rest
+    - flush_due() commits rows older than batch_s without waiting for another packet; ground_station.receive()
+      calls it every loop, so the last packets before a balloon goes quiet reach readers within batch_s
+3) Indexes on (object, rx_time) and rx_time; an objects table updated with each batch holds every balloon's
+   latest report, so "latest for all balloons" reads one row per balloon however many packets are stored
+4) WAL journal: queries from another process (this script's CLI, a map) run while the ground station writes
+5) gaps() walks the tx_counter sequence (mod 256) in receive order; counters behind the newest one (duplicates,
+   FEC reports, late repeats) are skipped, so more than 128 packets lost in a row reads as none
+
+Usage:
+    python3 ground_station.py --live --store saber.db           Receive and store
+    python3 packet_store.py saber.db                            Latest position of every balloon
+    python3 packet_store.py saber.db --track SABER_11a --since 1h
+    python3 packet_store.py saber.db --gaps SABER_11a
+    python3 packet_store.py /tmp/bench.db --simulate 1000000    Fill with synthetic traffic and time the queries
+"""
+
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import burst_fec
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+KIND_REPORT = 0
+KIND_DUPLICATE = 1
+KIND_SHARD = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packets (
+    id INTEGER PRIMARY KEY,
+    object TEXT NOT NULL,
+    rx_time REAL NOT NULL,
+    tx_counter INTEGER,
+    kind INTEGER NOT NULL,
+    framing TEXT,
+    lat REAL, lon REAL, alt_m REAL, track INTEGER, speed_kts INTEGER,
+    intact INTEGER, trigger TEXT, battery_pct INTEGER,
+    rssi REAL, snr REAL, info TEXT
+);
+CREATE INDEX IF NOT EXISTS packets_object_time ON packets (object, rx_time);
+CREATE INDEX IF NOT EXISTS packets_time ON packets (rx_time);
+CREATE TABLE IF NOT EXISTS objects (
+    object TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    last_rx REAL NOT NULL,
+    reports INTEGER NOT NULL
+);
+"""
+INSERT = ("INSERT INTO packets (object, rx_time, tx_counter, kind, framing, lat, lon, alt_m, track, speed_kts, "
+          "intact, trigger, battery_pct, rssi, snr, info) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+UPDATE_OBJECT = """
+INSERT INTO objects (object, last_id, last_rx, reports)
+    SELECT object, id, rx_time, ? FROM packets WHERE object = ? AND kind = 0 ORDER BY rx_time DESC LIMIT 1
+ON CONFLICT (object) DO UPDATE SET last_id = excluded.last_id, last_rx = excluded.last_rx,
+    reports = reports + excluded.reports
+"""
+REPORT_COLUMNS = ('object', 'rx_time', 'tx_counter', 'framing', 'lat', 'lon', 'alt_m', 'track', 'speed_kts',
+                  'intact', 'trigger', 'battery_pct', 'rssi', 'snr', 'info')
+
+
+def packet_object(decoded):
+    """'SABER_11a' for a report or an FEC shard of ours, else None"""
+    if decoded['telemetry'] is not None:
+        return decoded['telemetry']['object']
+    if decoded['framing'] == 'fec' and len(decoded['raw']) > burst_fec.SHARD_HEADER.size:
+        balloon = burst_fec.SHARD_HEADER.unpack_from(decoded['raw'])[1]
+        return 'SABER_' + balloon.decode('ascii', 'replace').rstrip()     # ljust(3) in encode_burst
+    return None
+
+
+class PacketStore:
+    """
+    - add(decoded, duplicate) for each packet ReceiverPipeline decodes (ground_station.py does this with --store)
+    - flush_due() from the receive loop, so buffered rows are committed within batch_s even if no packet follows
+    - latest(), track(object, start, end), gaps(object, start, end); times are Unix seconds
+    """
+    def __init__(self, filename, batch_rows=500, batch_s=5.0):
+        self.filename = filename
+        self.batch_rows = batch_rows
+        self.batch_s = batch_s
+        self.db = sqlite3.connect(filename)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")     # WAL: a power cut loses at most the last batch
+        self.db.executescript(SCHEMA)
+        self.rows = []
+        self.last_flush = time.monotonic()
+        self.stats = {'stored': 0, 'batches': 0, 'flush_ms': 0.0}
+
+    # ---------- Writing ----------
+    def add(self, decoded, duplicate=False):
+        name = packet_object(decoded)
+        if name is None:
+            return
+        rx_time = decoded['rx_time'] if decoded['rx_time'] is not None else time.time()
+        telemetry = decoded['telemetry']
+        if telemetry is None:
+            self.rows.append((name, rx_time, decoded['tx_counter'], KIND_SHARD, decoded['framing'], None, None, None,
+                              None, None, None, None, None, decoded['rssi'], decoded['snr'], None))
+        else:
+            self.rows.append((name, rx_time, decoded['tx_counter'], KIND_DUPLICATE if duplicate else KIND_REPORT,
+                              decoded['framing'], telemetry['lat'], telemetry['lon'], telemetry['alt_m'],
+                              telemetry['track'], telemetry['speed_kts'], telemetry['intact'], telemetry['trigger'],
+                              telemetry['battery_pct'], decoded['rssi'], decoded['snr'],
+                              None if duplicate else decoded['info']))
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+        else:
+            self.flush_due()
+
+    def flush_due(self):
+        if self.rows and time.monotonic() - self.last_flush >= self.batch_s:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.rows:
+            return
+        started = time.perf_counter()
+        reports = {}
+        for row in self.rows:
+            if row[3] == KIND_REPORT:
+                reports[row[0]] = reports.get(row[0], 0) + 1
+        with self.db:       # One transaction per batch
+            self.db.executemany(INSERT, self.rows)
+            self.db.executemany(UPDATE_OBJECT, [(count, name) for name, count in reports.items()])
+        self.stats['stored'] += len(self.rows)
+        self.stats['batches'] += 1
+        self.stats['flush_ms'] = (time.perf_counter() - started) * 1000
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    # ---------- Queries ----------
+    def latest(self, name=None):
+        """Latest report of every balloon (list of dicts, by object), or of one (dict or None)"""
+        columns = ', '.join('p.' + column for column in REPORT_COLUMNS)
+        query = f"SELECT {columns}, o.reports FROM objects o JOIN packets p ON p.id = o.last_id"
+        if name is not None:
+            row = self.db.execute(query + " WHERE o.object = ?", (name,)).fetchone()
+            return None if row is None else dict(zip(REPORT_COLUMNS + ('reports',), row))
+        return [dict(zip(REPORT_COLUMNS + ('reports',), row)) for row in self.db.execute(query + " ORDER BY o.object")]
+
+    def track(self, name, start=None, end=None):
+        """[(rx_time, lat, lon, alt_m)] of one balloon's reports, oldest first"""
+        return self.db.execute("SELECT rx_time, lat, lon, alt_m FROM packets WHERE object = ? AND rx_time BETWEEN ? AND ? "
+                               "AND kind = 0 ORDER BY rx_time",
+                               (name, -1.0 if start is None else start, 1e12 if end is None else end)).fetchall()
+
+    def gaps(self, name, start=None, end=None):
+        """{'heard', 'missing', 'gaps': [(rx_time after the gap, last counter before, first after, missing)]}"""
+        rows = self.db.execute("SELECT rx_time, tx_counter FROM packets WHERE object = ? AND rx_time BETWEEN ? AND ? "
+                               "ORDER BY rx_time",
+                               (name, -1.0 if start is None else start, 1e12 if end is None else end))
+        (heard, missing, gaps, last) = (0, 0, [], None)
+        for rx_time, counter in rows:
+            if counter is None:
+                continue
+            step = 1 if last is None else (counter - last) % 256
+            if step == 0 or step > 128:     # Already heard, or an older packet arriving late
+                continue
+            heard += 1
+            if step > 1:
+                gaps.append((rx_time, last, counter, step - 1))
+                missing += step - 1
+            last = counter
+        return {'heard': heard, 'missing': missing, 'gaps': gaps}
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM packets").fetchone()[0] + len(self.rows)
+
+    def summary(self):
+        """'1,234,567 packets, 3 balloons (last batch 4.2 ms)'"""
+        balloons = self.db.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+        return f"{self.count():,} packets, {balloons} balloon{'' if balloons == 1 else 's'} (last batch {self.stats['flush_ms']:.1f} ms)"
+
+
+#-------------------- MAIN FUNCTION --------------------
+def parse_since(text):
+    """'90m' / '2h' / '1d' before now, or a Unix time"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1:] in units:
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def stamp(rx_time):
+    return datetime.fromtimestamp(rx_time).strftime('%m-%d %H:%M:%S')
+
+
+def print_latest(rows):
+    print(f"{'Object:':<13}{'Heard:':<17}{'Lat:':<11}{'Lon:':<12}{'Alt (M):':<10}{'Status:':<9}{'Reports:':<10}Trigger:")
+    for row in rows:
+        print(f"{CYAN}{row['object']:<13}{RESET}{stamp(row['rx_time']):<17}{row['lat']:<11.5f}{row['lon']:<12.5f}"
+              f"{row['alt_m']!s:<10}{GREEN if row['intact'] else RED}{'Intact' if row['intact'] else 'Killed':<9}{RESET}"
+              f"{row['reports']:<10,}{row['trigger'] or ''}")
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def simulate(store, count, balloons=10):
+    """Synthetic traffic through the real receive pipeline into the store; times the fill and the queries"""
+    import ground_station
+    pipeline = ground_station.ReceiverPipeline(store=store)
+    names = tuple(f"{11 + k}a" for k in range(balloons))
+    started = time.perf_counter()
+    for batch in ground_station.batched(ground_station.simulated_packets(count, names), 1024):
+        pipeline.process(batch)
+    store.flush()
+    elapsed = time.perf_counter() - started
+    print(f"{MAGENTA}{'Stored:':<25}{RESET}{count:,} packets in {elapsed:.1f} s ({count / elapsed:,.0f} packets/s, "
+          f"decode included), {store.stats['batches']:,} batches")
+    print(f"{MAGENTA}{'Database:':<25}{RESET}{store.summary()}, {os.path.getsize(store.filename) / 1e6:.0f} MB")
+    (rows, latest_ms) = timed(store.latest)
+    (name, since) = (rows[0]['object'], rows[0]['rx_time'] - 3 * 3600)
+    (track, track_ms) = timed(store.track, name, since)
+    (gaps, gaps_ms) = timed(store.gaps, name, since)
+    print(f"{MAGENTA}{'Latest, all balloons:':<25}{RESET}{latest_ms:.2f} ms ({len(rows)} balloons)")
+    print(f"{MAGENTA}{'Track, last 3 h:':<25}{RESET}{track_ms:.2f} ms ({len(track):,} fixes of {name})")
+    print(f"{MAGENTA}{'Gaps, last 3 h:':<25}{RESET}{gaps_ms:.2f} ms ({gaps['heard']:,} heard, {gaps['missing']:,} missing)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SABER ground station packet store")
+    parser.add_argument('database', help="SQLite file (ground_station.py --store)")
+    parser.add_argument('--track', metavar='OBJECT', help="print one balloon's track")
+    parser.add_argument('--gaps', metavar='OBJECT', help="print gaps in one balloon's tx_counter sequence")
+    parser.add_argument('--since', help="start of the range: 90m, 2h, 1d ago or a Unix time")
+    parser.add_argument('--until', type=float, help="end of the range (Unix time)")
+    parser.add_argument('--simulate', type=int, metavar='N', help="store N synthetic packets, then time the queries")
+    args = parser.parse_args()
+
+    store = PacketStore(args.database)
+    start = parse_since(args.since) if args.since else None
+    try:
+        if args.simulate:
+            simulate(store, args.simulate)
+        elif args.track:
+            for rx_time, lat, lon, alt in store.track(args.track, start, args.until):
+                print(f"{stamp(rx_time):<17}{lat:<11.5f}{lon:<12.5f}{alt}")
+        elif args.gaps:
+            result = store.gaps(args.gaps, start, args.until)
+            for rx_time, before, after, missing in result['gaps']:
+                print(f"{stamp(rx_time):<17}#{before} -> #{after}  {ORANGE}{missing} missing{RESET}")
+            print(f"{MAGENTA}{'Heard / missing:':<25}{RESET}{result['heard']:,} / {result['missing']:,}")
+        else:
+            print_latest(store.latest())
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
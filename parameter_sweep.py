@@ -0,0 +1,347 @@
+"""
+Parameter sweep: replays flights through the flight decision logic for every combination of the tunable settings,
+in parallel over a process pool, and tabulates decision timing, false triggers and airtime.
+
+Notes:
+1) Decision rules replayed, as flight_3.5.py and termination_core.py apply them:
+    - Base altitude: mean of the fixes 20-40 s after start (set_base_alt())
+    - assess_airborne() every sensor_interval + 3 s on the latest fix: on the ground, a valid fix inside the fence
+      takes the ground branch and only otherwise does gps_alt > base_alt + airborne_delta set airborne (as written,
+      a flight that stays inside the fence is never declared airborne, so its timer never starts; --altitude-only
+      replays the rule without the fence branch)
+    - Once airborne: assess_descent() (more than 3 falling assessments in a row), and the descent update once
+      descending below descent_threshold (flight_3.5.py currently hard-codes 3048 m there; descent_threshold is unused)
+    - Termination core: timer at launch + flight_time_limit; geofence after confirm_s outside on fresh fixes
+      (a fix older than fix_timeout, or invalid, does not count)
+    - Airtime: a burst of msg_iterations reports msg_interval apart every update_interval minutes, the descent
+      update and the termination report, at SF12/125 kHz (sim_hardware.time_on_air)
+2) Flights: synthetic scenarios with known truth (launch, burst, fence exit), or recorded logs (.csv/.sbl), whose
+   truth is estimated from the smoothed track
+3) False triggers: airborne before launch, descent before burst, a geofence cutdown while the true track is inside
+   the fence; a missed cutdown is a true exit that is never acted on
+4) Each worker builds every flight once (cached per process) and then runs whole configurations, so only the
+   parameters and a result row cross the process boundary
+
+Usage:
+    python3 parameter_sweep.py                                  Default grid over the synthetic scenarios
+    python3 parameter_sweep.py --log KW5AUS_flight_data.sbl     Add a recorded flight
+    python3 parameter_sweep.py --altitude-only                  Airborne on altitude alone, without the fence branch
+    python3 parameter_sweep.py --confirm 5,10,30 --delta 10,20 --csv sweep.csv
+"""
+
+
+import argparse
+import bisect
+import csv
+import functools
+import itertools
+import math
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import aprs_codec
+from landing_predictor import RHO0, air_density
+from sim_hardware import time_on_air
+from termination_core import DEFAULT_CONFIG, point_in_polygon
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+GRID = {
+    'airborne_delta': [10, 20, 50],
+    'descent_threshold': [1500, 3048],
+    'confirm_s': [5, 10, 30],
+    'update_interval': [1, 2, 5],
+    'msg_iterations': [1, 2, 3],
+}
+FIXED = {
+    'assess_period': 23,        # sensor_interval + 3
+    'base_window': (20, 40),    # set_base_alt(): 20 s after start, for 20 s
+    'flight_time_limit': 7200,
+    'fix_timeout': DEFAULT_CONFIG['fix_timeout'],
+    'msg_interval': 5,
+    'fence_holds_ground': True,     # assess_airborne()'s `gps_valid and contained` branch
+}
+FENCE = DEFAULT_CONFIG['fence']
+LAUNCH = (38.8339, -104.8214, 1840.0)
+REPORT_BYTES = len(aprs_codec.object_report("SABER_11a", '011423z', 38.8339, -104.8214, 101, 69,
+                                            aprs_codec.flight_comment(30000.0, 5400, True, 'None') + 'B85%3.2h')) + 1
+PACKET_AIRTIME = time_on_air(REPORT_BYTES, sf=12, bw=125000, cr=5)
+
+# name: (pad seconds, altitude noise m, spike rate, burst/float altitude, float seconds, drift m/s east, glitch rate)
+SCENARIOS = {
+    'nominal':    (600, 5.0, 0.0, 30000.0, 0, 10.0, 0.0),
+    'float_exit': (600, 5.0, 0.0, 20000.0, 10800, 35.0, 0.0),
+    'noisy_pad':  (1800, 15.0, 0.004, 30000.0, 0, 10.0, 0.0),
+    'glitchy':    (600, 5.0, 0.0, 25000.0, 3600, 15.0, 0.003),
+}
+
+
+#-------------------- FLIGHTS --------------------
+def synthetic_flight(name, seed):
+    """1 Hz fixes for one scenario: (t, lat, lon, alt, valid) arrays and the true launch/burst/exit times"""
+    (pad, noise, spikes, top, float_s, drift, glitches) = SCENARIOS[name]
+    rng = np.random.default_rng(seed)
+    climb = (top - LAUNCH[2]) / 5.0
+    # Descent under the parachute: 5 m/s at sea level, faster in thin air; integrate time against altitude
+    levels = np.arange(top, LAUNCH[2], -50.0)
+    fall = np.concatenate(([0.0], np.cumsum(50.0 / (5.0 * np.sqrt(RHO0 / air_density(levels[1:]))))))
+    duration = int(pad + climb + float_s + fall[-1]) + 300
+    t = np.arange(duration, dtype=np.float64)
+    flight_t = np.clip(t - pad, 0, None)
+    alt = np.where(flight_t <= climb, LAUNCH[2] + 5.0 * flight_t, top)
+    falling = flight_t - climb - float_s
+    alt = np.where(falling > 0, np.interp(falling, fall, levels, right=LAUNCH[2]), alt)
+    alt = np.maximum(alt, LAUNCH[2])
+    landed = pad + climb + float_s + fall[-1]
+    east_m = drift * np.clip(np.minimum(t, landed) - pad, 0, None) * np.where(alt > 8000, 1.0, 0.5)
+    lat = np.full(duration, LAUNCH[0]) + rng.normal(0, 2e-5, duration)
+    lon = LAUNCH[1] + np.degrees(np.cumsum(np.diff(east_m, prepend=0.0)) / (6371000.0 * math.cos(math.radians(LAUNCH[0]))))
+    truth_inside = np.array([point_in_polygon(a, b, FENCE) for a, b in zip(lat, lon)])
+    alt = alt + rng.normal(0, noise, duration)
+    spike = rng.random(duration) < spikes
+    alt[spike] += rng.choice([-1, 1], spike.sum()) * rng.uniform(50, 150, spike.sum())
+    valid = np.ones(duration, dtype=bool)
+    for start in np.flatnonzero(rng.random(duration) < glitches):       # Multipath jump or a short dropout
+        length = int(rng.integers(1, 20))
+        if rng.random() < 0.5:
+            lon[start:start + length] += 4.0
+        else:
+            valid[start:start + length * 3] = False
+    exits = np.flatnonzero(~truth_inside)
+    truth = {'launch': float(pad), 'burst': float(pad + climb + float_s),
+             'exit': float(t[exits[0]]) if len(exits) else None, 'inside': truth_inside}
+    return t, lat, lon, alt, valid, truth
+
+
+def logged_flight(filename):
+    """A recorded flight; truth from the 60 s median track (launch: leaving the pad, burst: leaving the top)"""
+    import flight_analysis
+    flight = flight_analysis.load_log(filename)
+    keep = (flight['lat'] != 0) | (flight['lon'] != 0)
+    t, lat, lon, alt = (flight[key][keep].astype(np.float64) for key in ('t', 'lat', 'lon', 'alt'))
+    t = t - t[0]
+    window = max(int(60 / max(float(np.median(np.diff(t))) if len(t) > 1 else 1.0, 1.0)), 1)
+    smooth = lambda values: np.array([np.median(values[max(k - window, 0):k + window + 1]) for k in range(len(values))])
+    (alt_s, lat_s, lon_s) = (smooth(alt), smooth(lat), smooth(lon))
+    pad = float(np.median(alt_s[:window]))
+    above = np.flatnonzero(alt_s > pad + 100)
+    if len(above):      # Back to where it left the pad
+        above = np.flatnonzero(alt_s[:above[0]] <= pad + 10)[-1:] + 1
+    top = int(np.flatnonzero(alt_s >= alt_s.max() - 50)[-1])       # End of the float, if there was one
+    inside = np.array([point_in_polygon(a, b, FENCE) for a, b in zip(lat_s, lon_s)])
+    exits = np.flatnonzero(~inside)
+    truth = {'launch': float(t[above[0]]) if len(above) else None,
+             'burst': float(t[top]) if alt_s[top] - alt_s[-1] > 1000 else None,
+             'exit': float(t[exits[0]]) if len(exits) else None, 'inside': inside}
+    return t, lat, lon, alt, np.ones(len(t), dtype=bool), truth
+
+
+@functools.lru_cache(maxsize=None)
+def flight(spec):
+    """Built once per worker process: lists for the replay loops plus the truth"""
+    (t, lat, lon, alt, valid, truth) = logged_flight(spec[1]) if spec[0] == 'log' else synthetic_flight(*spec)
+    inside = [point_in_polygon(a, b, FENCE) for a, b in zip(lat, lon)]
+    return {'t': t.tolist(), 'alt': alt.tolist(), 'valid': valid.tolist(), 'inside': inside,
+            'truth_inside': truth['inside'].tolist(), 'launch': truth['launch'], 'burst': truth['burst'],
+            'exit': truth['exit']}
+
+
+#-------------------- REPLAY --------------------
+def assess(data, params):
+    """assess_airborne()/assess_descent() on their cadence: (airborne time, descent time, descent update time)"""
+    t, alt, valid, inside = data['t'], data['alt'], data['valid'], data['inside']
+    (first, last) = params['base_window']
+    readings = [alt[k] for k in range(bisect.bisect_left(t, first), bisect.bisect_left(t, last)) if valid[k]]
+    base_alt = sum(readings) / len(readings) if readings else 0
+    airborne_t = descent_t = update_t = None
+    (descent_alt, falls) = (0, 0)
+    contained = False
+    now = last
+    while now <= t[-1]:
+        k = bisect.bisect_right(t, now) - 1
+        if valid[k]:
+            contained = inside[k]
+        if airborne_t is None:
+            if not (params['fence_holds_ground'] and valid[k] and contained) and alt[k] > base_alt + params['airborne_delta']:
+                airborne_t = now
+        else:
+            falls = falls + 1 if alt[k] < descent_alt else 0
+            descent_alt = alt[k]
+            if falls > 3:
+                descent_t = descent_t if descent_t is not None else now
+                if update_t is None and descent_alt < params['descent_threshold']:
+                    update_t = now
+        now += params['assess_period']
+    return airborne_t, descent_t, update_t
+
+
+def geofence(data, params, until):
+    """First time the core would cut down for the fence before `until`, or None"""
+    t, valid, inside = data['t'], data['valid'], data['inside']
+    (confirm, timeout) = (params['confirm_s'], params['fix_timeout'])
+    breach = None
+    for k in range(len(t)):
+        if t[k] >= until:
+            return None
+        if k and breach is not None and valid[k - 1]:      # Between fixes: the last one is outside and still fresh
+            due = max(breach + confirm, t[k - 1])
+            if due < t[k] and due - t[k - 1] <= timeout:
+                return due if due < until else None
+        if valid[k]:
+            if inside[k]:
+                breach = None
+            elif breach is None:
+                breach = t[k]
+            if breach is not None and t[k] - breach >= confirm:
+                return t[k]
+    return None
+
+
+def airtime(data, params, extra_packets):
+    """(packets, seconds on air) from start to the end of the flight"""
+    burst_s = params['msg_iterations'] * (PACKET_AIRTIME + params['msg_interval'])
+    bursts = int(data['t'][-1] // (params['update_interval'] * 60 + burst_s)) + 1
+    packets = bursts * params['msg_iterations'] + extra_packets
+    return packets, packets * PACKET_AIRTIME
+
+
+def replay(data, params):
+    airborne_t, descent_t, update_t = assess(data, params)
+    timer_t = airborne_t + params['flight_time_limit'] if airborne_t is not None else math.inf
+    fence_t = geofence(data, params, timer_t)
+    (term_t, trigger) = (fence_t, 'Geofencing') if fence_t is not None else (timer_t, 'Timing') if timer_t <= data['t'][-1] else (None, None)
+    launch, burst, exit_t = data['launch'], data['burst'], data['exit']
+    false_fence = fence_t is not None and not (exit_t is not None and fence_t >= exit_t)
+    if fence_t is not None and not false_fence:
+        k = bisect.bisect_right(data['t'], fence_t) - 1
+        false_fence = data['truth_inside'][k] and data['truth_inside'][max(k - int(params['confirm_s']), 0)]
+    packets, seconds = airtime(data, params, (update_t is not None) + (term_t is not None))
+    return {
+        'airborne_delay': None if airborne_t is None or launch is None else airborne_t - launch,
+        'false_airborne': airborne_t is not None and (launch is None or airborne_t < launch),
+        'descent_delay': None if descent_t is None or burst is None else descent_t - burst,
+        'false_descent': descent_t is not None and (burst is None or descent_t < burst),
+        'fence_delay': None if fence_t is None or exit_t is None or false_fence else fence_t - exit_t,
+        'false_fence': false_fence,
+        'missed_fence': exit_t is not None and (term_t is None or term_t > exit_t + 600),
+        'trigger': trigger,
+        'airtime_s_h': seconds / (data['t'][-1] / 3600),
+        'packets': packets,
+    }
+
+
+_specs = []
+
+
+def init_worker(specs):
+    global _specs
+    _specs = specs
+
+
+def run_config(params):
+    """One configuration over every flight; runs in a worker process"""
+    runs = [replay(flight(spec), params) for spec in _specs]
+    middle = lambda key: (statistics.median(values) if (values := [run[key] for run in runs if run[key] is not None and run[key] >= 0])
+                          else None)
+    return {
+        **{name: params[name] for name in GRID},
+        'airborne_s': middle('airborne_delay'), 'descent_s': middle('descent_delay'), 'fence_s': middle('fence_delay'),
+        'false_triggers': sum(run['false_airborne'] + run['false_descent'] + run['false_fence'] for run in runs),
+        'missed_cutdowns': sum(run['missed_fence'] for run in runs),
+        'never_airborne': sum(run['airborne_delay'] is None and not run['false_airborne'] for run in runs),
+        'airtime_s_h': statistics.mean(run['airtime_s_h'] for run in runs),
+        'per_flight': [(spec[0] if spec[0] != 'log' else os.path.basename(spec[1]), run) for spec, run in zip(_specs, runs)],
+    }
+
+
+def sweep(specs, grid, workers=None):
+    """Every combination of the grid over every flight; returns the result rows in grid order"""
+    configs = [dict(FIXED, **dict(zip(grid, values))) for values in itertools.product(*grid.values())]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(specs,)) as executor:
+        return list(executor.map(run_config, configs, chunksize=max(len(configs) // (workers * 4), 1)))
+
+
+#-------------------- MAIN FUNCTION --------------------
+def cell(value, width, digits=0):
+    return f"{'never' if value is None else format(value, f'.{digits}f'):>{width}}"
+
+
+def print_table(rows, top=None):
+    rows = sorted(rows, key=lambda row: (row['false_triggers'], row['missed_cutdowns'], row['fence_s'] or math.inf,
+                                         row['airtime_s_h']))
+    print(f"{'Delta':>6}{'Desc thr':>9}{'Confirm':>8}{'Update':>7}{'Iter':>5} | {'Airborne':>9}{'Descent':>9}{'Fence':>7}"
+          f"{'False':>7}{'Missed':>7}{'Never up':>9}{'Air s/h':>9}")
+    print(f"{'(m)':>6}{'(m)':>9}{'(s)':>8}{'(min)':>7}{'':>5} | {'(s)':>9}{'(s)':>9}{'(s)':>7}{'':>7}{'':>7}{'':>9}{'':>9}")
+    for row in rows[:top]:
+        colour = GREEN if row['false_triggers'] == 0 and row['missed_cutdowns'] == 0 else ORANGE
+        print(f"{row['airborne_delta']:>6}{row['descent_threshold']:>9}{row['confirm_s']:>8}{row['update_interval']:>7}"
+              f"{row['msg_iterations']:>5} | {cell(row['airborne_s'], 9)}{cell(row['descent_s'], 9)}{cell(row['fence_s'], 7)}"
+              f"{colour}{row['false_triggers']:>7}{row['missed_cutdowns']:>7}{RESET}{row['never_airborne']:>9}"
+              f"{row['airtime_s_h']:>9.1f}")
+
+
+def write_csv(rows, filename):
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(list(GRID) + ['flight', 'trigger', 'airborne_delay', 'descent_delay', 'fence_delay',
+                                      'false_airborne', 'false_descent', 'false_fence', 'missed_fence', 'packets',
+                                      'airtime_s_h'])
+        for row in rows:
+            for name, run in row['per_flight']:
+                writer.writerow([row[key] for key in GRID] + [name, run['trigger'], run['airborne_delay'],
+                                 run['descent_delay'], run['fence_delay'], run['false_airborne'], run['false_descent'],
+                                 run['false_fence'], run['missed_fence'], run['packets'], round(run['airtime_s_h'], 2)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the flight decision parameters over replayed flights")
+    parser.add_argument('--log', nargs='*', default=[], help="recorded flight logs (.csv or .sbl) to replay as well")
+    parser.add_argument('--no-synthetic', action='store_true', help="replay only the --log flights")
+    parser.add_argument('--seeds', type=int, default=3, help="runs per synthetic scenario")
+    parser.add_argument('--delta', help="airborne_delta values, e.g. 10,20,50")
+    parser.add_argument('--threshold', help="descent_threshold values")
+    parser.add_argument('--confirm', help="geofence confirm_s values")
+    parser.add_argument('--interval', help="update_interval values (minutes)")
+    parser.add_argument('--iterations', help="msg_iterations values")
+    parser.add_argument('--altitude-only', action='store_true', help="declare airborne on altitude alone, inside the fence too")
+    parser.add_argument('--limit', type=float, default=FIXED['flight_time_limit'], help="flight_time_limit (s)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--top', type=int, help="print only the best N configurations")
+    parser.add_argument('--csv', help="write every configuration x flight result here")
+    args = parser.parse_args()
+
+    grid = dict(GRID)
+    for name, text in (('airborne_delta', args.delta), ('descent_threshold', args.threshold), ('confirm_s', args.confirm),
+                       ('update_interval', args.interval), ('msg_iterations', args.iterations)):
+        if text:
+            grid[name] = [float(value) if '.' in value else int(value) for value in text.split(',')]
+    FIXED['flight_time_limit'] = args.limit
+    FIXED['fence_holds_ground'] = not args.altitude_only
+    specs = [] if args.no_synthetic else [(name, seed) for name in SCENARIOS for seed in range(args.seeds)]
+    specs += [('log', os.path.abspath(filename)) for filename in args.log]
+    if not specs:
+        parser.error("nothing to replay")
+    workers = args.workers or os.cpu_count() or 1
+    configs = math.prod(len(values) for values in grid.values())
+
+    print(f"{MAGENTA}{'Sweep:':<25}{RESET}{configs} configurations x {len(specs)} flights on {workers} worker"
+          f"{'' if workers == 1 else 's'} (report {REPORT_BYTES} bytes, {PACKET_AIRTIME:.2f} s on air)")
+    started = time.perf_counter()
+    rows = sweep(specs, grid, workers)
+    elapsed = time.perf_counter() - started
+    print(f"{MAGENTA}{'Replayed:':<25}{RESET}{configs * len(specs):,} flights in {elapsed:.1f} s\n")
+    print_table(rows, args.top)
+    if args.csv:
+        write_csv(rows, args.csv)
+        print(f"\n{MAGENTA}{'Results:':<25}{RESET}{args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Power-aware duty cycling for the flight computer: a normal profile and a low-power cruise profile.
+
+Notes:
+1) Cruise is for the long steady float: airborne, intact, inside the geofence, a valid fix, and the altitude
+   holding inside steady_band meters for steady_time seconds. Anything else (climb, descent, termination, lost
+   fix) drops straight back to normal. mode 'normal' or 'cruise' pins the profile instead
+2) In cruise:
+    - The SX127x sleeps between update bursts. With the uplink enabled it keeps listening for listen_window
+      seconds after each burst (when the ground answers what it just heard), then sleeps until the next burst
+    - The NEO-6M goes into Power Save Mode (UBX CFG-RXM); back to continuous tracking in normal
+    - record/display/sensor cadences are stretched by cadence_scale (interval(), SensorSampler.interval_scale)
+    - The CPU frequency governor is set to powersave, if the process is allowed to write to sysfs
+3) Flight timer, geofence and termination keep their cadence in every profile
+4) Energy per profile comes from the INA219 energy monitor's watt-hour counter, read at every profile change,
+   so the log and the display can show Wh per hour for each profile
+"""
+
+
+import collections
+import glob
+import time
+
+import ubx
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+PROFILES = ('normal', 'cruise')
+CPU_GOVERNORS = {'normal': 'ondemand', 'cruise': 'powersave'}
+CPU_GOVERNOR_FILES = '/sys/devices/system/cpu/cpu*/cpufreq/scaling_governor'
+
+
+class PowerManager:
+    """
+    - update(steady_conditions, altitude) every few seconds picks the profile; set_profile() applies it
+    - interval(seconds) is the cadence to sleep for in the current profile
+    - radio_wake() before every transmit; after_burst() when a burst is done (sleeps the radio in cruise)
+    """
+    def __init__(self, LoRa, gps_serial=None, energy=None, uplink=None, sampler=None, mode='auto',
+                 cadence_scale=3, listen_window=30, steady_time=600, steady_band=300, cpu_governor=True):
+        if mode not in PROFILES + ('auto',):
+            raise ValueError(f"power mode must be 'auto', 'normal' or 'cruise', not {mode!r}")
+        self.LoRa = LoRa
+        self.gps_serial = gps_serial
+        self.energy = energy
+        self.uplink = uplink
+        self.sampler = sampler
+        self.mode = mode
+        self.cadence_scale = cadence_scale
+        self.listen_window = listen_window
+        self.steady_time = steady_time
+        self.steady_band = steady_band
+        self.cpu_governor = cpu_governor
+        self.profile = 'normal'
+        self.scale = 1
+        self.changes = 0
+        self.radio_asleep = False
+        self.last_error = ''
+        self.usage = {name: {'wh': 0.0, 'seconds': 0.0} for name in PROFILES}
+        self._history = collections.deque()     # (monotonic, altitude) while the steady conditions hold
+        self._since = time.monotonic()
+        self._wh_mark = self._watt_hours()
+        self._sleep_handle = None
+
+    # ---------- Profile ----------
+    def update(self, steady_conditions, altitude, now=None):
+        """Call with the flight state every few seconds; returns the profile in force"""
+        now = time.monotonic() if now is None else now
+        history = self._history
+        if steady_conditions:
+            history.append((now, altitude))
+            while len(history) > 1 and now - history[1][0] >= self.steady_time:
+                history.popleft()       # Keep one sample at least steady_time old
+        else:
+            history.clear()
+        if self.mode != 'auto':
+            wanted = self.mode
+        else:
+            altitudes = [alt for t, alt in history]
+            steady = (bool(history) and now - history[0][0] >= self.steady_time and
+                      max(altitudes) - min(altitudes) <= self.steady_band)
+            wanted = 'cruise' if steady else 'normal'
+        self.set_profile(wanted)
+        return self.profile
+
+    def set_profile(self, name):
+        if name == self.profile:
+            return
+        self._account()
+        self.profile = name
+        self.changes += 1
+        cruise = name == 'cruise'
+        self.scale = self.cadence_scale if cruise else 1
+        if self.sampler is not None:
+            self.sampler.interval_scale = self.scale
+        self._gps_power_save(cruise)
+        if self.cpu_governor:
+            self._set_governor(CPU_GOVERNORS[name])
+        if not cruise:
+            self._cancel_sleep()
+            self.radio_wake()
+            if self.uplink is not None:
+                self.uplink.wake()      # Back to listening between bursts
+        print(f"{MAGENTA}{'Power profile:':<25}{CYAN}{name}{RESET} (cadence x{self.scale})")
+
+    def interval(self, seconds):
+        return seconds * self.scale
+
+    # ---------- Radio ----------
+    def radio_wake(self):
+        """Standby before a transmit: the FIFO cannot be written while the radio sleeps"""
+        self._cancel_sleep()
+        if self.radio_asleep:
+            self.LoRa.standby()
+            self.radio_asleep = False
+
+    def after_burst(self, loop):
+        """In cruise, sleep the radio once the post-burst listen window (uplink only) has passed"""
+        if self.profile != 'cruise':
+            return
+        self._cancel_sleep()
+        self._sleep_handle = loop.call_later(self.listen_window if self.uplink is not None else 0, self._radio_sleep)
+
+    def _radio_sleep(self):
+        self._sleep_handle = None
+        if self.profile != 'cruise':
+            return
+        if self.uplink is not None:
+            self.uplink.sleep()
+        else:
+            self.LoRa.sleep()
+            self.radio_asleep = True
+
+    def _cancel_sleep(self):
+        if self._sleep_handle is not None:
+            self._sleep_handle.cancel()
+            self._sleep_handle = None
+
+    # ---------- GPS & CPU ----------
+    def _gps_power_save(self, enabled):
+        if self.gps_serial is None:
+            return
+        try:
+            self.gps_serial.write(ubx.cfg_rxm(enabled))
+        except Exception as e:
+            self.last_error = f"GPS power mode: {e}"
+            print(f"\n{RED}{'GPS power mode error:':<25}{RESET}{e}\n")
+
+    def _set_governor(self, governor):
+        for path in glob.glob(CPU_GOVERNOR_FILES):
+            try:
+                with open(path, mode='w') as file:
+                    file.write(governor)
+            except OSError as e:       # Not root, or no cpufreq driver: cadences and radio still save power
+                self.last_error = f"CPU governor: {e}"
+                self.cpu_governor = False
+                return
+
+    # ---------- Energy ----------
+    def _watt_hours(self):
+        return self.energy.watt_hours if self.energy is not None else 0.0
+
+    def _account(self):
+        now = time.monotonic()
+        watt_hours = self._watt_hours()
+        usage = self.usage[self.profile]
+        usage['wh'] += watt_hours - self._wh_mark
+        usage['seconds'] += now - self._since
+        self._since = now
+        self._wh_mark = watt_hours
+
+    def wh_per_hour(self, name=None):
+        """Measured watt-hours per hour in a profile (default: the current one); None until it has run a minute"""
+        self._account()
+        usage = self.usage[name or self.profile]
+        if self.energy is None or usage['seconds'] < 60:
+            return None
+        return usage['wh'] / usage['seconds'] * 3600
+
+    def summary(self):
+        """'cruise x3: normal 2.41 Wh/h (1.2 h), cruise 1.52 Wh/h (3.0 h)'"""
+        parts = []
+        for name in PROFILES:
+            rate = self.wh_per_hour(name)
+            if rate is not None:
+                parts.append(f"{name} {rate:.2f} Wh/h ({self.usage[name]['seconds'] / 3600:.1f} h)")
+        return f"{self.profile} x{self.scale}: " + (', '.join(parts) if parts else 'no energy data yet')
@@ -0,0 +1,116 @@
+"""
+Thread-pool sensor sampler for the flight computer.
+
+Notes:
+1) Each sensor driver (DHT22 read, INA219 voltage/current/power) runs in a worker thread, never on the event loop
+2) Every sensor has its own cadence and a hard timeout; a hung read is abandoned and the sensor is skipped
+   until the stuck call returns, so one bad device cannot tie up the whole pool
+3) The last good value is kept with its timestamp and flagged stale once it is older than stale_after
+4) Reads, errors and timeouts are counted per device for the display and the log
+5) interval_scale stretches every cadence (and the stale limit with it), e.g. 3 in the low-power cruise profile
+"""
+
+
+import asyncio
+import concurrent.futures
+import time
+from datetime import datetime
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+class SensorSampler:
+    """
+    - register() a driver function per device, then start() the sampler from inside the event loop
+    - latest(name) returns the published reading dictionary:
+        value, time (monotonic), timestamp (HH:MM:SS), age, stale, reads, errors, timeouts, last_error
+    """
+    def __init__(self, max_workers=None):
+        self.sensors = {}
+        self.readings = {}
+        self.interval_scale = 1
+        self._max_workers = max_workers
+        self._pool = None
+        self._tasks = []
+
+    def register(self, name, read, interval, timeout=5, stale_after=None, on_update=None):
+        """
+        - read: blocking driver call returning the new value (raise on a bad read)
+        - interval: seconds between reads; timeout: seconds before a read is abandoned
+        - stale_after: age in seconds at which the last good value is flagged stale (default 3 intervals)
+        - on_update: called on the event loop with each good value
+        """
+        self.sensors[name] = {'read': read, 'interval': interval, 'timeout': timeout,
+                              'stale_after': stale_after if stale_after is not None else 3 * interval,
+                              'on_update': on_update, 'busy': None}
+        self.readings[name] = {'value': None, 'time': None, 'timestamp': '', 'age': None, 'stale': True,
+                               'reads': 0, 'errors': 0, 'timeouts': 0, 'last_error': ''}
+
+    def start(self):
+        # One worker per sensor plus a spare, so a hung device cannot starve the others
+        workers = self._max_workers or len(self.sensors) + 1
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sensor')
+        self._tasks = [asyncio.create_task(self._sample(name)) for name in self.sensors]
+        return self._tasks
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def latest(self, name):
+        reading = self.readings[name]
+        if reading['time'] is not None:
+            reading['age'] = round(time.monotonic() - reading['time'], 1)
+            reading['stale'] = reading['age'] > self.sensors[name]['stale_after'] * self.interval_scale
+        return reading
+
+    def value(self, name, default=None):
+        """Last good value, or default if there is none or it has gone stale"""
+        reading = self.latest(name)
+        return default if reading['stale'] else reading['value']
+
+    def status(self):
+        """Short per-device summary for display(): 'dht22 OK, ina219 STALE(3e/1t)'"""
+        parts = []
+        for name in self.sensors:
+            reading = self.latest(name)
+            state = 'STALE' if reading['stale'] else 'OK'
+            if reading['errors'] or reading['timeouts']:
+                state += f"({reading['errors']}e/{reading['timeouts']}t)"
+            parts.append(f"{name} {state}")
+        return ', '.join(parts)
+
+    async def _sample(self, name):
+        sensor = self.sensors[name]
+        reading = self.readings[name]
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            busy = sensor['busy']
+            if busy is not None and not busy.done():
+                pass    # Previous read is still hung in its worker; don't pile another call on the device
+            else:
+                sensor['busy'] = loop.run_in_executor(self._pool, sensor['read'])
+                try:
+                    value = await asyncio.wait_for(asyncio.shield(sensor['busy']), sensor['timeout'])
+                    reading['value'] = value
+                    reading['time'] = time.monotonic()
+                    reading['timestamp'] = datetime.now().strftime("%H:%M:%S")
+                    reading['reads'] += 1
+                    if sensor['on_update'] is not None:
+                        sensor['on_update'](value)
+                except asyncio.TimeoutError:
+                    reading['timeouts'] += 1
+                    reading['last_error'] = f"timeout after {sensor['timeout']} s"
+                    print(f"\n{RED}{name + ' timeout:':<25}{RESET}read abandoned after {sensor['timeout']} s\n")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    reading['errors'] += 1
+                    reading['last_error'] = str(e)
+                    print(f"\n{RED}{name + ' error:':<25}{RESET}{e}\n")
+            self.latest(name)
+            await asyncio.sleep(max(sensor['interval'] * self.interval_scale - (loop.time() - started), 0))
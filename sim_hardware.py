@@ -0,0 +1,542 @@
+"""
+Simulated hardware for running the flight and ground station code off the Pi.
+
+Notes:
+1) SimulatedSX127x mirrors the parts of the LoRaRF SX127x API that this repo uses, for both TX and RX
+2) Received packets are injected with inject(), or fed from a list/generator with feed()
+3) Transmitted packets are kept in .sent so a test bench can hand them to a ground station
+4) SimulatedINA219 discharges a pack according to which loads (tx, heat, strobe) are switched on
+5) SimulatedNEO6M answers UBX configuration and streams NMEA or UBX NAV fixes from a flight profile
+6) SimulatedDHT22 and SimulatedOutputDevice stand in for pigpio_dht.DHT22 and the gpiozero outputs
+"""
+
+
+import collections
+import math
+import struct
+import time
+
+
+#-------------------- LoRa AIRTIME --------------------
+def time_on_air(payload_len, sf=12, bw=125000, cr=5, preamble=12, explicit=True, crc=True, ldro=None):
+    """
+    - Returns the LoRa time on air in seconds for a packet of payload_len bytes (Semtech AN1200.13)
+    - cr is the LoRaRF code rate setting (5 = 4/5 ... 8 = 4/8)
+    - ldro defaults to on when the symbol time exceeds 16 ms, as the SX127x requires
+    """
+    t_sym = (2 ** sf) / bw
+    if ldro is None:
+        ldro = t_sym > 0.016
+    de = 1 if ldro else 0
+    ih = 0 if explicit else 1
+    numerator = 8 * payload_len - 4 * sf + 28 + (16 if crc else 0) - 20 * ih
+    n_payload = 8 + max(math.ceil(numerator / (4 * (sf - 2 * de))) * cr, 0)
+    return (preamble + 4.25) * t_sym + n_payload * t_sym
+
+
+#-------------------- SX127x --------------------
+class SimulatedSX127x:
+    """
+    - Drop-in stand-in for LoRaRF.SX127x with no SPI or GPIO underneath
+    - TX: beginPacket/write/put/endPacket/wait behave as on the radio and report a realistic transmitTime()
+    - RX: request()/available()/read()/get() return packets queued with inject() or feed()
+    """
+    # Constants used by the scripts in this repo (values match LoRaRF)
+    TX_POWER_RFO = 0x00
+    TX_POWER_PA_BOOST = 0x80
+    RX_GAIN_POWER_SAVING = 0x00
+    RX_GAIN_BOOSTED = 0x01
+    RX_GAIN_AUTO = 0x00
+    HEADER_EXPLICIT = 0x00
+    HEADER_IMPLICIT = 0x01
+    RX_SINGLE = 0x000000
+    RX_CONTINUOUS = 0xFFFFFF
+    STATUS_DEFAULT = 0
+    STATUS_TX_WAIT = 1
+    STATUS_TX_DONE = 3
+    STATUS_RX_WAIT = 4
+    STATUS_RX_CONTINUOUS = 5
+    STATUS_RX_TIMEOUT = 6
+    STATUS_RX_DONE = 7
+    STATUS_CRC_ERR = 9
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime        # Sleep for the airtime in wait() like the real radio would
+        self._frequency = 915000000
+        self._sf = 7
+        self._bw = 125000
+        self._cr = 5
+        self._preambleLength = 12
+        self._headerType = self.HEADER_EXPLICIT
+        self._crcType = False
+        self._syncWord = 0x3444
+        self._txPower = 17
+        self._irq = -1
+        self._payloadTxRx = 0
+        self._transmitTime = 0.0
+        self._statusWait = self.STATUS_DEFAULT
+        self._statusIrq = 0
+        self._onReceive = None
+        self._onTransmit = None
+        self._tx_buffer = []
+        self._rx_buffer = b''
+        self._rx_queue = collections.deque()
+        self._rx_source = None
+        self._rssi = -110.0
+        self._snr = 5.0
+        self.mode = 'standby'
+        self.sent = []      # (timestamp, bytes) for every packet that left the "antenna"
+
+    # ---------- Configuration ----------
+    def setSpi(self, bus, cs, speed=7800000):
+        pass
+
+    def setPins(self, reset, irq=-1, txen=-1, rxen=-1):
+        self._irq = irq
+
+    def begin(self, *args, **kwargs):
+        return True
+
+    def end(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def sleep(self):
+        self.mode = 'sleep'
+
+    def wake(self):
+        self.mode = 'standby'
+
+    def standby(self):
+        self.mode = 'standby'
+
+    def setTxPower(self, txPower, paPin):
+        self._txPower = txPower
+
+    def setRxGain(self, boost, level):
+        pass
+
+    def setFrequency(self, frequency):
+        self._frequency = frequency
+
+    def setSpreadingFactor(self, sf):
+        self._sf = sf
+
+    def setBandwidth(self, bw):
+        self._bw = bw
+
+    def setCodeRate(self, cr):
+        self._cr = cr
+
+    def setLoRaModulation(self, sf, bw, cr, ldro=False):
+        (self._sf, self._bw, self._cr) = (sf, bw, cr)
+
+    def setLoRaPacket(self, headerType, preambleLength, payloadLength, crcType=False, invertIq=False):
+        self._headerType = headerType
+        self._preambleLength = preambleLength
+        self._crcType = crcType
+
+    def setSyncWord(self, syncWord):
+        self._syncWord = syncWord
+
+    # ---------- Transmit ----------
+    def beginPacket(self):
+        self._tx_buffer = []
+        self._payloadTxRx = 0
+
+    def write(self, data, length=0):
+        if type(data) is list or type(data) is tuple:
+            if length == 0 or length > len(data):
+                length = len(data)
+            data = data[:length]
+        elif type(data) is int or type(data) is float:
+            data = (int(data),)
+        else:
+            raise TypeError("input data must be list, tuple, integer or float")
+        self._tx_buffer.extend(int(b) & 0xFF for b in data)
+        self._payloadTxRx += len(data)
+
+    def put(self, data):
+        if type(data) is not bytes and type(data) is not bytearray:
+            raise TypeError("input data must be bytes or bytearray")
+        self._tx_buffer.extend(data)
+        self._payloadTxRx += len(data)
+
+    def endPacket(self, timeout=0):
+        self.mode = 'tx'
+        self._statusWait = self.STATUS_TX_WAIT
+        self._transmitTime = self.airtime(len(self._tx_buffer))
+        self.sent.append((time.time(), bytes(self._tx_buffer)))
+        return True
+
+    def wait(self, timeout=0):
+        if self._statusWait == self.STATUS_TX_WAIT:
+            if self.realtime:
+                time.sleep(self._transmitTime)
+            self._statusIrq = self.STATUS_TX_DONE
+            self.mode = 'standby'
+            if callable(self._onTransmit):
+                self._onTransmit()
+            return True
+        if self._statusWait in (self.STATUS_RX_WAIT, self.STATUS_RX_CONTINUOUS):
+            t = time.time()
+            while not self._load_next():
+                if timeout > 0 and time.time() - t > timeout:
+                    return False
+                if not self.realtime:
+                    return False
+                time.sleep(0.001)
+            return True
+        return True
+
+    def transmitTime(self):
+        return self._transmitTime * 1000        # milliseconds, as LoRaRF reports it
+
+    def dataRate(self):
+        return self._payloadTxRx / self._transmitTime if self._transmitTime else 0.0
+
+    def airtime(self, length):
+        return time_on_air(length, self._sf, self._bw, self._cr, self._preambleLength,
+                           self._headerType == self.HEADER_EXPLICIT, self._crcType)
+
+    # ---------- Receive ----------
+    def inject(self, packet, rssi=None, snr=None):
+        """Queue one received packet (bytes) and fire onReceive as the DIO0 interrupt would"""
+        self._rx_queue.append((bytes(packet), self._rssi if rssi is None else rssi, self._snr if snr is None else snr))
+        if self.mode == 'rx' and callable(self._onReceive):
+            self._onReceive()
+
+    def feed(self, packets):
+        """Use an iterable of packets (e.g. a recorded capture) as the over-the-air source"""
+        self._rx_source = iter(packets)
+
+    def request(self, timeout=0):
+        self.mode = 'rx'
+        self._statusWait = self.STATUS_RX_CONTINUOUS if timeout == self.RX_CONTINUOUS else self.STATUS_RX_WAIT
+        self._statusIrq = 0
+        self._payloadTxRx = 0
+        return True
+
+    def _load_next(self):
+        if not self._rx_queue and self._rx_source is not None:
+            packet = next(self._rx_source, None)
+            if packet is None:
+                self._rx_source = None
+            else:
+                self._rx_queue.append((bytes(packet), self._rssi, self._snr))
+        if not self._rx_queue:
+            return False
+        (self._rx_buffer, self._rssi, self._snr) = self._rx_queue.popleft()
+        self._payloadTxRx = len(self._rx_buffer)
+        self._statusIrq = self.STATUS_RX_DONE
+        if self._statusWait == self.STATUS_RX_WAIT:
+            self.mode = 'standby'
+        return True
+
+    def status(self):
+        status = self._statusIrq or self._statusWait
+        if self._statusWait == self.STATUS_RX_CONTINUOUS:
+            self._statusIrq = 0
+        return status
+
+    def available(self):
+        if self._payloadTxRx == 0 and self.mode == 'rx':
+            self._load_next()
+        return self._payloadTxRx
+
+    def read(self, length=0):
+        single = length == 0
+        length = 1 if single else length
+        data = self.get(length)
+        return data[0] if single else tuple(data)
+
+    def get(self, length=1):
+        start = len(self._rx_buffer) - self._payloadTxRx
+        data = self._rx_buffer[start:start + length]
+        self._payloadTxRx = max(self._payloadTxRx - length, 0)
+        return data
+
+    def purge(self, length=0):
+        self._payloadTxRx = max(self._payloadTxRx - length, 0) if length else 0
+
+    def packetRssi(self):
+        return self._rssi
+
+    def rssi(self):
+        return self._rssi
+
+    def snr(self):
+        return self._snr
+
+    def onReceive(self, callback):
+        self._onReceive = callback
+
+    def onTransmit(self, callback):
+        self._onTransmit = callback
+
+
+#-------------------- INA219 --------------------
+class SimulatedINA219:
+    """
+    - Stand-in for ina219.INA219 on a pack that discharges with the load
+    - loads: name -> mA drawn while that load is switched on (set_load(name, True/False))
+    """
+    RANGE_16V = 0
+    RANGE_32V = 1
+    GAIN_1_40MV = 0
+    GAIN_8_320MV = 3
+    ADC_8SAMP = 11
+    ADC_128SAMP = 15
+
+    def __init__(self, capacity_mah=2600, start_volts=12.1, base_ma=180.0, loads=None, clock=time.monotonic):
+        self.capacity_mah = capacity_mah
+        self.start_volts = start_volts
+        self.base_ma = base_ma
+        self.loads = loads if loads is not None else {'tx': 120.0, 'heat': 2500.0, 'strobe': 60.0}
+        self.active = set()
+        self.clock = clock
+        self.used_mah = 0.0
+        self._last = clock()
+
+    def configure(self, voltage_range=None, gain=None, bus_adc=None, shunt_adc=None):
+        pass
+
+    def set_load(self, name, on):
+        self._update()
+        if on:
+            self.active.add(name)
+        else:
+            self.active.discard(name)
+
+    def _update(self):
+        now = self.clock()
+        self.used_mah += self.current() * (now - self._last) / 3600
+        self._last = now
+
+    def voltage(self):
+        self._update()
+        return round(self.start_volts - 2.7 * self.used_mah / self.capacity_mah, 3)
+
+    def current(self):
+        return self.base_ma + sum(self.loads.get(name, 0.0) for name in self.active)
+
+    def power(self):
+        return self.voltage() * self.current()
+
+
+#-------------------- NEO-6M --------------------
+class SimulatedNEO6M:
+    """
+    - Stand-in for the pyserial port of a NEO-6M: write() takes UBX CFG frames, read()/readline() return output
+    - Starts as the module boots: 9600 baud, 1 Hz, RMC/GGA/GSA/GSV/GLL/VTG; CFG messages are ACKed and applied
+    - Nothing can be read while baudrate differs from the receiver's UART baud
+    - deaf: CFG frames never reach the receiver (broken RX line); nak: CFG message ids answered with ACK-NAK and
+      not applied
+    - Each epoch follows a straight ascent/descent profile; truth(itow) gives the exact values for checking
+      (descent_rate=0 floats at burst_alt; itow is unambiguous for a week)
+    - sleep_until: optional callable(monotonic time); when set, read()/readline() wait for data like pyserial
+      does (up to .timeout) instead of returning short
+    """
+    TOW_START_MS = 302400000        # Epoch 0: Wednesday 12:00:00 GPS time of week
+    WEEK_MS = 604800000
+
+    def __init__(self, clock=time.monotonic, lat=38.8339, lon=-104.8214, start_alt=1840.0, ascent_rate=5.0,
+                 descent_rate=8.0, burst_alt=30000.0, drift=(2e-5, 3e-5), sleep_until=None, deaf=False, nak=()):
+        import ubx
+        self._ubx = ubx
+        self.clock = clock
+        self.start = clock()
+        self.lat, self.lon, self.start_alt = lat, lon, start_alt
+        self.ascent_rate, self.descent_rate, self.burst_alt = ascent_rate, descent_rate, burst_alt
+        self.drift = drift          # Degrees of latitude and longitude per second
+        self.sleep_until = sleep_until
+        self.deaf, self.nak = deaf, frozenset(nak)
+        self._day0 = int(time.time()) // 86400 * 86400
+        self.baudrate = 9600
+        self.timeout = 0.5
+        self.uart_baud = 9600
+        self.out_protocols = ubx.PROTO_UBX | ubx.PROTO_NMEA
+        self.rate_hz = 1.0
+        self.dyn_model = 0
+        self.enabled = {(ubx.CLASS_NMEA, msg_id) for msg_id in ubx.NMEA_SENTENCES.values()}
+        self.output = bytearray()
+        self.received = []          # (class, id) of every CFG frame accepted
+        self._parser = ubx.UBXParser()
+        self._next_epoch = 0.0
+
+    # ---------- Profile ----------
+    def truth(self, itow):
+        t = ((itow - self.TOW_START_MS) % self.WEEK_MS) / 1000
+        climb = (self.burst_alt - self.start_alt) / self.ascent_rate
+        if t <= climb:
+            alt, vertical = self.start_alt + self.ascent_rate * t, self.ascent_rate
+        else:
+            alt, vertical = max(self.burst_alt - self.descent_rate * (t - climb), self.start_alt), -self.descent_rate
+        return {'itow': itow, 'lat': self.lat + self.drift[0] * t, 'lon': self.lon + self.drift[1] * t, 'alt': alt,
+                'speed_kts': 12.0, 'track': 56.3, 'vertical_rate': vertical, 'sats': 9, 'utc': self._utc(itow)}
+
+    def _epoch(self, itow):
+        ubx = self._ubx
+        truth = self.truth(itow)
+        frames = bytearray()
+        if self.out_protocols & ubx.PROTO_UBX:
+            lat, lon, hmsl = round(truth['lat'] * 1e7), round(truth['lon'] * 1e7), round(truth['alt'] * 1000)
+            speed = round(truth['speed_kts'] / ubx.KNOTS_PER_CM_S)
+            payloads = {
+                ubx.NAV_POSLLH: ubx.POSLLH.pack(itow, lon, lat, hmsl + 20000, hmsl, 2500, 4000),
+                ubx.NAV_VELNED: ubx.VELNED.pack(itow, 0, 0, round(-truth['vertical_rate'] * 100), speed, speed,
+                                                round(truth['track'] * 1e5), 50, 100000),
+                ubx.NAV_SOL: ubx.SOL.pack(itow, 0, 0, 3, 0x0D, 0, 0, 0, 300, 0, 0, 0, 10, 180, 0, truth['sats'], 0),
+                ubx.NAV_TIMEUTC: ubx.TIMEUTC.pack(itow, 30, 0, *self._utc(itow), 0x07),
+            }
+            for msg_id, payload in payloads.items():
+                if (ubx.CLASS_NAV, msg_id) in self.enabled:
+                    frames += ubx.message(ubx.CLASS_NAV, msg_id, payload)
+        if self.out_protocols & ubx.PROTO_NMEA:
+            (year, month, day, hour, minute, second) = self._utc(itow)
+            stamp = f"{hour:02d}{minute:02d}{second:02d}.{itow % 1000 // 10:02d}"
+            lat = f"{int(abs(truth['lat'])):02d}{abs(truth['lat']) % 1 * 60:08.5f},{'N' if truth['lat'] >= 0 else 'S'}"
+            lon = f"{int(abs(truth['lon'])):03d}{abs(truth['lon']) % 1 * 60:08.5f},{'E' if truth['lon'] >= 0 else 'W'}"
+            sentences = {
+                'RMC': f"GPRMC,{stamp},A,{lat},{lon},{truth['speed_kts']:.3f},{truth['track']:.2f},"
+                       f"{day:02d}{month:02d}{year % 100:02d},,,A",
+                'GGA': f"GPGGA,{stamp},{lat},{lon},1,{truth['sats']:02d},1.80,{truth['alt']:.1f},M,-21.0,M,,",
+            }
+            for name, body in sentences.items():
+                if (ubx.CLASS_NMEA, ubx.NMEA_SENTENCES[name]) in self.enabled:
+                    check = 0
+                    for char in body.encode():
+                        check ^= char
+                    frames += f"${body}*{check:02X}\r\n".encode()
+        return frames
+
+    def _utc(self, itow):
+        seconds = self._day0 + ((itow - self.TOW_START_MS) % self.WEEK_MS) // 1000 + 43200
+        utc = time.gmtime(seconds)
+        return utc.tm_year, utc.tm_mon, utc.tm_mday, utc.tm_hour, utc.tm_min, utc.tm_sec
+
+    def _generate(self):
+        elapsed = self.clock() - self.start
+        while self._next_epoch <= elapsed:
+            self.output += self._epoch((self.TOW_START_MS + round(self._next_epoch * 1000)) % self.WEEK_MS)
+            self._next_epoch += 1 / self.rate_hz
+
+    # ---------- Configuration ----------
+    def _apply(self, msg_id, payload):
+        ubx = self._ubx
+        ack = ubx.ACK_ACK
+        if msg_id in self.nak:
+            self.output += ubx.message(ubx.CLASS_ACK, ubx.ACK_NAK, bytes((ubx.CLASS_CFG, msg_id)))
+            return
+        if msg_id == ubx.CFG_PRT:
+            (baud, in_protocols, out_protocols) = struct.unpack_from('<IHH', payload, 8)
+            self.output += ubx.message(ubx.CLASS_ACK, ack, bytes((ubx.CLASS_CFG, msg_id)))
+            self.uart_baud, self.out_protocols = baud, out_protocols
+            return
+        if msg_id == ubx.CFG_MSG:
+            key = (payload[0], payload[1])
+            (self.enabled.add if payload[2] else self.enabled.discard)(key)
+        elif msg_id == ubx.CFG_RATE:
+            self.rate_hz = 1000 / struct.unpack_from('<H', payload)[0]
+            ack = ubx.ACK_NAK if self.rate_hz > 5 else ack
+        elif msg_id == ubx.CFG_NAV5:
+            self.dyn_model = payload[2]
+        elif msg_id != ubx.CFG_RXM:
+            ack = ubx.ACK_NAK
+        self.output += ubx.message(ubx.CLASS_ACK, ack, bytes((ubx.CLASS_CFG, msg_id)))
+
+    # ---------- pyserial ----------
+    def write(self, data):
+        if self.deaf or self.baudrate != self.uart_baud:
+            return len(data)        # Framing errors at the receiver: silently lost
+        data = bytes(data)
+        pos = 0
+        while (start := data.find(self._ubx.SYNC, pos)) >= 0 and len(data) - start >= 8:
+            (msg_class, msg_id, length) = struct.unpack_from('<BBH', data, start + 2)
+            end = start + 8 + length
+            if end > len(data):
+                break
+            if msg_class == self._ubx.CLASS_CFG and self._ubx.checksum(data[start + 2:end - 2]) == data[end - 2:end]:
+                self.received.append((msg_class, msg_id))
+                self._apply(msg_id, data[start + 6:end - 2])
+            pos = end
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        self._generate()
+        return len(self.output) if self.baudrate == self.uart_baud else 0
+
+    def _wait(self):
+        """Blocks (through sleep_until) until the next epoch's output or .timeout, whichever is first"""
+        if self.sleep_until is not None:
+            self.sleep_until(min(self.start + self._next_epoch, self.clock() + (self.timeout or 0)))
+
+    def read(self, size=1):
+        if self.in_waiting < size:
+            self._wait()
+        size = min(size, self.in_waiting)
+        data = bytes(self.output[:size])
+        del self.output[:size]
+        return data
+
+    def readline(self):
+        self._generate()
+        if self.baudrate != self.uart_baud:
+            return b''
+        end = self.output.find(b'\n')
+        if end < 0:
+            self._wait()
+            self._generate()
+            end = self.output.find(b'\n')
+        end = len(self.output) if end < 0 else end + 1
+        return self.read(end)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self._generate()
+        self.output.clear()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#-------------------- DHT22 / GPIO --------------------
+class SimulatedDHT22:
+    """Stand-in for pigpio_dht.DHT22: read() returns the driver's dictionary with a slow diurnal temperature swing"""
+    def __init__(self, gpio, clock=time.monotonic, temp_c=18.0, swing_c=12.0, humidity=35.0):
+        self.gpio = gpio
+        self.clock = clock
+        self.temp_c, self.swing_c, self.humidity = temp_c, swing_c, humidity
+
+    def read(self, retries=5):
+        temp = self.temp_c + self.swing_c * math.sin(2 * math.pi * self.clock() / 86400)
+        return {'temp_c': round(temp, 1), 'temp_f': round(temp * 1.8 + 32, 1), 'humidity': self.humidity,
+                'valid': True}
+
+
+class SimulatedOutputDevice:
+    """Stand-in for gpiozero.PWMOutputDevice / DigitalInputDevice: keeps .value and counts changes"""
+    def __init__(self, pin, *args, **kwargs):
+        self.pin = pin
+        self.value = 0
+        self.changes = 0
+        self.when_activated = None
+
+    def __setattr__(self, name, value):
+        if name == 'value' and 'value' in self.__dict__ and value != self.__dict__['value']:
+            self.__dict__['changes'] += 1
+        super().__setattr__(name, value)
+
+    def close(self):
+        pass
@@ -0,0 +1,627 @@
+"""
+Soak test: runs flight_3.5.py's full task set on simulated hardware for days of virtual time and checks it against
+resource and latency budgets.
+
+Notes:
+1) Virtual time: one clock stands behind the event loop, time.monotonic(), time.time() and time.sleep()
+    - It runs at real speed while anything is working, and jumps straight to the next timer or simulated device
+      event when the loop is idle and every other thread is waiting on it (a 3-day float runs in well under an hour)
+    - Work still costs its real duration, so loop lag is the real time the flight tasks hold the loop
+2) Hardware: sim_hardware stands in for the NEO-6M (serial), SX1278 (LoRaRF), INA219, DHT22 and the GPIO outputs.
+   The termination core runs in a thread on the same clock with dry-run outputs, and the flight time limit is moved
+   past the end of the run. A signed PING is injected over the uplink every --ping minutes
+3) Every --sample minutes of virtual time: RSS, open file descriptors, threads (executor workers, which pools start
+   lazily up to their limit, counted apart), asyncio tasks, process CPU time,
+   loop lag (a 1 s probe timer, histogrammed in constant memory), packets sent and log bytes
+4) Budgets (all exceeded ones are listed; exit status 1):
+    - RSS growth (least-squares slope after the warm-up) and peak RSS
+    - Any growth in file descriptors or threads after the warm-up
+    - Any rise in the task floor from the first to the last quarter (wait_for() holds an extra task while it waits)
+    - CPU as a share of flight time, overall and its drift from the first to the last quarter of the run
+    - Loop lag p99 and maximum; flight script lines reporting an error
+5) The JSON report (--report) holds the build, settings, results, checks and samples; --compare prints the
+   differences against an earlier report, e.g. the last release build
+6) Shares the telemetry socket/ring names with a real flight: don't run it alongside one on the same Pi
+
+Usage:
+    python3 soak_test.py --days 3 --report soak_v3.json
+    python3 soak_test.py --hours 6 --compare soak_v3.json
+"""
+
+
+import argparse
+import asyncio
+import bisect
+import concurrent.futures
+import contextlib
+import heapq
+import importlib.util
+import json
+import os
+import platform
+import re
+import selectors
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+import sim_hardware
+import termination_core
+from uplink import CMD_PING, encode_command
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+FLIGHT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flight_3.5.py')
+LAG_BINS = [0.1 * 1.25 ** n for n in range(48)]     # ms: 0.1 ms to ~4.4 s, 25% wide
+DEFAULT_BUDGETS = {
+    'rss_growth_mb_per_day': 4.0,
+    'rss_peak_mb': 250.0,
+    'fd_growth': 0,
+    'thread_growth': 0,
+    'executor_threads': 16,
+    'task_growth': 0,
+    'cpu_percent': 25.0,
+    'cpu_drift_ratio': 1.5,
+    'lag_p99_ms': 50.0,
+    'lag_max_ms': 500.0,
+    'error_lines': 0,
+}
+
+_real_monotonic = time.monotonic
+_real_time = time.time
+
+
+#-------------------- VIRTUAL TIME --------------------
+class VirtualClock:
+    """
+    - monotonic() = the real monotonic clock plus all the idle time skipped so far; time() moves with it
+    - sleep_until(t) from a worker thread waits for virtual time t; from the loop thread it skips (blocking)
+    - skip_to(t) is the event loop's: nothing is working until t, so jump there and wake the sleepers that are due
+    """
+    def __init__(self):
+        self.skipped = 0.0
+        self.loop = None
+        self.loop_thread = threading.main_thread()
+        self.closed = False
+        self._wall0 = _real_time()
+        self._mono0 = _real_monotonic()
+        self._lock = threading.Lock()
+        self._sleepers = []         # Heap of (target, sequence, thread ident, event)
+        self._sequence = 0
+        self.threads = {}           # ident -> thread, for every thread that has slept on this clock
+
+    def monotonic(self):
+        return _real_monotonic() + self.skipped
+
+    def time(self):
+        return self._wall0 + self.monotonic() - self._mono0
+
+    def sleep(self, seconds):
+        self.sleep_until(self.monotonic() + max(seconds, 0))
+
+    def sleep_until(self, target):
+        if threading.current_thread() is self.loop_thread:
+            self.skip_to(target)        # Blocking sleep on the loop: time passes and the loop lags
+            return
+        with self._lock:
+            if self.closed or self.monotonic() >= target:
+                return
+            event = threading.Event()
+            heapq.heappush(self._sleepers, (target, self._sequence, threading.get_ident(), event))
+            self._sequence += 1
+            self.threads[threading.get_ident()] = threading.current_thread()
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(_nothing)    # The loop may be waiting for this thread to settle
+        event.wait()
+
+    def skip_to(self, target):
+        with self._lock:
+            gap = target - self.monotonic()
+            if gap > 0:
+                self.skipped += gap
+            now = self.monotonic()
+            while self._sleepers and self._sleepers[0][0] <= now:
+                heapq.heappop(self._sleepers)[3].set()
+
+    def next_wake(self):
+        with self._lock:
+            return self._sleepers[0][0] if self._sleepers else None
+
+    def sleeping(self):
+        with self._lock:
+            return {ident for target, sequence, ident, event in self._sleepers}
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            for sleeper in self._sleepers:
+                sleeper[3].set()
+            self._sleepers.clear()
+
+
+def _nothing():
+    pass
+
+
+class WorkTracker:
+    """Counts executor work (every ThreadPoolExecutor in the process) that is queued or running"""
+    def __init__(self):
+        self.queued = 0
+        self.running = set()        # Thread idents inside a submitted function
+        self.workers = set()        # Every executor thread seen; idle ones wait on their queue, not the clock
+        self._lock = threading.Lock()
+        self._submit = None
+
+    def install(self):
+        self._submit = submit = concurrent.futures.ThreadPoolExecutor.submit
+        tracker = self
+
+        def tracked_submit(executor, fn, *args, **kwargs):
+            def run(*args, **kwargs):
+                with tracker._lock:
+                    tracker.queued -= 1
+                    tracker.running.add(threading.get_ident())
+                    tracker.workers.add(threading.get_ident())
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    with tracker._lock:
+                        tracker.running.discard(threading.get_ident())
+            with tracker._lock:
+                tracker.queued += 1
+            return submit(executor, run, *args, **kwargs)
+        concurrent.futures.ThreadPoolExecutor.submit = tracked_submit
+
+    def uninstall(self):
+        if self._submit is not None:
+            concurrent.futures.ThreadPoolExecutor.submit = self._submit
+
+    def busy(self, sleeping):
+        """Work that is really running (not waiting on the virtual clock) or still waiting for a thread"""
+        with self._lock:
+            return self.queued + len(self.running - sleeping)
+
+
+class VirtualSelector:
+    """Selector for the event loop: real I/O readiness, but idle waits become clock jumps"""
+    def __init__(self, clock, work):
+        self.selector = selectors.DefaultSelector()
+        self.clock = clock
+        self.work = work
+        self.jumps = 0
+
+    def select(self, timeout=None):
+        events = self.selector.select(0)
+        if events or timeout == 0:
+            self.clock.skip_to(self.clock.monotonic())
+            return events
+        sleeping = self.clock.sleeping()
+        running_threads = [thread for ident, thread in self.clock.threads.items()
+                           if ident not in sleeping and ident not in self.work.workers and thread.is_alive()]
+        if self.work.busy(sleeping) or running_threads:
+            return self.selector.select(0.01 if timeout is None else min(timeout, 0.01))   # Let them settle
+        candidates = [t for t in (self.clock.next_wake(),
+                                  None if timeout is None else self.clock.monotonic() + timeout) if t is not None]
+        if not candidates:
+            return self.selector.select(timeout)
+        self.clock.skip_to(min(candidates))
+        self.jumps += 1
+        return self.selector.select(0)
+
+    def register(self, fileobj, events, data=None):
+        return self.selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self.selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self.selector.modify(fileobj, events, data)
+
+    def get_key(self, fileobj):
+        return self.selector.get_key(fileobj)
+
+    def get_map(self):
+        return self.selector.get_map()
+
+    def close(self):
+        self.selector.close()
+
+
+#-------------------- SIMULATED HARDWARE --------------------
+class OutputSink:
+    """stdout for the flight script: counts lines and keeps the last error lines (colour codes stripped)"""
+    ANSI = re.compile(r'\033\[[0-9;]*m')
+
+    def __init__(self, keep=20):
+        self.lines = 0
+        self.errors = 0
+        self.last_errors = []
+        self.keep = keep
+        self.clock = None
+
+    def write(self, text):
+        self.lines += text.count('\n')
+        if 'error' in text.lower() or 'Traceback' in text:
+            self.errors += 1
+            stamp = f"{self.clock.monotonic() / 3600:.2f} h " if self.clock else ''
+            self.last_errors = (self.last_errors + [stamp + self.ANSI.sub('', text).strip()])[-self.keep:]
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def hardware_modules(clock, gps_options):
+    """Modules named like the hardware drivers flight_3.5.py imports, built on sim_hardware"""
+    devices = {'gps': [], 'outputs': []}
+
+    def open_serial(port, baudrate=9600, timeout=None, **kwargs):
+        gps = sim_hardware.SimulatedNEO6M(clock=clock.monotonic, **gps_options)
+        gps.timeout = timeout
+        devices['gps'].append(gps)
+        return gps
+
+    def output(pin, *args, **kwargs):
+        device = sim_hardware.SimulatedOutputDevice(pin)
+        devices['outputs'].append(device)
+        return device
+
+    serial = types.ModuleType('serial')
+    serial.Serial = open_serial
+    serial.SerialException = OSError
+    lora = types.ModuleType('LoRaRF')
+    lora.SX127x = sim_hardware.SimulatedSX127x
+    ina219 = types.ModuleType('ina219')
+    ina219.INA219 = lambda *args, **kwargs: sim_hardware.SimulatedINA219(clock=clock.monotonic)
+    ina219.DeviceRangeError = type('DeviceRangeError', (Exception,), {})
+    dht = types.ModuleType('pigpio_dht')
+    dht.DHT22 = lambda gpio, *args, **kwargs: sim_hardware.SimulatedDHT22(gpio, clock.monotonic)
+    gpio = types.ModuleType('gpiozero')
+    gpio.PWMOutputDevice = output
+    gpio.DigitalInputDevice = output
+    gpio.OutputDevice = output
+    return {'serial': serial, 'LoRaRF': lora, 'ina219': ina219, 'pigpio_dht': dht, 'gpiozero': gpio}, devices
+
+
+class CoreThread:
+    """The termination core on a thread (same clock), answering poll() like the Popen it replaces"""
+    def __init__(self, flight):
+        config = dict(termination_core.DEFAULT_CONFIG, fence=flight.fence, flight_time_limit=flight.flight_time_limit,
+                      heat_time=flight.heat_time, primary=flight.primary, servo_open=flight.servo_open,
+                      servo_close=flight.servo_close, relay_on=flight.relay_on, relay_off=flight.relay_off)
+        self.core = termination_core.TerminationCore(flight.core_block, config,
+                                                     *termination_core.open_outputs(config, dry_run=True))
+        self.thread = threading.Thread(target=self.core.run, name='termination_core', daemon=True)
+        self.thread.start()
+        self.returncode = None
+        self.pid = os.getpid()
+
+    def poll(self):
+        if self.returncode is None and not self.thread.is_alive():
+            self.returncode = 0
+        return self.returncode
+
+
+@contextlib.contextmanager
+def patched(target, name, value):
+    original = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield
+    finally:
+        setattr(target, name, original)
+
+
+def load_flight(clock, modules, workdir, key):
+    """Imports flight_3.5.py as module 'flight' with the simulated drivers, a primary login and no pigpiod"""
+    sys.modules.update(modules)
+    with open(os.path.join(workdir, 'uplink.key'), mode='wb') as file:
+        file.write(key)
+    spec = importlib.util.spec_from_file_location('flight', FLIGHT_SCRIPT)
+    flight = importlib.util.module_from_spec(spec)
+    pigpiod = lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout='', stderr='')
+    with patched(os, 'getlogin', lambda: 'soaka'), patched(subprocess, 'run', pigpiod):
+        spec.loader.exec_module(flight)
+    return flight
+
+
+#-------------------- MEASUREMENT --------------------
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3     # Peak, not current, off Linux
+
+
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return -1
+
+
+class LagProbe:
+    """A timer every `period` seconds; how late it fires goes into a fixed histogram (constant memory)"""
+    def __init__(self, period=1.0):
+        self.period = period
+        self.counts = [0] * (len(LAG_BINS) + 1)
+        self.window_max = 0.0
+        self.max = 0.0
+        self.samples = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        due = loop.time() + self.period
+        while True:
+            await asyncio.sleep(max(due - loop.time(), 0))
+            late_ms = max(loop.time() - due, 0) * 1000
+            self.counts[bisect.bisect_left(LAG_BINS, late_ms)] += 1
+            self.window_max = max(self.window_max, late_ms)
+            self.max = max(self.max, late_ms)
+            self.samples += 1
+            due += self.period
+            if due < loop.time():
+                due = loop.time() + self.period
+
+    def percentile(self, fraction):
+        """Upper edge of the histogram bin holding the fraction-th sample (ms)"""
+        rank = fraction * self.samples
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return LAG_BINS[index] if index < len(LAG_BINS) else self.max
+        return 0.0
+
+
+def slope_per_day(points):
+    """Least-squares slope of (hours, value) points, per day"""
+    n = len(points)
+    if n < 3:
+        return 0.0
+    mean_t = sum(t for t, v in points) / n
+    mean_v = sum(v for t, v in points) / n
+    sxx = sum((t - mean_t) ** 2 for t, v in points)
+    return 24 * sum((t - mean_t) * (v - mean_v) for t, v in points) / sxx if sxx else 0.0
+
+
+#-------------------- SOAK --------------------
+class Soak:
+    SAMPLE_FIELDS = ('hours', 'rss_mb', 'fds', 'threads', 'workers', 'tasks', 'cpu_s', 'lag_max_ms', 'packets', 'log_bytes')
+
+    def __init__(self, duration, sample_interval=300, ping_interval=600, warmup=7200, workdir=None, budgets=None):
+        self.duration = duration
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.sample_interval = sample_interval
+        self.ping_interval = ping_interval
+        self.warmup = warmup
+        self.workdir = workdir or tempfile.mkdtemp(prefix='saber_soak_')
+        self.clock = VirtualClock()
+        self.work = WorkTracker()
+        self.sink = OutputSink()
+        self.sink.clock = self.clock
+        self.probe = LagProbe()
+        self.samples = []
+        self.packets = 0
+        self.pings = 0
+        self.flight = None
+        self.devices = None
+        self.start_cpu = 0.0
+        self.start_mono = 0.0
+
+    def run(self):
+        clock = self.clock
+        key = os.urandom(16).hex().encode()
+        modules, self.devices = hardware_modules(clock, {'descent_rate': 0.0, 'drift': (0.0, 0.0)})  # Float in the fence
+        self.work.install()
+        os.makedirs(self.workdir, exist_ok=True)
+        os.chdir(self.workdir)
+        wall = _real_monotonic()
+        with patched(time, 'monotonic', clock.monotonic), patched(time, 'time', clock.time), \
+                patched(time, 'sleep', clock.sleep), contextlib.redirect_stdout(self.sink):
+            self.flight = flight = load_flight(clock, modules, self.workdir, key)
+            flight.flight_time_limit = self.duration + 86400    # A soak, not a cutdown test
+            flight.core_block.write_status(**flight.core_block.default_status())     # Not one an interrupted soak left
+            flight.core_block.write_telemetry(**flight.core_block.default_telemetry())
+            flight.start_termination_core = lambda: CoreThread(flight)
+            if flight.status_server is not None:
+                flight.status_server.port = 0                   # Any free port; a real flight may hold 8080
+            for gps in self.devices['gps']:
+                gps.sleep_until = clock.sleep_until             # Reads wait for the next epoch like pyserial
+            loop = asyncio.SelectorEventLoop(VirtualSelector(clock, self.work))
+            clock.loop = loop
+            try:
+                loop.run_until_complete(self._soak(key))
+            finally:
+                self._shutdown(loop)
+        self.work.uninstall()
+        return self.report(_real_monotonic() - wall)
+
+    async def _soak(self, key):
+        flight = self.flight
+        self.start_mono = self.clock.monotonic()
+        self.start_cpu = time.process_time()
+        flight_task = asyncio.create_task(flight.main())
+        helpers = [asyncio.create_task(self.probe.run()), asyncio.create_task(self._sampler())]
+        if flight.uplink is not None and self.ping_interval:
+            helpers.append(asyncio.create_task(self._pinger(key)))
+        await asyncio.sleep(self.duration)
+        if flight_task.done():
+            flight_task.result()        # Surfaces a crash of the flight script
+        self._sample()
+        for task in helpers:
+            task.cancel()
+
+    async def _sampler(self):
+        while True:
+            await asyncio.sleep(self.sample_interval)
+            self._sample()
+
+    async def _pinger(self, key):
+        sequence = int(self.clock.time())
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            sequence += 1
+            self.flight.LoRa.inject(encode_command(self.flight.balloon_id, key, sequence, CMD_PING))
+            self.pings += 1
+
+    def _sample(self):
+        sent = self.flight.LoRa.sent
+        self.packets += len(sent)
+        sent.clear()            # Handed to the "ground"; the simulator would otherwise hold every packet
+        workers = sum(1 for thread in threading.enumerate() if thread.ident in self.work.workers)
+        log_bytes = sum(entry.stat().st_size for entry in os.scandir(self.workdir) if entry.is_file())
+        self.samples.append(((self.clock.monotonic() - self.start_mono) / 3600, rss_mb(), open_fds(),
+                             threading.active_count() - workers, workers, len(asyncio.all_tasks()), time.process_time() - self.start_cpu,
+                             self.probe.window_max, self.packets, log_bytes))
+        self.probe.window_max = 0.0
+
+    def _shutdown(self, loop):
+        flight = self.flight
+        flight.core_block.write_telemetry(stop=1)
+        if flight.energy is not None:
+            flight.energy.stop()
+        self.clock.close()      # Releases every thread still sleeping on virtual time
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        if flight.log_writer is not None:
+            flight.log_writer.close()
+        if flight.publisher is not None:
+            flight.publisher.close()
+        flight.core_block.close(unlink=True)
+        loop.close()
+
+    # ---------- Report ----------
+    def report(self, wall_seconds):
+        rows = [dict(zip(self.SAMPLE_FIELDS, sample)) for sample in self.samples]
+        warm = [row for row in rows if row['hours'] * 3600 >= self.warmup] or rows
+        settled = warm[0]
+        last = rows[-1]
+
+        def cpu_percent(first, second):
+            hours = second['hours'] - first['hours']
+            return 100 * (second['cpu_s'] - first['cpu_s']) / (hours * 3600) if hours > 0 else 0.0
+
+        windows = [cpu_percent(first, second) for first, second in zip(warm, warm[1:])] or [0.0]
+        quarter = max(len(windows) // 4, 1)
+        floor = lambda rows, field: min(row[field] for row in rows)
+        early = statistics.median(windows[:quarter])        # Medians: one busy window is not a trend
+        late = statistics.median(windows[-quarter:])
+        results = {
+            'rss_start_mb': round(rows[0]['rss_mb'], 1),
+            'rss_peak_mb': round(max(row['rss_mb'] for row in rows), 1),
+            'rss_growth_mb_per_day': round(slope_per_day([(row['hours'], row['rss_mb']) for row in warm]), 2),
+            'fd_growth': max(row['fds'] for row in warm) - settled['fds'],
+            'thread_growth': max(row['threads'] for row in warm) - settled['threads'],
+            'executor_threads': max(row['workers'] for row in rows),
+            'task_growth': floor(warm[-quarter:], 'tasks') - floor(warm[:quarter], 'tasks'),   # Waits come and go
+            'cpu_percent': round(cpu_percent(rows[0], last), 2),
+            'cpu_drift_ratio': round(late / early, 2) if early > 0 else 1.0,
+            'lag_p50_ms': round(self.probe.percentile(0.5), 2),
+            'lag_p99_ms': round(self.probe.percentile(0.99), 2),
+            'lag_max_ms': round(self.probe.max, 2),
+            'error_lines': self.sink.errors,
+            'packets_sent': self.packets,
+            'pings_sent': self.pings,
+            'uplink_accepted': self.flight.uplink.stats['accepted'] if self.flight.uplink is not None else 0,
+            'log_mb_per_day': round(24 * last['log_bytes'] / 1e6 / max(last['hours'], 1e-9), 2),
+            'output_lines': self.sink.lines,
+        }
+        checks = []
+        for name, budget in self.budgets.items():
+            checks.append({'name': name, 'value': results[name], 'budget': budget, 'ok': results[name] <= budget})
+        return {
+            'build': build_id(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.clock._wall0)),
+            'virtual_hours': round(last['hours'], 2),
+            'wall_seconds': round(wall_seconds, 1),
+            'speedup': round(last['hours'] * 3600 / wall_seconds, 1) if wall_seconds else None,
+            'settings': {'sample_interval': self.sample_interval, 'ping_interval': self.ping_interval,
+                         'warmup': self.warmup, 'workdir': self.workdir},
+            'results': results,
+            'checks': checks,
+            'passed': all(check['ok'] for check in checks),
+            'last_errors': self.sink.last_errors,
+            'samples': rows,
+        }
+
+
+def build_id():
+    """'abc1234' (+ '-dirty') from git, or 'unknown'"""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(FLIGHT_SCRIPT),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+#-------------------- MAIN FUNCTION --------------------
+def print_report(report, baseline=None):
+    print(f"{CYAN}{'Soak test':<25}{RESET}build {report['build']}, {report['virtual_hours']} h virtual in "
+          f"{report['wall_seconds']} s ({report['speedup']}x)")
+    for check in report['checks']:
+        colour = GREEN if check['ok'] else RED
+        line = f"{colour}{check['name'] + ':':<25}{RESET}{check['value']:<12}budget {check['budget']}"
+        if baseline is not None and check['name'] in baseline['results']:
+            before = baseline['results'][check['name']]
+            line += f"{'':<6}was {before} ({check['value'] - before:+.2f})"
+        print(line)
+    for name in ('lag_p50_ms', 'packets_sent', 'pings_sent', 'uplink_accepted', 'log_mb_per_day'):
+        print(f"{MAGENTA}{name + ':':<25}{RESET}{report['results'][name]}")
+    for line in report['last_errors']:
+        print(f"{ORANGE}{'Flight error:':<25}{RESET}{line}")
+    print(f"{GREEN if report['passed'] else RED}{'Result:':<25}{RESET}{'PASS' if report['passed'] else 'FAIL'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak flight_3.5.py on simulated hardware in virtual time")
+    parser.add_argument('--days', type=float, default=0, help="virtual days to run")
+    parser.add_argument('--hours', type=float, default=0, help="virtual hours to run (added to --days)")
+    parser.add_argument('--sample', type=float, default=5, help="minutes of virtual time between samples")
+    parser.add_argument('--ping', type=float, default=10, help="minutes between uplink PINGs (0 = none)")
+    parser.add_argument('--warmup', type=float, default=120,
+                        help="minutes excluded from the growth budgets (default covers the ascent to float)")
+    parser.add_argument('--budget', action='append', default=[], metavar='NAME=VALUE',
+                        help=f"override a budget ({', '.join(DEFAULT_BUDGETS)})")
+    parser.add_argument('--report', help="write the JSON report here")
+    parser.add_argument('--compare', help="earlier JSON report to compare against")
+    parser.add_argument('--workdir', help="directory for the flight logs (default: a new temporary directory)")
+    args = parser.parse_args()
+
+    duration = args.days * 86400 + args.hours * 3600 or 86400
+    budgets = {}
+    for item in args.budget:
+        name, _, value = item.partition('=')
+        if name not in DEFAULT_BUDGETS:
+            parser.error(f"unknown budget {name}")
+        budgets[name] = float(value)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    report_file = os.path.abspath(args.report) if args.report else None     # The soak runs in its work directory
+    soak = Soak(duration, args.sample * 60, args.ping * 60, args.warmup * 60,
+                os.path.abspath(args.workdir) if args.workdir else None, budgets)
+    report = soak.run()
+    print_report(report, baseline)
+    if report_file:
+        with open(report_file, mode='w') as file:
+            json.dump(report, file, indent=1)
+        print(f"{MAGENTA}{'Report:':<25}{RESET}{report_file}")
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Offline solar ephemeris (NOAA solar calculator equations) for dusk-to-dawn strobe control.
+
+Notes:
+1) sun_times() gives sunrise and sunset (UTC) for a date and position, accurate to about a minute
+    - The horizon is lowered for the dip seen from altitude: at 20 km the sun sets ~30 minutes later than on the ground
+    - Results are cached per date, 0.1 degree of latitude/longitude and 500 m of altitude, so the flight loop can
+      ask every tick without recomputing
+2) solar_elevation() gives the sun's elevation (degrees) at an instant, cached to the minute
+3) is_daylight() decides from the cached sunrise/sunset of the solar day at that longitude
+4) Polar day/night: sun_times() returns (None, None); is_daylight() is True all polar day and False all polar night
+"""
+
+
+import math
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+
+EARTH_RADIUS_M = 6371000.0
+SUNRISE_ZENITH = 90.833         # Degrees: refraction (34') plus the sun's semi-diameter (16')
+
+
+#-------------------- EPHEMERIS --------------------
+def julian_day(utc):
+    return utc.timestamp() / 86400 + 2440587.5
+
+
+def _sun(jd):
+    """Solar declination (degrees) and equation of time (minutes) for a Julian day"""
+    t = (jd - 2451545.0) / 36525
+    l0 = (280.46646 + t * (36000.76983 + t * 0.0003032)) % 360
+    m = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    m_rad = math.radians(m)
+    center = (math.sin(m_rad) * (1.914602 - t * (0.004817 + 0.000014 * t)) +
+              math.sin(2 * m_rad) * (0.019993 - 0.000101 * t) + math.sin(3 * m_rad) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * t)
+    apparent_long = math.radians(l0 + center - 0.00569 - 0.00478 * math.sin(omega))
+    mean_obliquity = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    obliquity = math.radians(mean_obliquity + 0.00256 * math.cos(omega))
+    declination = math.asin(math.sin(obliquity) * math.sin(apparent_long))
+    y = math.tan(obliquity / 2) ** 2
+    l0_rad = math.radians(l0)
+    eq_time = 4 * math.degrees(y * math.sin(2 * l0_rad) - 2 * e * math.sin(m_rad) +
+                               4 * e * y * math.sin(m_rad) * math.cos(2 * l0_rad) -
+                               0.5 * y * y * math.sin(4 * l0_rad) - 1.25 * e * e * math.sin(2 * m_rad))
+    return math.degrees(declination), eq_time
+
+
+def horizon_dip(altitude_m):
+    """Degrees the visible horizon lies below horizontal at altitude_m"""
+    if altitude_m <= 0:
+        return 0.0
+    return math.degrees(math.acos(EARTH_RADIUS_M / (EARTH_RADIUS_M + altitude_m)))
+
+
+@lru_cache(maxsize=64)
+def _sun_times(day, lat, lon, altitude_m):
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    noon_guess = midnight + timedelta(hours=12 - lon / 15)
+    declination, eq_time = _sun(julian_day(noon_guess))
+    noon = midnight + timedelta(minutes=720 - 4 * lon - eq_time)
+    zenith = math.radians(SUNRISE_ZENITH + horizon_dip(altitude_m))
+    lat_rad, dec_rad = math.radians(lat), math.radians(declination)
+    cos_hour_angle = (math.cos(zenith) / (math.cos(lat_rad) * math.cos(dec_rad)) -
+                      math.tan(lat_rad) * math.tan(dec_rad))
+    if not -1 <= cos_hour_angle <= 1:
+        return None, None, cos_hour_angle < -1      # Polar day (sun never sets) or polar night
+    half_day = timedelta(minutes=4 * math.degrees(math.acos(cos_hour_angle)))
+    return noon - half_day, noon + half_day, None
+
+
+def sun_times(day, lat, lon, altitude_m=0):
+    """(sunrise, sunset) as UTC datetimes for the solar day `day` at the position; (None, None) in polar day/night"""
+    sunrise, sunset, polar_day = _sun_times(day, round(lat, 1), round(lon, 1), round(altitude_m / 500) * 500)
+    return sunrise, sunset
+
+
+def solar_day(utc, lon):
+    """The date at the position's mean solar time, so sunrise/sunset bracket the right day west or east of Greenwich"""
+    return (utc + timedelta(hours=lon / 15)).date()
+
+
+@lru_cache(maxsize=16)
+def _elevation(minute, lat, lon):
+    utc = datetime.fromtimestamp(minute * 60, timezone.utc)
+    declination, eq_time = _sun(julian_day(utc))
+    true_solar_minutes = (utc.hour * 60 + utc.minute + eq_time + 4 * lon) % 1440
+    hour_angle = math.radians(true_solar_minutes / 4 - 180)
+    lat_rad, dec_rad = math.radians(lat), math.radians(declination)
+    cos_zenith = (math.sin(lat_rad) * math.sin(dec_rad) +
+                  math.cos(lat_rad) * math.cos(dec_rad) * math.cos(hour_angle))
+    return 90 - math.degrees(math.acos(max(-1.0, min(1.0, cos_zenith))))
+
+
+def solar_elevation(utc, lat, lon):
+    """Geometric elevation of the sun's centre (degrees, no refraction), to the minute"""
+    return _elevation(int(utc.timestamp() // 60), round(lat, 1), round(lon, 1))
+
+
+def is_daylight(utc, lat, lon, altitude_m=0):
+    """True between sunrise and sunset as seen from altitude_m"""
+    day = solar_day(utc, lon)
+    sunrise, sunset, polar_day = _sun_times(day, round(lat, 1), round(lon, 1), round(altitude_m / 500) * 500)
+    if sunrise is None:
+        return polar_day
+    return sunrise <= utc < sunset
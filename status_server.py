@@ -0,0 +1,193 @@
+"""
+Small asyncio HTTP status server inside the flight process, for checking the balloon computer from a phone over Wi-Fi.
+
+Notes:
+1) Endpoints (GET or HEAD):
+    - /status       JSON snapshot of the flight state
+    - /metrics      Prometheus text format: every numeric/boolean field of the snapshot plus the server's own counters
+    - /log/tail     The last log rows as CSV text (?lines=N, up to log_lines)
+2) The flight loop hands over state with update(snapshot) and log rows with log(row); nothing else is shared
+    - An unchanged snapshot is ignored; a changed one only bumps a version number
+    - A body is serialized at most once per version, on the first request that needs it, and served from cache after
+      that, so any number of clients polling costs the flight loop nothing beyond the occasional json.dumps
+    - ETag is a per-start token plus the version: a client sending If-None-Match gets a bodiless 304 until the state
+      changes, and never one from a restarted flight script whose version count started over
+3) Handlers only read the cached snapshot; they never touch sensors, the GPS or the radio
+4) Slow or stuck clients are cut off after client_timeout; beyond max_clients, new connections get 503 at once
+
+Usage:
+    curl http://<pi address>:8080/status
+    curl http://<pi address>:8080/log/tail?lines=5
+"""
+
+
+import asyncio
+import collections
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+
+ENDPOINTS = ('/status', '/metrics', '/log/tail')
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           503: 'Service Unavailable'}
+MAX_HEADERS = 32
+
+
+class StatusServer:
+    """
+    - await start() on the flight loop; update(snapshot) / log(row) from the tasks that own the data
+    - summary() for the display: '1 client, 240 requests (212 cached, 28 not modified)'
+    """
+    def __init__(self, host='0.0.0.0', port=8080, log_lines=50, max_clients=8, client_timeout=5.0, prefix='saber'):
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.client_timeout = client_timeout
+        self.prefix = prefix
+        self.snapshot = {}
+        self.version = 0
+        self.rows = collections.deque(maxlen=log_lines)
+        self.log_version = 0
+        self.cache = {}         # path -> (version, body bytes)
+        self.clients = 0
+        self.started = time.monotonic()
+        self.boot = os.urandom(4).hex()     # Versions restart at 0 each run; the Pi's clock may not be set yet
+        self.stats = {'requests': 0, 'cached': 0, 'not_modified': 0, 'serialized': 0, 'rejected': 0, 'errors': 0}
+        self.server = None
+
+    # ---------- Flight loop side ----------
+    def update(self, snapshot):
+        """New state; only a real change invalidates the cached bodies"""
+        if snapshot != self.snapshot:
+            self.snapshot = dict(snapshot)
+            self.version += 1
+
+    def log(self, row):
+        self.rows.append(','.join('' if value is None else str(value) for value in row))
+        self.log_version += 1
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def summary(self):
+        stats = self.stats
+        return (f"{self.clients} client{'' if self.clients == 1 else 's'}, {stats['requests']} requests "
+                f"({stats['cached']} cached, {stats['not_modified']} not modified)")
+
+    # ---------- Bodies ----------
+    def _cached(self, key, version, build):
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == version:
+            self.stats['cached'] += 1
+            return entry[1]
+        body = build()
+        self.cache[key] = (version, body)
+        self.stats['serialized'] += 1
+        return body
+
+    def _status(self):
+        return json.dumps(self.snapshot, separators=(',', ':'), default=str).encode()
+
+    def _metrics_snapshot(self):
+        lines = []
+        for name, value in self.snapshot.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"{self.prefix}_{name} {value}")
+        return ('\n'.join(lines) + '\n').encode()
+
+    def _metrics(self):
+        """Snapshot gauges (cached per version) plus live server counters (a few lines, formatted per request)"""
+        gauges = self._cached('metrics', self.version, self._metrics_snapshot)
+        counters = [f"{self.prefix}_status_{name}_total {count}" for name, count in self.stats.items()]
+        counters += [f"{self.prefix}_status_clients {self.clients}",
+                     f"{self.prefix}_status_uptime_seconds {time.monotonic() - self.started:.0f}"]
+        return gauges + ('\n'.join(counters) + '\n').encode()
+
+    def _tail(self, lines):
+        rows = list(self.rows)[-lines:] if lines else []
+        return ('\n'.join(rows) + '\n').encode() if rows else b''
+
+    # ---------- HTTP ----------
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        headers = {}
+        for _ in range(MAX_HEADERS):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return request_line.decode('latin-1').split(), headers
+
+    def _route(self, method, target, headers):
+        """(status, content type, body, etag)"""
+        if method not in ('GET', 'HEAD'):
+            return 405, 'text/plain', b'GET or HEAD only\n', None
+        url = urlsplit(target)
+        if url.path == '/status':
+            etag = f'"{self.boot}-{self.version}"'
+            if headers.get('if-none-match') == etag:
+                return 304, 'application/json', b'', etag
+            return 200, 'application/json', self._cached('status', self.version, self._status), etag
+        if url.path == '/metrics':
+            return 200, 'text/plain; version=0.0.4', self._metrics(), None
+        if url.path == '/log/tail':
+            try:
+                lines = int(parse_qs(url.query).get('lines', [self.rows.maxlen])[0])
+            except ValueError:
+                return 400, 'text/plain', b'lines must be an integer\n', None
+            lines = max(0, min(lines, self.rows.maxlen))
+            etag = f'"{self.boot}-{self.log_version}-{lines}"'
+            if headers.get('if-none-match') == etag:
+                return 304, 'text/csv', b'', etag
+            body = self._cached(f'tail {lines}', self.log_version, lambda: self._tail(lines))
+            return 200, 'text/csv', body, etag
+        if url.path == '/':
+            return 200, 'application/json', json.dumps({'endpoints': ENDPOINTS}).encode(), None
+        return 404, 'text/plain', b'not found\n', None
+
+    async def _handle(self, reader, writer):
+        if self.clients >= self.max_clients:
+            self.stats['rejected'] += 1
+            writer.write(self._response(503, 'text/plain', b'busy\n'))
+            writer.close()
+            return
+        self.clients += 1
+        try:
+            request, headers = await asyncio.wait_for(self._read_request(reader), self.client_timeout)
+            if len(request) != 3:
+                writer.write(self._response(400, 'text/plain', b'bad request\n'))
+            else:
+                self.stats['requests'] += 1
+                status, content_type, body, etag = self._route(request[0], request[1], headers)
+                if status == 304:
+                    self.stats['not_modified'] += 1
+                writer.write(self._response(status, content_type, body, etag, head_only=request[0] == 'HEAD'))
+            await asyncio.wait_for(writer.drain(), self.client_timeout)
+        except (asyncio.TimeoutError, ConnectionError, UnicodeDecodeError):
+            self.stats['errors'] += 1
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    @staticmethod
+    def _response(status, content_type, body, etag=None, head_only=False):
+        headers = [f"HTTP/1.1 {status} {REASONS[status]}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(body)}",
+                   "Cache-Control: no-cache",
+                   "Access-Control-Allow-Origin: *",
+                   "Connection: close"]
+        if etag:
+            headers.append(f"ETag: {etag}")
+        head = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+        return head if head_only else head + body
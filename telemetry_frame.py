@@ -0,0 +1,233 @@
+"""
+Compact binary telemetry downlink frame (keyframes + deltas) for the SABER balloons.
+
+Notes:
+1) A keyframe carries every field as fixed-point integers in one struct (35 bytes vs ~90 for the ASCII object report)
+2) A delta frame carries only the fields that changed since its reference frame, as zigzag varints
+    - The reference is the last keyframe, or the newest frame the ground has acknowledged (acknowledge()) once
+      there is an uplink to say so
+    - The reference's tx_counter is in the delta, so the ground station knows which state to add it to
+3) The trailing tx_counter byte is still appended by transmit_report() for sequencing and dedupe
+4) Everything is quantised before it is delta encoded, so the decoder rebuilds exactly what the encoder holds
+
+Frame layout (little-endian):
+    keyframe:  0xA0 | id (3s) | time lat lon alt vrate track speed flight volts temp battery endurance state
+    delta:     0xA1 | id (3s) | reference tx_counter (B) | changed-field mask (H) | one varint per changed field
+"""
+
+
+import struct
+import time
+
+from aprs_codec import aprs_timestamp, flight_comment, object_report
+
+
+FRAME_KEY = 0xA0
+FRAME_DELTA = 0xA1
+FRAME_TYPES = (FRAME_KEY, FRAME_DELTA)
+
+# (name, struct format, scale): value on air = round(value * scale)
+FIELDS = (
+    ('time', 'I', 1),           # Seconds since 00:00 UTC on day 0 of the month (day * 86400 + seconds of day)
+    ('lat', 'i', 100000),       # Degrees, ~1 m
+    ('lon', 'i', 100000),
+    ('alt', 'H', 1),            # Meters MSL
+    ('vrate', 'h', 100),        # Vertical rate, m/s
+    ('track', 'H', 1),          # Degrees
+    ('speed', 'B', 1),          # Knots
+    ('flight', 'I', 1),         # Seconds since launch
+    ('volts', 'H', 1000),       # Bus voltage
+    ('temp', 'h', 10),          # Internal temperature, deg C
+    ('battery', 'B', 1),        # State of charge, %
+    ('endurance', 'H', 10),     # Hours of battery left (NONE_U16 = unknown)
+    ('state', 'B', 1),          # STATE_* bits + trigger code
+)
+FIELD_NAMES = tuple(name for name, fmt, scale in FIELDS)
+HEADER = struct.Struct('<B3s')
+KEYFRAME = struct.Struct('<B3s' + ''.join(fmt for name, fmt, scale in FIELDS))
+DELTA_HEADER = struct.Struct('<B3sBH')
+NONE_U16 = 0xFFFF
+
+STATE_AIRBORNE = 0x01
+STATE_CONTAINED = 0x02
+STATE_INTACT = 0x04
+STATE_TERMINATE = 0x08
+STATE_GPS_VALID = 0x10
+TRIGGERS = ('', 'Timing', 'Geofencing', 'Manual', 'Other')     # Trigger code in the top 3 bits of state
+TRIGGER_SHIFT = 5
+
+_LIMITS = {'I': (0, 0xFFFFFFFF), 'i': (-0x80000000, 0x7FFFFFFF), 'H': (0, 0xFFFF),
+           'h': (-0x8000, 0x7FFF), 'B': (0, 0xFF)}
+
+
+#-------------------- FIELD PACKING --------------------
+def pack_state(airborne, contained, intact, terminate, gps_valid, trigger=''):
+    trigger = trigger or ''
+    code = TRIGGERS.index(trigger) if trigger in TRIGGERS else TRIGGERS.index('Other')
+    return ((STATE_AIRBORNE if airborne else 0) | (STATE_CONTAINED if contained else 0) |
+            (STATE_INTACT if intact else 0) | (STATE_TERMINATE if terminate else 0) |
+            (STATE_GPS_VALID if gps_valid else 0) | code << TRIGGER_SHIFT)
+
+
+def quantize(values):
+    """Dictionary of field values (engineering units) -> tuple of on-air integers, clamped to each field's range"""
+    quantized = []
+    for name, fmt, scale in FIELDS:
+        value = values.get(name)
+        low, high = _LIMITS[fmt]
+        if value is None:
+            quantized.append(NONE_U16 if name == 'endurance' else 0)
+            continue
+        quantized.append(max(low, min(high - (name == 'endurance'), int(round(value * scale)))))
+    return tuple(quantized)
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def write_varint(value, out):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+#-------------------- ENCODER (balloon) --------------------
+class FrameEncoder:
+    """
+    - encode(values, tx_counter) returns the frame bytes to send ahead of the tx_counter byte
+    - A keyframe goes out every keyframe_interval frames, and whenever there is no usable reference
+    """
+    def __init__(self, balloon_id, keyframe_interval=10):
+        self.balloon_id = balloon_id.encode('ascii')[:3].ljust(3)
+        self.keyframe_interval = keyframe_interval
+        self.reference = None       # (tx_counter, quantized state) that deltas are taken against
+        self.history = {}           # tx_counter -> quantized state sent with it (for acknowledge())
+        self.since_keyframe = 0
+
+    def encode(self, values, tx_counter):
+        state = quantize(values)
+        if self.reference is None or self.since_keyframe + 1 >= self.keyframe_interval:
+            frame = KEYFRAME.pack(FRAME_KEY, self.balloon_id, *state)
+            self.reference = (tx_counter, state)
+            self.since_keyframe = 0
+        else:
+            frame = self.delta(state)
+            self.since_keyframe += 1
+        self.history[tx_counter] = state
+        return frame
+
+    def delta(self, state):
+        ref_counter, ref_state = self.reference
+        mask = 0
+        out = bytearray()
+        for index, (value, ref) in enumerate(zip(state, ref_state)):
+            if value != ref:
+                mask |= 1 << index
+                write_varint(zigzag(value - ref), out)
+        return DELTA_HEADER.pack(FRAME_DELTA, self.balloon_id, ref_counter, mask) + bytes(out)
+
+    def acknowledge(self, tx_counter):
+        """The ground confirmed it decoded frame tx_counter: take later deltas against it (smaller, still decodable)"""
+        state = self.history.get(tx_counter)
+        if state is not None:
+            self.reference = (tx_counter, state)
+
+
+#-------------------- DECODER (ground station) --------------------
+class FrameDecoder:
+    """
+    - Keeps the decoded state of every frame per balloon so deltas can be rebuilt against whichever frame they reference
+    - decode(frame, tx_counter, rx_time) returns a telemetry dictionary in the ground_station.parse_object_report
+      layout (plus vertical_rate, voltage, temp_c, state flags), or None for a delta whose reference was never heard
+    - max_age: a reference received longer ago than this (s) is treated as never heard; once the 8-bit tx_counter
+      wraps, a delta whose real reference was missed would otherwise rebuild against a frame 256 packets older.
+      An hour covers the longest keyframe spacing (10 frames at a 5 min cadence) and is shorter than a wrap at the
+      default cadence
+    """
+    def __init__(self, max_age=3600):
+        self.states = {}        # (balloon id, tx_counter) -> (quantized state, rx_time)
+        self.max_age = max_age
+        self.unreferenced = 0
+
+    def decode(self, frame, tx_counter, rx_time=None):
+        now = time.time() if rx_time is None else rx_time
+        frame_type, balloon_id = HEADER.unpack_from(frame)
+        if frame_type == FRAME_KEY:
+            state = KEYFRAME.unpack_from(frame)[2:]
+        elif frame_type == FRAME_DELTA:
+            (_, _, ref_counter, mask) = DELTA_HEADER.unpack_from(frame)
+            (reference, heard) = self.states.get((balloon_id, ref_counter), (None, None))
+            if reference is None or now - heard > self.max_age:
+                self.states.pop((balloon_id, ref_counter), None)
+                self.unreferenced += 1
+                return None
+            state = list(reference)
+            offset = DELTA_HEADER.size
+            for index in range(len(FIELDS)):
+                if mask >> index & 1:
+                    delta, offset = read_varint(frame, offset)
+                    state[index] += unzigzag(delta)
+            state = tuple(state)
+        else:
+            raise ValueError(f"not a telemetry frame (type 0x{frame_type:02x})")
+        if tx_counter is not None:
+            self.states[(balloon_id, tx_counter)] = (state, now)    # tx_counter wraps at 256, so this stays bounded
+        return telemetry(balloon_id.decode('ascii', 'replace').strip(), state)
+
+
+def telemetry(balloon_id, state):
+    values = {name: value / scale for (name, fmt, scale), value in zip(FIELDS, state)}
+    bits = state[FIELD_NAMES.index('state')]
+    trigger_code = bits >> TRIGGER_SHIFT
+    day, seconds = divmod(int(values['time']), 86400)
+    return {
+        'object': f"SABER_{balloon_id}",
+        'live': True,
+        'day': day,
+        'time': f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}",
+        'lat': values['lat'],
+        'lon': values['lon'],
+        'symbol': '/O',
+        'track': int(values['track']),
+        'speed_kts': int(values['speed']),
+        'alt_m': values['alt'],
+        'flight_min': round(values['flight'] / 60, 1),
+        'intact': bool(bits & STATE_INTACT),
+        'trigger': TRIGGERS[trigger_code] if trigger_code < len(TRIGGERS) else 'Other',
+        'battery_pct': int(values['battery']),
+        'endurance_h': None if state[FIELD_NAMES.index('endurance')] == NONE_U16 else values['endurance'],
+        'comment': '',
+        'vertical_rate': values['vrate'],
+        'voltage': values['volts'],
+        'temp_c': values['temp'],
+        'airborne': bool(bits & STATE_AIRBORNE),
+        'contained': bool(bits & STATE_CONTAINED),
+        'terminate': bool(bits & STATE_TERMINATE),
+        'gps_valid': bool(bits & STATE_GPS_VALID),
+    }
+
+
+def to_object_report(telemetry):
+    """Rebuilds the ASCII object report format_report() would have sent, so decoded frames can still be gated to APRS-IS"""
+    comment = flight_comment(telemetry['alt_m'], telemetry['flight_min'] * 60, telemetry['intact'], telemetry['trigger'])
+    if telemetry['battery_pct']:
+        comment += f"B{telemetry['battery_pct']}%{'' if telemetry['endurance_h'] is None else telemetry['endurance_h']}h"
+    return object_report(telemetry['object'], aprs_timestamp(telemetry['day'], telemetry['time']), telemetry['lat'],
+                         telemetry['lon'], telemetry['track'], telemetry['speed_kts'], comment, telemetry['live'])
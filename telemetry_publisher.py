@@ -0,0 +1,296 @@
+"""
+Local IPC telemetry publisher: live flight state for other processes on the Pi (second logger, camera, test bench).
+
+Notes:
+1) Each snapshot is packed once into a fixed 88-byte binary record (RECORD) and handed out two ways:
+    - Unix datagram socket: subscribers send b'SUB' to the publisher's socket and get every record as a datagram
+    - Shared-memory ring: readers map the ring and read records in place, without any call into the flight script
+2) Nothing a subscriber does can slow the flight loop:
+    - Datagrams go out with MSG_DONTWAIT; a subscriber whose queue is full misses that record (counted as dropped)
+    - A subscriber that has gone away, or has not re-sent b'SUB' within subscriber_timeout, is forgotten
+    - The ring writer never looks at its readers; a reader that falls more than a ring behind skips ahead and
+      counts what it missed
+3) Each ring slot has its own sequence number, so a reader can tell a torn or overwritten slot from a good one
+
+Usage:
+    python3 telemetry_publisher.py                      Print live records from the flight script's socket
+    python3 telemetry_publisher.py --ring saber_telemetry
+"""
+
+
+import argparse
+import os
+import socket
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+DEFAULT_SOCKET = '/tmp/saber_telemetry.sock'
+DEFAULT_RING = 'saber_telemetry'
+SUBSCRIBE = b'SUB'
+UNSUBSCRIBE = b'UNSUB'
+VERSION = 1
+
+# Little-endian; the record header (magic, version, sequence) is part of every datagram and ring slot
+RECORD = struct.Struct('<2sHI dd dd fff fffff fI BBH 4x')
+RECORD_FIELDS = ('magic', 'version', 'sequence',
+                 'monotonic', 'utc',                            # time.monotonic() and GPS-disciplined Unix time
+                 'lat', 'lon',
+                 'alt', 'track', 'speed',                       # m, degrees, knots
+                 'voltage', 'current', 'power', 'temp', 'humid',  # V, mA, mW, deg C, %
+                 'charge', 'flight_time',                       # %, s
+                 'state', 'sats', 'tx_counter')                 # telemetry_frame.pack_state() bits
+RECORD_MAGIC = b'ST'
+
+RING_HEADER = struct.Struct('<4sHHIQ')      # magic, version, record size, slots, records written
+RING_MAGIC = b'SBTR'
+SLOT_SEQ = struct.Struct('<Q')
+
+
+def pack_record(sequence, values):
+    return RECORD.pack(RECORD_MAGIC, VERSION, sequence & 0xFFFFFFFF,
+                       *(values.get(name, 0) for name in RECORD_FIELDS[3:]))
+
+
+def unpack_record(data):
+    record = dict(zip(RECORD_FIELDS, RECORD.unpack_from(data)))
+    if record['magic'] != RECORD_MAGIC or record['version'] != VERSION:
+        raise ValueError("not a telemetry record")
+    return record
+
+
+_published = set()     # Rings created by this process; the resource tracker's entry belongs to their publisher
+
+
+def _attach(name):
+    if name in _published:
+        return shared_memory.SharedMemory(name)     # Same process: registering again is a no-op, unregistering is not
+    try:
+        return shared_memory.SharedMemory(name, track=False)       # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')     # Otherwise the reader unlinks it on exit
+        return shm
+
+
+#-------------------- PUBLISHER (flight script) --------------------
+class TelemetryPublisher:
+    """
+    - publish(values) packs one record and sends it to every subscriber and into the ring; never blocks
+    - values: dictionary with any of RECORD_FIELDS[3:] (missing fields are sent as 0)
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET, ring_name=DEFAULT_RING, ring_slots=256, subscriber_timeout=30):
+        self.socket_path = socket_path
+        self.subscriber_timeout = subscriber_timeout
+        self.subscribers = {}       # address -> monotonic time of its last b'SUB'
+        self.sequence = 0
+        self.stats = {'published': 0, 'sent': 0, 'dropped': 0, 'subscribed': 0, 'left': 0}
+        self.sock = None
+        self.ring = None
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)      # Left over from a previous run
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.bind(socket_path)
+            self.sock.setblocking(False)
+        if ring_name:
+            self.ring_slots = ring_slots
+            self.slot_size = SLOT_SEQ.size + RECORD.size
+            try:
+                stale = shared_memory.SharedMemory(ring_name)      # Left over from a previous run; unlink() unregisters it
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+            self.ring = shared_memory.SharedMemory(ring_name, create=True,
+                                                   size=RING_HEADER.size + ring_slots * self.slot_size)
+            _published.add(ring_name)
+            RING_HEADER.pack_into(self.ring.buf, 0, RING_MAGIC, VERSION, RECORD.size, ring_slots, 0)
+
+    def _control(self):
+        """Drains b'SUB' / b'UNSUB' requests; never waits"""
+        while True:
+            try:
+                message, address = self.sock.recvfrom(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            if not address:
+                continue        # Unbound sender: nowhere to send records back to
+            if message == SUBSCRIBE:
+                if address not in self.subscribers:
+                    self.stats['subscribed'] += 1
+                self.subscribers[address] = time.monotonic()
+            elif message == UNSUBSCRIBE and self.subscribers.pop(address, None) is not None:
+                self.stats['left'] += 1
+
+    def publish(self, values):
+        record = pack_record(self.sequence, values)
+        if self.ring is not None:
+            self._write_ring(record)
+        if self.sock is not None:
+            self._control()
+            now = time.monotonic()
+            for address, seen in list(self.subscribers.items()):
+                if now - seen > self.subscriber_timeout:
+                    del self.subscribers[address]
+                    self.stats['left'] += 1
+                    continue
+                try:
+                    self.sock.sendto(record, socket.MSG_DONTWAIT, address)
+                    self.stats['sent'] += 1
+                except (BlockingIOError, InterruptedError):
+                    self.stats['dropped'] += 1      # Slow reader: its queue is full, so it misses this one
+                except OSError:
+                    del self.subscribers[address]   # Reader has gone (socket closed / file removed)
+                    self.stats['left'] += 1
+        self.sequence += 1
+        self.stats['published'] += 1
+
+    def _write_ring(self, record):
+        buf = self.ring.buf
+        count = RING_HEADER.unpack_from(buf, 0)[4]
+        offset = RING_HEADER.size + (count % self.ring_slots) * self.slot_size
+        SLOT_SEQ.pack_into(buf, offset, 2 * count + 1)      # Odd: slot being written
+        buf[offset + SLOT_SEQ.size:offset + self.slot_size] = record
+        SLOT_SEQ.pack_into(buf, offset, 2 * count + 2)      # Even, and unique to this record
+        struct.pack_into('<Q', buf, RING_HEADER.size - 8, count + 1)
+
+    def summary(self):
+        """'3 subscribers, 1204 records, 2 dropped'"""
+        return (f"{len(self.subscribers)} subscriber{'' if len(self.subscribers) == 1 else 's'}, "
+                f"{self.stats['published']} records, {self.stats['dropped']} dropped")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            _published.discard(self.ring.name)
+
+
+#-------------------- SUBSCRIBERS --------------------
+class SocketSubscriber:
+    """
+    - Binds an abstract (autobind) socket, subscribes, and re-subscribes every `renew` seconds
+    - read(timeout) returns the next record dictionary, or None on timeout
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET, renew=10, buffer_records=64):
+        self.socket_path = socket_path
+        self.renew = renew
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind('')      # Linux autobind: a unique abstract address the publisher can reply to
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_records * RECORD.size * 4)
+        self.last_sequence = None
+        self.missed = 0
+        self._subscribed = 0.0
+
+    def _subscribe(self):
+        self.sock.sendto(SUBSCRIBE, self.socket_path)
+        self._subscribed = time.monotonic()
+
+    def read(self, timeout=None):
+        if time.monotonic() - self._subscribed > self.renew:
+            self._subscribe()
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(RECORD.size)
+        except (socket.timeout, BlockingIOError):     # timeout=0 polls without waiting
+            return None
+        record = unpack_record(data)
+        if self.last_sequence is not None:
+            self.missed += max((record['sequence'] - self.last_sequence - 1) & 0xFFFFFFFF, 0)
+        self.last_sequence = record['sequence']
+        return record
+
+    def close(self):
+        try:
+            self.sock.sendto(UNSUBSCRIBE, self.socket_path)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RingReader:
+    """
+    - Reads the publisher's shared-memory ring in place; the publisher never knows it is there
+    - read() returns every record written since the last call (oldest first); missed counts overwritten ones
+    """
+    def __init__(self, ring_name=DEFAULT_RING, from_start=False):
+        self.shm = _attach(ring_name)
+        (magic, version, record_size, self.slots, count) = RING_HEADER.unpack_from(self.shm.buf, 0)
+        if magic != RING_MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{ring_name} is not a version {VERSION} telemetry ring")
+        self.slot_size = SLOT_SEQ.size + RECORD.size
+        self.next = max(count - self.slots, 0) if from_start else count
+        self.missed = 0
+
+    def read(self):
+        buf = self.shm.buf
+        count = struct.unpack_from('<Q', buf, RING_HEADER.size - 8)[0]
+        if count - self.next > self.slots:
+            self.missed += count - self.slots - self.next       # Fell more than a ring behind
+            self.next = count - self.slots
+        records = []
+        while self.next < count:
+            offset = RING_HEADER.size + (self.next % self.slots) * self.slot_size
+            expected = 2 * self.next + 2
+            data = bytes(buf[offset + SLOT_SEQ.size:offset + self.slot_size])
+            if SLOT_SEQ.unpack_from(buf, offset)[0] == expected:
+                records.append(unpack_record(data))
+            else:
+                self.missed += 1        # Overwritten while we copied it
+            self.next += 1
+        return records
+
+    def close(self):
+        self.shm.close()
+
+
+#-------------------- MAIN FUNCTION --------------------
+def print_record(record):
+    print(f"{CYAN}{record['sequence']:>6}{RESET} {time.strftime('%H:%M:%S', time.gmtime(record['utc']))}Z "
+          f"{record['lat']:>9.5f} {record['lon']:>10.5f} {record['alt']:>7.0f} m  {record['voltage']:.2f} V "
+          f"{record['current']:.0f} mA  {record['charge']:.0f}%  flight {record['flight_time']} s  state 0x{record['state']:02x}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print live telemetry records from flight_3.5.py")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="publisher socket path")
+    parser.add_argument('--ring', help="read the shared-memory ring instead of subscribing to the socket")
+    args = parser.parse_args()
+
+    if args.ring:
+        reader = RingReader(args.ring, from_start=True)
+        try:
+            while True:
+                for record in reader.read():
+                    print_record(record)
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            print(f"{MAGENTA}{'Missed records:':<25}{RESET}{reader.missed}")
+        finally:
+            reader.close()
+        return
+    subscriber = SocketSubscriber(args.socket)
+    try:
+        while True:
+            record = subscriber.read(timeout=5)
+            if record is None:
+                print(f"{ORANGE}{'No telemetry:':<25}{RESET}nothing from {args.socket} for 5 s")
+                continue
+            print_record(record)
+    except KeyboardInterrupt:
+        print(f"{MAGENTA}{'Missed records:':<25}{RESET}{subscriber.missed}")
+    finally:
+        subscriber.close()
+
+
+if __name__ == "__main__":
+    main()
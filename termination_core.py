@@ -0,0 +1,424 @@
+"""
+Process-isolated termination core: flight timer, geofence and cutdown outside the flight script's event loop.
+
+Notes:
+1) flight_3.5.py starts this as its own process and writes the latest fix into a shared-memory telemetry block
+   from its GPS reader; this process owns the servo and nichrome outputs and nothing else
+    - CSV writes, terminal output, radio bursts or a hung sensor read in the flight script cannot delay a cutdown
+2) The block has two halves, each with a single writer (flight script -> telemetry, core -> status), guarded by a
+   sequence lock: a reader retries a torn read and never waits on the writer, so a stalled writer cannot stall
+   the reader. The core keeps the last good telemetry if a read keeps failing
+3) Every `period` seconds the core checks:
+    - Timer: flight_time_limit seconds after the flight script first reports airborne
+    - Geofence: a fresh, valid fix outside the fence for confirm_s seconds (a fix older than fix_timeout counts
+      as no fix, as gps_valid False did before)
+    - Manual: the flight script bumped the manual request counter (uplink terminate command)
+4) Breach-to-actuation latency = time outside the fence before the decision (the deliberate confirm window) plus
+   the reaction time from decision to servo (bounded by the loop period plus the worst tick lateness, both
+   published); all of it is in the status half
+5) Launch time, trigger, actuation times and the last manual request handled are in the status half, so a
+   restarted core resumes where it was
+    - The flight script's block has a fixed name (SharedBlock.open()): a restarted flight script attaches to it and
+      keeps the core that is still running (running_core()) instead of starting a second one with a new timer
+    - A core that starts on a block whose cutdown is not done holds the servo open and runs the actuation again
+    - Each fix carries the flight script's trace id; the core stamps every trace_sample-th one it evaluates and the
+      one behind a decision, for latency_trace.py: the first fix outside the fence for a geofence cutdown, the
+      latest fix when the time limit is crossed or a manual request arrives
+6) The core keeps running if the flight script dies; only a stop request (Ctrl-C in the flight script) ends it
+
+Usage:
+    python3 termination_core.py --dry-run --limit 30     Bench test: no GPIO, a simulated fix drifting out of the fence
+"""
+
+
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from telemetry_frame import TRIGGERS
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+PHASES = ('idle', 'servo', 'heating', 'done')
+NO_TIME = -1.0
+
+
+#-------------------- SHARED BLOCK --------------------
+class SharedBlock:
+    """
+    - Telemetry half (flight script writes): heartbeat, fix_time, lat, lon, alt, gps_valid, airborne, manual, stop,
+      fix_id
+    - Status half (core writes): heartbeat, launch_time, flight_time, contained, intact, trigger, phase,
+      breach_time, decision_time, actuation_time, max_late_ms, fix_age, traced_fix, traced_time, decision_fix,
+      heat_on_time, pid, manual_seen, breach_fix
+    - Times are time.monotonic(), which is system-wide on Linux, so both processes share one clock
+    """
+    SEQ = struct.Struct('<Q')
+    TELEMETRY = struct.Struct('<ddddd?BIBI')
+    TELEMETRY_FIELDS = ('heartbeat', 'fix_time', 'lat', 'lon', 'alt', 'gps_valid', 'airborne', 'manual', 'stop',
+                        'fix_id')
+    STATUS = struct.Struct('<ddd??BBdddddIdIdIII')
+    STATUS_FIELDS = ('heartbeat', 'launch_time', 'flight_time', 'contained', 'intact', 'trigger', 'phase',
+                     'breach_time', 'decision_time', 'actuation_time', 'max_late_ms', 'fix_age',
+                     'traced_fix', 'traced_time', 'decision_fix', 'heat_on_time', 'pid', 'manual_seen',
+                     'breach_fix')
+    STATUS_OFFSET = 128
+    SIZE = 256
+
+    def __init__(self, name=None, create=False, persist=False):
+        if create:
+            self.shm = _open(name, create=True, size=self.SIZE, track=not persist)
+            self.shm.buf[:self.SIZE] = bytes(self.SIZE)
+            self.write_status(**self.default_status())
+        else:
+            self.shm = _open(name, track=False)
+        self.name = self.shm.name
+        self.owner = create and not persist
+        self.tracked = create and not persist
+        self.telemetry = self.default_telemetry()   # Writer-side copy, so write_telemetry() can update a few fields
+
+    @classmethod
+    def open(cls, name):
+        """A fixed-name block that outlives the flight script: attach to the one a previous run left, else create it"""
+        try:
+            block = cls(name)
+        except FileNotFoundError:
+            return cls(name, create=True, persist=True)
+        block.telemetry = block.read_telemetry() or block.default_telemetry()   # Carry on its manual request counter
+        block.write_telemetry(stop=0)
+        return block
+
+    @staticmethod
+    def default_telemetry():
+        return {'heartbeat': 0.0, 'fix_time': NO_TIME, 'lat': 0.0, 'lon': 0.0, 'alt': 0.0, 'gps_valid': False,
+                'airborne': 0, 'manual': 0, 'stop': 0, 'fix_id': 0}
+
+    @staticmethod
+    def default_status():
+        return {'heartbeat': 0.0, 'launch_time': NO_TIME, 'flight_time': 0.0, 'contained': False, 'intact': True,
+                'trigger': 0, 'phase': 0, 'breach_time': NO_TIME, 'decision_time': NO_TIME,
+                'actuation_time': NO_TIME, 'max_late_ms': 0.0, 'fix_age': NO_TIME,
+                'traced_fix': 0, 'traced_time': NO_TIME, 'decision_fix': 0, 'heat_on_time': NO_TIME, 'pid': 0,
+                'manual_seen': 0, 'breach_fix': 0}
+
+    def _write(self, offset, layout, values):
+        buf = self.shm.buf
+        sequence = self.SEQ.unpack_from(buf, offset)[0] + 1
+        self.SEQ.pack_into(buf, offset, sequence)                   # Odd: write in progress
+        layout.pack_into(buf, offset + self.SEQ.size, *values)
+        self.SEQ.pack_into(buf, offset, sequence + 1)
+
+    def _read(self, offset, layout, fields, attempts=100):
+        buf = self.shm.buf
+        for _ in range(attempts):
+            before = self.SEQ.unpack_from(buf, offset)[0]
+            if before & 1:
+                continue
+            values = layout.unpack_from(buf, offset + self.SEQ.size)
+            if self.SEQ.unpack_from(buf, offset)[0] == before:
+                return dict(zip(fields, values))
+        return None     # Writer kept getting in the way; caller keeps its last good copy
+
+    def write_telemetry(self, **values):
+        self.telemetry.update(values)
+        self._write(0, self.TELEMETRY, [self.telemetry[name] for name in self.TELEMETRY_FIELDS])
+
+    def read_telemetry(self):
+        return self._read(0, self.TELEMETRY, self.TELEMETRY_FIELDS)
+
+    def write_status(self, **values):
+        self._write(self.STATUS_OFFSET, self.STATUS, [values[name] for name in self.STATUS_FIELDS])
+
+    def read_status(self):
+        return self._read(self.STATUS_OFFSET, self.STATUS, self.STATUS_FIELDS)
+
+    def close(self, unlink=None):
+        """unlink: remove the block as well (default: only if this process created it without persist)"""
+        self.shm.close()
+        if self.owner if unlink is None else unlink:
+            if not self.tracked and getattr(self.shm, '_track', True):
+                resource_tracker.register(self.shm._name, 'shared_memory')     # Python < 3.13: unlink() unregisters
+            self.shm.unlink()
+
+
+def _open(name, create=False, size=0, track=True):
+    if track:
+        return shared_memory.SharedMemory(name, create=create, size=size)
+    try:
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)     # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')     # Otherwise this process unlinks it on exit
+        return shm
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def running_core(block, stale_s=5.0):
+    """pid of the core serving this block if it is still alive and publishing, else None"""
+    status = block.read_status()
+    if status is None or not status['pid'] or time.monotonic() - status['heartbeat'] > stale_s:
+        return None
+    return status['pid'] if pid_alive(status['pid']) else None
+
+
+#-------------------- GEOFENCE --------------------
+def point_in_polygon(lat, lon, polygon):
+    """Ray casting over (lat, lon) vertices, as shapely's Polygon.contains() was used for the fence"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        (lat_i, lon_i), (lat_j, lon_j) = polygon[i], polygon[j]
+        if (lon_i > lon) != (lon_j > lon) and lat < (lat_j - lat_i) * (lon - lon_i) / (lon_j - lon_i) + lat_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+#-------------------- OUTPUTS --------------------
+class DryRunOutput:
+    """Prints instead of driving a pin (bench tests, --dry-run)"""
+    def __init__(self, name):
+        self.name = name
+        self._value = None
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        print(f"{MAGENTA}{self.name + ':':<25}{RESET}{value}")
+
+
+def open_outputs(config, dry_run=False, released=False):
+    """(servo or None, heat element); the servo is fitted to the primary only and stays open once released"""
+    if dry_run:
+        servo = DryRunOutput('servo') if config['primary'] else None
+        heat = DryRunOutput('nichrome')
+    else:
+        import gpiozero
+        from gpiozero import Servo
+        from gpiozero.pins.pigpio import PiGPIOFactory
+        servo = Servo(config['servo_pin'], pin_factory=PiGPIOFactory()) if config['primary'] else None
+        heat = gpiozero.PWMOutputDevice(config['heat_pin'])
+    if servo is not None:
+        servo.value = config['servo_open' if released else 'servo_close']
+    heat.value = config['relay_off']
+    return servo, heat
+
+
+def raise_priority():
+    """Best effort: real-time scheduling, or at least a better nice value (needs root / CAP_SYS_NICE)"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(10))
+        return 'SCHED_FIFO'
+    except (AttributeError, OSError):
+        pass
+    try:
+        os.nice(-10)
+        return 'nice -10'
+    except OSError:
+        return 'normal'
+
+
+#-------------------- CORE --------------------
+DEFAULT_CONFIG = {
+    'fence': [(41.000187, -102.050539), (36.988411, -102.038130), (37.000241, -109.040373), (41.008131, -109.054018)],
+    'flight_time_limit': 7200,
+    'confirm_s': 10,            # Seconds outside the fence before cutting down (the old geofencing() re-check)
+    'fix_timeout': 30,          # Seconds before the last fix no longer counts
+    'heat_time': 12,
+    'servo_delay': 3,           # Seconds between the servo opening and the nichrome heating
+    'period': 0.1,
+    'trace_sample': 4,          # Stamp every Nth fix id for latency_trace.py; 0 = off
+    'primary': True,
+    'servo_pin': 4, 'heat_pin': 26,
+    'servo_open': 1, 'servo_close': -1,
+    'relay_on': 1, 'relay_off': 0,
+}
+
+
+class TerminationCore:
+    def __init__(self, block, config, servo, heat):
+        self.block = block
+        self.config = config
+        self.servo = servo
+        self.heat = heat
+        self.telemetry = block.default_telemetry()
+        self.status = block.read_status() or block.default_status()     # Resume after a restart
+        self.status['pid'] = os.getpid()
+        self.max_late = 0.0
+        self._actuator = None
+
+    def run(self):
+        period = self.config['period']
+        if not self.status['intact'] and self.status['phase'] != PHASES.index('done'):
+            print(f"{ORANGE}{'Termination resumed:':<25}{RESET}{TRIGGERS[self.status['trigger']]}, "
+                  f"interrupted while {PHASES[self.status['phase']]}")
+            self._start_actuator()      # The previous core died mid-cutdown: run the whole cycle again
+        next_time = time.monotonic()
+        while True:
+            now = time.monotonic()
+            self.max_late = max(self.max_late, now - next_time)     # How late this tick started
+            telemetry = self.block.read_telemetry()
+            if telemetry is not None:
+                self.telemetry = telemetry
+            if self.telemetry['stop']:
+                break
+            self.step(now)
+            self.publish(now)
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def step(self, now):
+        config, telemetry, status = self.config, self.telemetry, self.status
+        if telemetry['airborne'] and status['launch_time'] == NO_TIME:
+            status['launch_time'] = now
+        if status['launch_time'] != NO_TIME:
+            status['flight_time'] = now - status['launch_time']
+        fresh = telemetry['gps_valid'] and telemetry['fix_time'] != NO_TIME and now - telemetry['fix_time'] <= config['fix_timeout']
+        status['fix_age'] = now - telemetry['fix_time'] if telemetry['fix_time'] != NO_TIME else NO_TIME
+        if fresh:
+            sample = config['trace_sample']
+            if sample and telemetry['fix_id'] % sample == 0 and telemetry['fix_id'] != status['traced_fix']:
+                status['traced_fix'], status['traced_time'] = telemetry['fix_id'], now
+            status['contained'] = point_in_polygon(telemetry['lat'], telemetry['lon'], config['fence'])
+            if status['contained']:
+                status['breach_time'] = NO_TIME
+            elif status['breach_time'] == NO_TIME:
+                status['breach_time'], status['breach_fix'] = telemetry['fix_time'], telemetry['fix_id']
+        if not status['intact']:
+            return
+        if telemetry['manual'] != status['manual_seen']:
+            status['manual_seen'] = telemetry['manual']     # Kept in the block: a request made while no core ran counts
+            self.terminate('Manual', now)
+        elif status['flight_time'] > config['flight_time_limit']:
+            self.terminate('Timing', now)
+        elif fresh and status['breach_time'] != NO_TIME and now - status['breach_time'] >= config['confirm_s']:
+            self.terminate('Geofencing', now)
+
+    def terminate(self, trigger, now):
+        decision_fix = self.status['breach_fix'] if trigger == 'Geofencing' else self.telemetry['fix_id']
+        self.status.update(intact=False, trigger=TRIGGERS.index(trigger), decision_time=now, phase=PHASES.index('servo'),
+                           decision_fix=decision_fix)
+        print(f"{CYAN}{'Termination commanded:':<25}{RESET}{trigger}")
+        self._start_actuator()
+
+    def _start_actuator(self):
+        self._actuator = threading.Thread(target=self._actuate, name='actuate', daemon=True)
+        self._actuator.start()      # The loop keeps publishing status while the nichrome heats
+
+    def _actuate(self):
+        config, status = self.config, self.status
+        if self.servo is not None:
+            self.servo.value = config['servo_open']     # Release the line
+            if status['actuation_time'] == NO_TIME:
+                status['actuation_time'] = time.monotonic()
+            time.sleep(config['servo_delay'])
+        status['phase'] = PHASES.index('heating')
+        self.heat.value = config['relay_on']
+        if status['heat_on_time'] == NO_TIME:
+            status['heat_on_time'] = time.monotonic()
+        if status['actuation_time'] == NO_TIME:
+            status['actuation_time'] = time.monotonic()
+        time.sleep(config['heat_time'])
+        self.heat.value = config['relay_off']
+        status['phase'] = PHASES.index('done')
+        print(f"{GREEN}{'Termination complete':<25}{RESET}{latency_text(status)}")
+
+    def publish(self, now):
+        self.status['heartbeat'] = now
+        self.status['max_late_ms'] = self.max_late * 1000
+        self.block.write_status(**self.status)
+
+
+def latency_text(status):
+    """'breach->actuation 10.12 s (confirm 10.00 s + reaction 8 ms)' once the outputs have fired"""
+    if status['actuation_time'] == NO_TIME:
+        return ''
+    reaction = status['actuation_time'] - status['decision_time']
+    if status['breach_time'] == NO_TIME or TRIGGERS[status['trigger']] != 'Geofencing':
+        return f"decision->actuation {reaction * 1000:.0f} ms"
+    confirm = status['decision_time'] - status['breach_time']
+    return (f"breach->actuation {status['actuation_time'] - status['breach_time']:.2f} s "
+            f"(confirm {confirm:.2f} s + reaction {reaction * 1000:.0f} ms)")
+
+
+def summary(status, pid=None):
+    """One display line for the flight script"""
+    text = (f"{'pid ' + str(pid) + ', ' if pid else ''}{PHASES[status['phase']]}, ticks late <= {status['max_late_ms']:.0f} ms, "
+            f"fix age {'none' if status['fix_age'] == NO_TIME else format(status['fix_age'], '.1f') + ' s'}")
+    latency = latency_text(status)
+    return text + (f", {latency}" if latency else '')
+
+
+#-------------------- MAIN FUNCTION --------------------
+def bench(config):
+    """--dry-run without --block: drive the core from a simulated fix that drifts east out of the fence"""
+    block = SharedBlock(create=True)
+    core = TerminationCore(block, config, *open_outputs(config, dry_run=True))
+    threading.Thread(target=core.run, name='core', daemon=True).start()
+    lat, lon = 39.0, -102.2
+    try:
+        while block.read_status()['phase'] != PHASES.index('done'):
+            lon += 0.01
+            block.write_telemetry(heartbeat=time.monotonic(), fix_time=time.monotonic(), lat=lat, lon=lon,
+                                  alt=20000.0, gps_valid=True, airborne=1)
+            time.sleep(1)
+        print(summary(block.read_status()))
+    finally:
+        block.write_telemetry(stop=1)
+        time.sleep(2 * config['period'])
+        block.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SABER termination core (started by flight_3.5.py)")
+    parser.add_argument('--block', help="shared-memory telemetry block name")
+    parser.add_argument('--config', default='{}', help="JSON settings overriding DEFAULT_CONFIG")
+    parser.add_argument('--dry-run', action='store_true', help="print output changes instead of driving GPIO")
+    parser.add_argument('--limit', type=float, help="flight time limit (s)")
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG, **json.loads(args.config))
+    if args.limit is not None:
+        config['flight_time_limit'] = args.limit
+    if args.block is None:
+        if not args.dry_run:
+            parser.error("--block is required unless --dry-run")
+        bench(config)
+        return
+    priority = raise_priority()
+    block = SharedBlock(args.block)
+    status = block.read_status() or block.default_status()
+    core = TerminationCore(block, config, *open_outputs(config, args.dry_run, released=not status['intact']))
+    print(f"{MAGENTA}{'Termination core:':<25}{RESET}pid {os.getpid()}, {priority} priority, "
+          f"{'servo + nichrome' if core.servo is not None else 'nichrome'}{' (dry run)' if args.dry_run else ''}")
+    try:
+        core.run()
+    finally:
+        block.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+UBX protocol messages, configuration and an incremental parser for the u-blox NEO-6M GPS.
+
+Notes:
+1) Frame: 0xB5 0x62 | class | id | payload length (2 bytes, little-endian) | payload | CK_A CK_B
+2) The checksum is the 8-bit Fletcher algorithm over class, id, length and payload
+3) The receiver answers CFG messages with ACK-ACK (0x05 0x01) or ACK-NAK (0x05 0x00) carrying the class and id
+4) The NEO-6M (protocol 7) has no NAV-PVT; a fix is NAV-POSLLH + NAV-VELNED + NAV-SOL + NAV-TIMEUTC per epoch
+5) configure() at boot: UART to UBX-only output at a higher baud, NMEA sentences off, dynamic model Airborne <2g,
+   navigation rate, and the four NAV messages on every epoch
+    - If the port switch or a NAV message is not ACKed, fallback() asks the receiver back to NMEA at 9600 and
+      probes which baud actually carries data; configure() returns the protocol in use
+6) UBXParser.feed() takes whatever bytes the serial port had and returns the decoded messages
+    - Fields are unpacked straight out of the receive buffer (struct.unpack_from), no per-frame copies
+    - Bytes that are not UBX (NMEA left over from before the switch, line noise) are skipped to the next sync
+
+Usage:
+    python3 ubx.py --simulate           Configure a simulated NEO-6M, parse 10 minutes of flight and check every fix,
+                                        then the NAK / silent receiver fallbacks and flight_3.5.py's gps() task
+"""
+
+
+import argparse
+import random
+import re
+import struct
+import time
+from itertools import accumulate
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+SYNC = b'\xb5\x62'
+HEADER = struct.Struct('<2sBBH')
+CLASS_NAV = 0x01
+CLASS_ACK = 0x05
+CLASS_CFG = 0x06
+CLASS_NMEA = 0xF0
+ACK_NAK = 0x00
+ACK_ACK = 0x01
+CFG_PRT = 0x00
+CFG_MSG = 0x01
+CFG_RATE = 0x08
+CFG_RXM = 0x11
+CFG_NAV5 = 0x24
+NAV_POSLLH = 0x02
+NAV_SOL = 0x06
+NAV_VELNED = 0x12
+NAV_TIMEUTC = 0x21
+
+LP_CONTINUOUS = 0       # CFG-RXM lpMode: continuous tracking, full power
+LP_POWER_SAVE = 1       # Power Save Mode (cyclic tracking per CFG-PM2; defaults to a 1 s update period)
+DYN_AIRBORNE_2G = 8     # CFG-NAV5 dynModel: Airborne with <2g acceleration (50 km altitude limit)
+
+NMEA_SENTENCES = {'GGA': 0x00, 'GLL': 0x01, 'GSA': 0x02, 'GSV': 0x03, 'RMC': 0x04, 'VTG': 0x05}
+NAV_MESSAGES = (NAV_POSLLH, NAV_VELNED, NAV_SOL, NAV_TIMEUTC)
+
+PROTO_UBX = 0x01
+PROTO_NMEA = 0x02
+UART_8N1 = 0x08D0
+
+KNOTS_PER_CM_S = 0.0194384
+BOOT_BAUD = 9600
+NMEA_RE = re.compile(rb'\$GP[A-Z]{3},[ -~]*\*[0-9A-F]{2}\r\n')
+
+
+#-------------------- MESSAGES --------------------
+def checksum(data):
+    """Fletcher-8 over class, id, length and payload; CK_B is the sum of the running CK_A sums"""
+    running = list(accumulate(data))
+    return bytes(((running[-1] if running else 0) & 0xFF, sum(running) & 0xFF))
+
+
+def message(msg_class, msg_id, payload=b''):
+    """Complete UBX frame, ready to write to the GPS serial port"""
+    body = struct.pack('<BBH', msg_class, msg_id, len(payload)) + bytes(payload)
+    return SYNC + body + checksum(body)
+
+
+def cfg_rxm(power_save):
+    """CFG-RXM: switch the receiver between continuous mode and Power Save Mode (reserved byte must be 8)"""
+    return message(CLASS_CFG, CFG_RXM, bytes((8, LP_POWER_SAVE if power_save else LP_CONTINUOUS)))
+
+
+def cfg_prt(baud, out_protocols=PROTO_UBX, in_protocols=PROTO_UBX | PROTO_NMEA, port=1):
+    """CFG-PRT for UART1: 8N1 at `baud`; the receiver switches baud after sending the ACK at the old one"""
+    return message(CLASS_CFG, CFG_PRT, struct.pack('<BBHIIHHHH', port, 0, 0, UART_8N1, baud,
+                                                   in_protocols, out_protocols, 0, 0))
+
+
+def cfg_msg(msg_class, msg_id, rate):
+    """CFG-MSG: output msg_class/msg_id every `rate` navigation epochs on the current port (0 = off)"""
+    return message(CLASS_CFG, CFG_MSG, bytes((msg_class, msg_id, rate)))
+
+
+def cfg_nav5(dyn_model=DYN_AIRBORNE_2G):
+    """CFG-NAV5 with only the dynamic model in the apply mask (everything else left as it is)"""
+    return message(CLASS_CFG, CFG_NAV5, struct.pack('<HBBiIbBHHHHBBIII', 0x0001, dyn_model, 0, 0, 0,
+                                                    0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+
+
+def cfg_rate(rate_hz):
+    """CFG-RATE: measurement period in ms (the NEO-6M tops out at 5 Hz), one solution per measurement, GPS time"""
+    return message(CLASS_CFG, CFG_RATE, struct.pack('<HHH', int(round(1000 / rate_hz)), 1, 1))
+
+
+#-------------------- PARSER --------------------
+POSLLH = struct.Struct('<IiiiiII')
+VELNED = struct.Struct('<IiiiIIiII')
+SOL = struct.Struct('<IihBBiiiIiiiIHBBI')
+TIMEUTC = struct.Struct('<IIiHBBBBBB')
+ACK = struct.Struct('<BB')
+
+
+def _posllh(buf, offset):
+    (itow, lon, lat, height, hmsl, h_acc, v_acc) = POSLLH.unpack_from(buf, offset)
+    return {'name': 'NAV-POSLLH', 'itow': itow, 'lat': lat * 1e-7, 'lon': lon * 1e-7, 'alt': hmsl / 1000,
+            'h_acc': h_acc / 1000, 'v_acc': v_acc / 1000}
+
+
+def _velned(buf, offset):
+    (itow, vel_n, vel_e, vel_d, speed, ground_speed, heading, s_acc, c_acc) = VELNED.unpack_from(buf, offset)
+    return {'name': 'NAV-VELNED', 'itow': itow, 'speed_kts': ground_speed * KNOTS_PER_CM_S,
+            'track': heading * 1e-5, 'vertical_rate': -vel_d / 100}
+
+
+def _sol(buf, offset):
+    fields = SOL.unpack_from(buf, offset)
+    (gps_fix, flags, num_sv) = (fields[3], fields[4], fields[15])
+    return {'name': 'NAV-SOL', 'itow': fields[0], 'fix_type': gps_fix, 'fix_ok': bool(flags & 0x01),
+            'valid': bool(flags & 0x01) and gps_fix in (2, 3, 4), 'sats': num_sv, 'pdop': fields[13] / 100}
+
+
+def _timeutc(buf, offset):
+    (itow, t_acc, nano, year, month, day, hour, minute, second, valid) = TIMEUTC.unpack_from(buf, offset)
+    return {'name': 'NAV-TIMEUTC', 'itow': itow, 'year': year, 'month': month, 'day': day, 'hour': hour,
+            'minute': minute, 'second': second, 'nano': nano, 'valid': bool(valid & 0x04)}
+
+
+def _ack(name):
+    def decode(buf, offset):
+        (msg_class, msg_id) = ACK.unpack_from(buf, offset)
+        return {'name': name, 'class': msg_class, 'id': msg_id}
+    return decode
+
+
+DECODERS = {
+    (CLASS_NAV, NAV_POSLLH): (POSLLH.size, _posllh),
+    (CLASS_NAV, NAV_VELNED): (VELNED.size, _velned),
+    (CLASS_NAV, NAV_SOL): (SOL.size, _sol),
+    (CLASS_NAV, NAV_TIMEUTC): (TIMEUTC.size, _timeutc),
+    (CLASS_ACK, ACK_ACK): (ACK.size, _ack('ACK-ACK')),
+    (CLASS_ACK, ACK_NAK): (ACK.size, _ack('ACK-NAK')),
+}
+
+
+class UBXParser:
+    """
+    - feed(data) returns the decoded messages (dictionaries with a 'name') completed by data, oldest first
+    - Messages without a decoder are counted in .stats['other'] and skipped
+    """
+    def __init__(self, max_payload=512):
+        self.buffer = bytearray()
+        self.max_payload = max_payload
+        self.stats = {'frames': 0, 'other': 0, 'bad_checksum': 0, 'skipped_bytes': 0}
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        messages = []
+        pos = 0
+        end = len(buf)
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                keep = end - 1 if end and buf[-1] == SYNC[0] else end     # A lone 0xB5 may be half a sync
+                self.stats['skipped_bytes'] += keep - pos
+                pos = keep
+                break
+            self.stats['skipped_bytes'] += start - pos
+            if end - start < HEADER.size:
+                pos = start
+                break
+            (_, msg_class, msg_id, length) = HEADER.unpack_from(buf, start)
+            if length > self.max_payload:
+                pos = start + 1         # Not a real header; resync on the next 0xB5 0x62
+                continue
+            frame_end = start + HEADER.size + length + 2
+            if frame_end > end:
+                pos = start
+                break
+            if checksum(memoryview(buf)[start + 2:frame_end - 2]) != buf[frame_end - 2:frame_end]:
+                self.stats['bad_checksum'] += 1
+                pos = start + 1
+                continue
+            decoder = DECODERS.get((msg_class, msg_id))
+            if decoder is not None and length >= decoder[0]:
+                messages.append(decoder[1](buf, start + HEADER.size))
+                self.stats['frames'] += 1
+            else:
+                self.stats['other'] += 1
+            pos = frame_end
+        del buf[:pos]       # Compact once per feed(); no views into the buffer are held by then
+        return messages
+
+
+#-------------------- CONFIGURATION --------------------
+def _send(ser, frame, parser, timeout):
+    """Write one CFG frame and wait for its ACK; True (ACK), False (NAK) or None (no answer)"""
+    ser.write(frame)
+    msg_class, msg_id = frame[2], frame[3]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for reply in parser.feed(ser.read(ser.in_waiting or 1)):
+            if reply['name'] in ('ACK-ACK', 'ACK-NAK') and (reply['class'], reply['id']) == (msg_class, msg_id):
+                return reply['name'] == 'ACK-ACK'
+    return None
+
+
+def configure(ser, baud=38400, rate_hz=4, protocol='ubx', timeout=1.0, listen=1.5):
+    """
+    - Boot-time NEO-6M setup over a pyserial port; returns ({step: True/False/None} (ACK / NAK / no answer), protocol)
+    - protocol 'ubx': UBX-only output with the NAV messages every epoch, all NMEA off
+    - protocol 'nmea': NMEA output kept, but only RMC and GGA (what gps() parses)
+    - The port is switched to `baud` first (sent at the current baud and at `baud`, in case an earlier run
+      already changed it without a power cycle); ser.baudrate follows
+    - A port switch or (for 'ubx') NAV message that is not ACKed hands over to fallback(); the protocol returned is
+      the one the receiver is actually sending
+    """
+    parser = UBXParser()
+    results = {}
+    out_protocols = PROTO_UBX if protocol == 'ubx' else PROTO_UBX | PROTO_NMEA
+    for port_baud in dict.fromkeys((ser.baudrate, baud)):
+        ser.baudrate = port_baud
+        ser.write(cfg_prt(baud, out_protocols))
+        ser.flush()
+        time.sleep(0.1)     # ACK goes out at the old baud, then the UART switches
+    ser.baudrate = baud
+    ser.reset_input_buffer()
+    results['port'] = _send(ser, cfg_prt(baud, out_protocols), parser, timeout)
+    if not results['port']:
+        return results, fallback(ser, baud, listen)     # Nothing else would be heard at this baud either
+    results['dynamic model'] = _send(ser, cfg_nav5(DYN_AIRBORNE_2G), parser, timeout)
+    results['rate'] = _send(ser, cfg_rate(rate_hz), parser, timeout)
+    wanted_nmea = () if protocol == 'ubx' else ('RMC', 'GGA')
+    for name, msg_id in NMEA_SENTENCES.items():
+        results[f"NMEA {name}"] = _send(ser, cfg_msg(CLASS_NMEA, msg_id, 1 if name in wanted_nmea else 0), parser, timeout)
+    nav_acked = True
+    for msg_id in NAV_MESSAGES:
+        results[f"NAV 0x{msg_id:02x}"] = _send(ser, cfg_msg(CLASS_NAV, msg_id, 1 if protocol == 'ubx' else 0), parser, timeout)
+        nav_acked = nav_acked and bool(results[f"NAV 0x{msg_id:02x}"])
+    if protocol == 'ubx' and not nav_acked:
+        return results, fallback(ser, baud, listen)
+    return results, protocol
+
+
+def probe(ser, baud, listen=1.5):
+    """Listens at `baud` for up to `listen` s: 'ubx' if NAV messages arrive, 'nmea' if NMEA sentences do, else None"""
+    ser.baudrate = baud
+    ser.reset_input_buffer()
+    parser = UBXParser()
+    text = bytearray()
+    deadline = time.monotonic() + listen
+    while time.monotonic() < deadline:
+        data = ser.read(ser.in_waiting or 1)
+        if any(msg['name'].startswith('NAV-') for msg in parser.feed(data)):
+            return 'ubx'
+        text += data
+        if NMEA_RE.search(text):
+            return 'nmea'
+    return None
+
+
+def fallback(ser, baud, listen=1.5):
+    """
+    - For a receiver that did not take configure(): asks it, at every baud it may be on, to go back to NMEA (RMC
+      and GGA on) at 9600, then probes 9600 and `baud` for the one that actually carries data
+    - Returns the protocol heard ('ubx' when an earlier run left it on UBX and our commands do not reach it);
+      ser.baudrate follows. Silence leaves the power-up default, NMEA at 9600
+    """
+    for port_baud in dict.fromkeys((ser.baudrate, baud, BOOT_BAUD)):
+        ser.baudrate = port_baud
+        ser.write(cfg_prt(BOOT_BAUD, PROTO_UBX | PROTO_NMEA))
+        ser.flush()
+        time.sleep(0.1)
+    ser.baudrate = BOOT_BAUD
+    for name in ('RMC', 'GGA'):
+        ser.write(cfg_msg(CLASS_NMEA, NMEA_SENTENCES[name], 1))
+    for port_baud in dict.fromkeys((BOOT_BAUD, baud)):
+        protocol = probe(ser, port_baud, listen)
+        if protocol is not None:
+            return protocol
+    ser.baudrate = BOOT_BAUD
+    return 'nmea'
+
+
+#-------------------- SIMULATOR SELF-TEST --------------------
+def selftest(minutes=10, seed=1):
+    """
+    - Configures a SimulatedNEO6M, then parses `minutes` of virtual flight delivered in random-sized chunks with
+      NMEA noise in between, checking every decoded NAV message against the simulator's truth
+    - Returns (epochs checked, errors, microseconds per decoded message)
+    """
+    from sim_hardware import SimulatedNEO6M
+    clock = [0.0]
+    gps = SimulatedNEO6M(clock=lambda: clock[0])
+    (results, protocol) = configure(gps, timeout=0.05)
+    failed = [step for step, ok in results.items() if not ok] + ([f"fell back to {protocol}"] if protocol != 'ubx' else [])
+    rng = random.Random(seed)
+    parser = UBXParser()
+    errors = len(failed)
+    epochs = decoded = 0
+    seen = dict.fromkeys(('NAV-POSLLH', 'NAV-VELNED', 'NAV-SOL', 'NAV-TIMEUTC'), 0)
+    busy = 0.0
+    stream = bytearray()
+    while clock[0] < minutes * 60:
+        clock[0] += 1 / gps.rate_hz
+        stream += gps.read(gps.in_waiting)
+        if rng.random() < 0.05:
+            stream += b'$GPTXT,01,01,02,noise*00\r\n'
+        while stream:
+            size = rng.randint(1, 64)
+            chunk, stream[:size] = bytes(stream[:size]), b''
+            started = time.perf_counter()
+            messages = parser.feed(chunk)
+            busy += time.perf_counter() - started
+            decoded += len(messages)
+            for msg in messages:
+                if msg['name'] not in seen:
+                    continue
+                seen[msg['name']] += 1
+                truth = gps.truth(msg['itow'])
+                if msg['name'] == 'NAV-POSLLH':
+                    epochs += 1
+                    wrong = (abs(msg['lat'] - truth['lat']) > 1e-6 or abs(msg['lon'] - truth['lon']) > 1e-6
+                             or abs(msg['alt'] - truth['alt']) > 0.01)
+                elif msg['name'] == 'NAV-VELNED':
+                    wrong = (abs(msg['speed_kts'] - truth['speed_kts']) > 0.01 or abs(msg['track'] - truth['track']) > 1e-4
+                             or abs(msg['vertical_rate'] - truth['vertical_rate']) > 0.01)
+                elif msg['name'] == 'NAV-SOL':
+                    wrong = not msg['valid'] or msg['sats'] != truth['sats']
+                else:
+                    wrong = not msg['valid'] or (msg['year'], msg['month'], msg['day'], msg['hour'], msg['minute'],
+                                                 msg['second']) != truth['utc']
+                errors += wrong
+    missing = [name for name, count in seen.items() if count < epochs]
+    if failed or missing:
+        print(f"{RED}{'Configuration failed:':<25}{RESET}{', '.join(failed + [f'{name} missing' for name in missing])}")
+    return epochs, errors + len(missing), 1e6 * busy / max(decoded, 1)
+
+
+def fallback_checks(listen=0.2):
+    """
+    - configure() against receivers that NAK or never hear it; each must end on a protocol and baud that carry data
+    - The simulated receivers run 20x fast so the 1 Hz boot output shows up within `listen`
+    - Returns (cases checked, [(case, what went wrong)])
+    """
+    from sim_hardware import SimulatedNEO6M
+    cases = [   # (case, simulator options, baud an earlier run left UBX-only output on, expected protocol and baud)
+        ('NAKs everything', {'nak': (CFG_PRT, CFG_MSG, CFG_RATE, CFG_NAV5)}, None, ('nmea', BOOT_BAUD)),
+        ('NAKs CFG-MSG', {'nak': (CFG_MSG,)}, None, ('nmea', BOOT_BAUD)),
+        ('silent at boot', {'deaf': True}, None, ('nmea', BOOT_BAUD)),
+        ('silent, left on UBX', {'deaf': True}, 38400, ('ubx', 38400)),
+    ]
+    start = time.monotonic()
+    failures = []
+    for case, options, left_at, expected in cases:
+        gps = SimulatedNEO6M(clock=lambda: 20 * (time.monotonic() - start), **options)
+        if left_at:
+            gps.uart_baud, gps.out_protocols = left_at, PROTO_UBX
+            gps.enabled = {(CLASS_NAV, msg_id) for msg_id in NAV_MESSAGES}
+        (results, protocol) = configure(gps, timeout=0.05, listen=listen)
+        if (protocol, gps.baudrate) != expected:
+            failures.append((case, f"{protocol} at {gps.baudrate} baud, expected {expected[0]} at {expected[1]}"))
+        elif probe(gps, gps.baudrate, listen) != protocol:
+            failures.append((case, f"no {protocol} data at {gps.baudrate} baud"))
+    return len(cases), failures
+
+
+def flight_check(seconds=3.0, **gps_options):
+    """
+    - Loads flight_3.5.py on simulated hardware (soak_test's drivers, real time) and runs its gps() task for
+      `seconds`; the receiver holds one position so every published global has a single right value
+    - gps_options go to the SimulatedNEO6M (e.g. deaf=True to take the NMEA fallback at boot)
+    - Uses the soak test's shared-memory and socket names: don't run it alongside a soak test or a flight
+    - Returns (protocol the flight script settled on, [globals that do not match the truth])
+    """
+    import asyncio
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import types
+    import soak_test
+    clock = types.SimpleNamespace(monotonic=time.monotonic)
+    options = dict(start_alt=30000.0, burst_alt=30000.0, descent_rate=0.0, drift=(0.0, 0.0), **gps_options)
+    modules, devices = soak_test.hardware_modules(clock, options)
+    cwd = os.getcwd()
+    flight = None
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        os.chdir(workdir)
+        try:
+            flight = soak_test.load_flight(clock, modules, workdir, os.urandom(16).hex().encode())
+            try:
+                asyncio.run(asyncio.wait_for(flight.gps(), seconds))
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            if flight is not None:
+                flight.tracer.close()
+                flight.core_block.close(unlink=True)
+            os.chdir(cwd)
+    gps = devices['gps'][-1]
+    truth = gps.truth(gps.TOW_START_MS)
+    expected = {'gps_lat': round(truth['lat'], 5), 'gps_lon': round(truth['lon'], 5), 'gps_alt': round(truth['alt'], 1),
+                'gps_spd': round(truth['speed_kts'], 1), 'gps_trk': round(truth['track'], 1),
+                'gps_sat': truth['sats'], 'gps_valid': True}
+    published = {name: getattr(flight, name) for name in expected}
+    published['gps_sat'] = int(published['gps_sat'])
+    wrong = [name for name, value in expected.items() if not abs(published[name] - value) <= 1e-5]
+    last = gps.TOW_START_MS + round((gps._next_epoch - 1 / gps.rate_hz) * 1000)
+    if flight.gps_time not in {'%02d:%02d:%02d' % gps.truth(itow)['utc'][3:] for itow in (last, last - 1000)}:
+        wrong.append('gps_time')
+    if not flight.fix_id:
+        wrong.append('fix_id')
+    return flight.gps_protocol, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NEO-6M UBX tools")
+    parser.add_argument('--simulate', action='store_true', help="run the simulator-backed parser self-test")
+    parser.add_argument('--minutes', type=float, default=10, help="virtual minutes of flight for --simulate")
+    args = parser.parse_args()
+    if not args.simulate:
+        parser.error("nothing to do (try --simulate)")
+    epochs, errors, per_message = selftest(args.minutes)
+    passed = errors == 0 and epochs > 0
+    colour = GREEN if passed else RED
+    print(f"{colour}{'UBX self-test:':<25}{RESET}{epochs} epochs, {errors} errors, {per_message:.1f} µs per message")
+    (cases, failures) = fallback_checks()
+    for case, failure in failures:
+        print(f"{RED}{'Fallback failed:':<25}{RESET}{case}: {failure}")
+    colour = GREEN if not failures else RED
+    print(f"{colour}{'Fallback checks:':<25}{RESET}{cases - len(failures)} of {cases} receivers passed")
+    passed = passed and not failures
+    for case, options, wanted in (('Answering', {}, 'ubx'), ('Silent', {'deaf': True}, 'nmea')):
+        (protocol, wrong) = flight_check(**options)
+        ok = protocol == wanted and not wrong
+        colour = GREEN if ok else RED
+        detail = f"wrong: {', '.join(wrong)}" if wrong else 'every field matches'
+        print(f"{colour}{'Flight gps():':<25}{RESET}{case} receiver on {protocol.upper()}, {detail}")
+        passed = passed and ok
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Interrupt-driven LoRa uplink: the balloon listens between bursts for authenticated ground commands.
+
+Notes:
+1) Between transmit bursts the SX127x sits in continuous RX; DIO0 (GPIO 23) raises RxDone and the LoRaRF
+   interrupt thread hands the packet to the event loop. Nothing polls the radio
+2) transmitting() wraps every TX: the radio leaves RX for the burst and is re-armed the moment TX is done
+    - sleep() puts the radio to sleep with RX off (power_manager.py cruise profile); the next transmitting() or
+      wake() brings it back to listening
+3) Commands are 19 bytes: a header, a 32-bit sequence number and a truncated HMAC-SHA256 over both
+    - Frames for another balloon, with a bad MAC, a CRC error, or an old sequence number (replays) are dropped
+    - The last accepted sequence number is kept on disk so a reboot does not reopen old commands
+4) Each command carries its interrupt timestamp; acted(command) records command-to-action latency
+5) The share of time spent listening is tracked against the "95% of time listening" goal
+
+Command layout (little-endian):
+    0xC5 | balloon id (3s) | sequence (I) | command (B) | argument (H) | HMAC-SHA256[:8]
+
+Usage (ground station, sends one command with the SX1278):
+    python3 uplink.py terminate --balloon 11a --key-file uplink.key
+    python3 uplink.py cadence 5 --balloon 11a --key-file uplink.key         Update every 5 minutes
+"""
+
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import statistics
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+
+(RED, ORANGE, YELLOW, GREEN, CYAN, BLUE, MAGENTA, RESET) = ('\033[91m', '\033[38;5;208m', '\033[93m', '\033[92m', '\033[96m', '\033[94m', '\033[95m', '\033[0m')
+
+
+UPLINK_MAGIC = 0xC5
+COMMAND = struct.Struct('<B3sIBH')
+MAC_BYTES = 8
+FRAME_BYTES = COMMAND.size + MAC_BYTES
+
+CMD_PING = 1            # Send a report now
+CMD_TERMINATE = 2       # Remote termination (servo + nichrome)
+CMD_CADENCE = 3         # argument = minutes between update bursts
+CMD_ITERATIONS = 4      # argument = messages per burst
+CMD_ACK = 5             # argument = tx_counter of a telemetry frame the ground decoded (telemetry_frame.acknowledge)
+COMMAND_NAMES = {CMD_PING: 'ping', CMD_TERMINATE: 'terminate', CMD_CADENCE: 'cadence',
+                 CMD_ITERATIONS: 'iterations', CMD_ACK: 'ack'}
+
+
+def load_key(filename):
+    """Shared secret for the HMAC (raw bytes of the file); None if there is no key file"""
+    if not filename or not os.path.exists(filename):
+        return None
+    with open(filename, mode='rb') as file:
+        return file.read().strip()
+
+
+def sign(key, body):
+    return hmac.new(key, body, hashlib.sha256).digest()[:MAC_BYTES]
+
+
+def encode_command(balloon_id, key, sequence, command, argument=0):
+    body = COMMAND.pack(UPLINK_MAGIC, balloon_id.encode('ascii')[:3].ljust(3), sequence, command, argument)
+    return body + sign(key, body)
+
+
+def decode_command(frame, balloon_id, key):
+    """Returns (sequence, command, argument), or raises ValueError saying why the frame was rejected"""
+    if len(frame) != FRAME_BYTES or frame[0] != UPLINK_MAGIC:
+        raise ValueError("not an uplink command")
+    body, mac = frame[:COMMAND.size], frame[COMMAND.size:]
+    (_, station, sequence, command, argument) = COMMAND.unpack(body)
+    if station != balloon_id.encode('ascii')[:3].ljust(3):
+        raise ValueError(f"for balloon {station.decode('ascii', 'replace')}")
+    if not hmac.compare_digest(sign(key, body), mac):
+        raise ValueError("bad MAC")
+    if command not in COMMAND_NAMES:
+        raise ValueError(f"unknown command {command}")
+    return sequence, command, argument
+
+
+#-------------------- RECEIVER (balloon) --------------------
+class UplinkReceiver:
+    """
+    - start() (inside the event loop) attaches the DIO0 handler and arms continuous RX
+    - await get() returns the next accepted command: {'name', 'command', 'argument', 'sequence', 'rssi', 'snr',
+      'irq_time' (monotonic)}
+    - Wrap every transmit in transmitting() so RX is re-armed straight after
+    """
+    def __init__(self, LoRa, balloon_id, key, sequence_file='uplink_sequence.txt'):
+        self.LoRa = LoRa
+        self.balloon_id = balloon_id
+        self.key = key
+        self.sequence_file = sequence_file
+        self.last_sequence = self._load_sequence()
+        self.lock = threading.Lock()        # SPI is shared by the interrupt thread and the transmitter
+        self.stats = {'packets': 0, 'accepted': 0, 'rejected': 0, 'crc_errors': 0, 'replays': 0}
+        self.last_reject = ''
+        self.latencies = []                 # Seconds from DIO0 interrupt to the flight loop acting on the command
+        self.listen_seconds = 0.0
+        self._armed_since = None
+        self.asleep = False
+        self._started = time.monotonic()
+        self._loop = None
+        self._queue = None
+        self._poll_task = None
+
+    def _load_sequence(self):
+        try:
+            with open(self.sequence_file) as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _save_sequence(self):
+        with open(self.sequence_file, mode='w') as file:
+            file.write(f"{self.last_sequence}\n")
+
+    # ---------- Radio ----------
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.LoRa.onReceive(self._rx_done)
+        self.arm()
+        if self.LoRa._irq == -1:
+            self._poll_task = asyncio.create_task(self._poll())
+
+    def arm(self):
+        """Continuous RX; DIO0 is mapped to RxDone by request()"""
+        if self.asleep:
+            self.LoRa.standby()
+            self.asleep = False
+        self.LoRa.request(self.LoRa.RX_CONTINUOUS)
+        self._armed_since = time.monotonic()
+
+    def disarm(self):
+        if self._armed_since is not None:
+            self.listen_seconds += time.monotonic() - self._armed_since
+            self._armed_since = None
+
+    def sleep(self):
+        """Stop listening and put the radio to sleep (lowest current) until wake() or the next transmit"""
+        with self.lock:
+            self.disarm()
+            self.LoRa.sleep()
+            self.asleep = True
+
+    def wake(self):
+        with self.lock:
+            if self._armed_since is None:
+                self.arm()
+
+    @contextmanager
+    def transmitting(self):
+        """Leave RX for one packet and go straight back to listening when TX is done (or fails)"""
+        with self.lock:
+            self.disarm()
+            if self.asleep:
+                self.LoRa.standby()     # The FIFO cannot be written while the radio sleeps
+                self.asleep = False
+            try:
+                yield
+            finally:
+                self.arm()
+
+    def _rx_done(self):  # Runs on the LoRaRF GPIO interrupt thread
+        irq_time = time.monotonic()
+        with self.lock:
+            length = self.LoRa.available()
+            packet = bytes(self.LoRa.get(length)) if length else b''
+            status = self.LoRa.status()
+            rssi, snr = self.LoRa.packetRssi(), self.LoRa.snr()
+        if packet:
+            self._loop.call_soon_threadsafe(self._handle, packet, status, rssi, snr, irq_time)
+
+    async def _poll(self, interval=0.2):
+        """Fallback when DIO0 is not wired (setPins without an IRQ pin): drain the radio from the event loop"""
+        while True:
+            with self.lock:
+                ready = self._armed_since is not None and self.LoRa.wait(0.001)
+            if ready:
+                self._rx_done()
+            else:
+                await asyncio.sleep(interval)
+
+    # ---------- Commands ----------
+    def _handle(self, packet, status, rssi, snr, irq_time):
+        self.stats['packets'] += 1
+        if status == self.LoRa.STATUS_CRC_ERR:
+            self.stats['crc_errors'] += 1
+            return
+        try:
+            sequence, command, argument = decode_command(packet, self.balloon_id, self.key)
+        except ValueError as e:
+            self.stats['rejected'] += 1
+            self.last_reject = str(e)
+            return
+        if sequence <= self.last_sequence:
+            self.stats['replays'] += 1
+            self.last_reject = f"replayed sequence {sequence}"
+            return
+        self.last_sequence = sequence
+        self._save_sequence()
+        self.stats['accepted'] += 1
+        self._queue.put_nowait({'name': COMMAND_NAMES[command], 'command': command, 'argument': argument,
+                                'sequence': sequence, 'rssi': rssi, 'snr': snr, 'irq_time': irq_time})
+
+    async def get(self):
+        return await self._queue.get()
+
+    def acted(self, command):
+        """Call when the flight loop has acted on a command; returns the latency in seconds"""
+        latency = time.monotonic() - command['irq_time']
+        self.latencies.append(latency)
+        del self.latencies[:-100]
+        return latency
+
+    # ---------- Readouts ----------
+    def listening_fraction(self):
+        listening = self.listen_seconds + (time.monotonic() - self._armed_since if self._armed_since is not None else 0)
+        return listening / max(time.monotonic() - self._started, 1e-9)
+
+    def summary(self):
+        """'RX 97.2% of time, 3 cmds (1 rejected, 0 replays, 0 CRC), latency 4/12 ms'"""
+        stats = self.stats
+        text = (f"RX {100 * self.listening_fraction():.1f}% of time, {stats['accepted']} cmds "
+                f"({stats['rejected']} rejected, {stats['replays']} replays, {stats['crc_errors']} CRC)")
+        if self.latencies:
+            text += f", latency {1000 * statistics.median(self.latencies):.0f}/{1000 * max(self.latencies):.0f} ms"
+        return text
+
+
+#-------------------- SENDER (ground station) --------------------
+def next_sequence(filename='uplink_sequence_ground.txt'):
+    """Strictly increasing sequence numbers: Unix seconds, bumped past the last one used"""
+    last = 0
+    if os.path.exists(filename):
+        with open(filename) as file:
+            last = int(file.read().strip() or 0)
+    sequence = max(int(time.time()), last + 1)
+    with open(filename, mode='w') as file:
+        file.write(f"{sequence}\n")
+    return sequence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send an authenticated uplink command to a SABER balloon")
+    parser.add_argument('command', choices=[name for name in COMMAND_NAMES.values()])
+    parser.add_argument('argument', nargs='?', type=int, default=0, help="minutes (cadence), count (iterations), tx_counter (ack)")
+    parser.add_argument('--balloon', required=True, help="balloon id, e.g. 11a")
+    parser.add_argument('--key-file', default='uplink.key', help="shared secret, same file as on the flight computer")
+    parser.add_argument('--repeat', type=int, default=2, help="times to send the command")
+    args = parser.parse_args()
+
+    key = load_key(args.key_file)
+    if key is None:
+        parser.error(f"no key file {args.key_file}")
+    command = next(code for code, name in COMMAND_NAMES.items() if name == args.command)
+    frame = encode_command(args.balloon, key, next_sequence(), command, args.argument)
+
+    from LoRaRF import SX127x
+    from ground_station import configure_receiver
+    LoRa = SX127x()
+    configure_receiver(LoRa)
+    LoRa.setTxPower(17, LoRa.TX_POWER_PA_BOOST)
+    for _ in range(args.repeat):        # The same sequence number: the balloon acts on the first copy it hears
+        LoRa.beginPacket()
+        LoRa.put(frame)
+        LoRa.endPacket()
+        LoRa.wait()
+        print(f"{MAGENTA}{'Command sent:':<25}{RESET}{args.command} {args.argument} to SABER_{args.balloon} "
+              f"({len(frame)} bytes, {LoRa.transmitTime() / 1000:.2f} s)")
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()